@@ -0,0 +1,416 @@
+"""Latency, throughput and memory of the command handlers, against a stubbed Slack API.
+
+    python benchmark.py --sizes 10,1000,100000,1000000 --save-baseline
+    python benchmark.py --sizes 10,1000,100000,1000000
+
+Each scenario (/get_time, /get_event, /list_events, /find_event and the /set_event modal
+submission) is dispatched through the sync Bolt app against event stores seeded with each size.
+Latency runs from dispatch to the reply reaching response_url, or for saves to the
+background save finishing. With a baseline file present, the run fails (exit status 1)
+when a result is more than --tolerance worse than the baseline.
+
+--render adds micro-benchmarks of the response builders alone: CPU time and memory
+allocated per response, serialization to JSON included.
+
+--startup measures cold starts in fresh interpreters instead: how long importing the bot
+takes (with the Slack API unreachable, so an import that goes to the network fails), and
+how long `python __init__.py` takes to ack a first /get_time and to deliver its reply.
+"""
+import argparse
+import functools
+import json
+import os
+import random
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from loadtest import BASE_DIR, SIGNING_SECRET, TOKEN, load_bot, seed, signed_headers
+
+from fake_slack import FakeSlack
+
+SCENARIOS = ("get_time", "get_event", "list_events", "find_event", "save_event")
+DEFAULT_BASELINE = os.path.join(BASE_DIR, "benchmark_baseline.json")
+# Differences below this are noise at sub-millisecond latencies, whatever the tolerance
+LATENCY_SLACK_MS = 1.0
+
+
+def command_body(fake, request_id, command, text, user):
+    return urlencode({
+        "command": command,
+        "text": text,
+        "user_id": user,
+        "team_id": "T000",
+        "channel_id": "C000",
+        "trigger_id": request_id,
+        "response_url": fake.response_url(request_id),
+    })
+
+
+def save_body(request_id, code, original_code, user):
+    view = {
+        "id": "V000",
+        "type": "modal",
+        "callback_id": "save_event",
+        "private_metadata": json.dumps({"original_code": original_code, "user_timezone": "Asia/Singapore"}),
+        "state": {"values": {
+            "code_block": {"code_input": {"value": code}},
+            "datepicker_block": {"datepicker": {"selected_date": "2030-01-01"}},
+            "timepicker_block": {"timepicker": {"selected_time": "09:00"}},
+            "description_block": {"description_input": {"value": f"Benchmark {request_id}"}},
+        }},
+    }
+    payload = {"type": "view_submission", "team": {"id": "T000"}, "user": {"id": user},
+               "api_app_id": "A000", "view": view}
+    return urlencode({"payload": json.dumps(payload)})
+
+
+def payloads(fake, scenario, count, size, users, tag="run"):
+    """Yields (request_id, form body) for count requests of one scenario."""
+    rng = random.Random(f"{scenario}-{size}")
+    for i in range(count):
+        request_id = f"{tag}-{scenario}-{size}-{i}"
+        user = f"U{i % users}"
+        if scenario == "get_time":
+            body = command_body(fake, request_id, "/get_time", f"<@{user}> 9:00 1/1/2030 Europe/Berlin", user)
+        elif scenario == "get_event":
+            body = command_body(fake, request_id, "/get_event", f"event{rng.randrange(size)}", user)
+        elif scenario == "list_events":
+            body = command_body(fake, request_id, "/list_events", "day", user)
+        elif scenario == "find_event":
+            # Code prefixes and words from descriptions, as someone typing would search
+            n = str(rng.randrange(size))
+            text = f"event{n[:rng.randint(1, len(n))]}" if i % 2 else f"Event {n}"
+            body = command_body(fake, request_id, "/find_event", text, user)
+        else:
+            # Edits to seeded events (all owned by U0) and brand new events, half and half
+            if i % 2:
+                code = f"event{rng.randrange(size)}"
+                body = save_body(request_id, code, code, "U0")
+            else:
+                body = save_body(request_id, request_id, request_id, user)
+        yield request_id, body
+
+
+def open_store(bot, kind, directory):
+    from timekeeper.event_store import open_event_store
+
+    if kind == "json":
+        path = os.path.join(directory, "events.json")
+        with open(path, "w") as f:
+            f.write("{}")
+    else:
+        path = os.path.join(directory, "events.db")
+    return bot.metrics.instrument(open_event_store(kind, path), "event_store")
+
+
+def track_saves(bot, done):
+    """Records when each background save finishes, keyed by the request id in its description."""
+    save_event = bot.save_event
+
+    @functools.wraps(save_event)
+    def tracked(new_code, original_code, event, *args):
+        try:
+            return save_event(new_code, original_code, event, *args)
+        finally:
+            done[event["description"].split()[-1]] = time.perf_counter()
+
+    bot.save_event = tracked
+
+
+def run(bot, fake, scenario, requests, concurrency, saved):
+    from slack_bolt.request import BoltRequest
+
+    started = {}
+
+    def send(item):
+        request_id, body = item
+        started[request_id] = time.perf_counter()
+        bot.app.dispatch(BoltRequest(body=body, headers=signed_headers(body)))
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, requests))
+    if scenario == "save_event":
+        bot.workers.join()
+        finished = {r: saved[r] for r in started if r in saved}
+    else:
+        fake.wait_for(len(requests), timeout=600)
+        finished = {r: fake.responses[r][0] for r in started if r in fake.responses}
+    elapsed = time.perf_counter() - t0
+    return sorted(finished[r] - started[r] for r in finished), elapsed
+
+
+def summarize(latencies, elapsed, requests, peak_bytes):
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else float("nan")
+    return {
+        "requests": requests,
+        "completed": len(latencies),
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else float("nan"),
+        "p99_ms": p99 * 1000,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "peak_alloc_mb": peak_bytes / 2 ** 20 if peak_bytes is not None else None,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def render_cases(directory):
+    """(name, builder) pairs for each response builder, given an event store to read."""
+    from timekeeper import responses
+    from timekeeper.event_store import open_event_store
+
+    path = os.path.join(directory, "render-events.json")
+    with open(path, "w") as f:
+        f.write("{}")
+    store = open_event_store("json", path)
+    seed(store, 1000)
+    code, event = next(store.between(limit=1))
+    view = dict(responses.set_event_view(code, event, event["created_by"], "Asia/Singapore"),
+                id="V000", state={"values": {}})
+    args = ["Asia/Singapore", "9:00-17:30", "1/1/2030", "Europe/Berlin", "America/New_York", "UTC"]
+    return [
+        ("get_time_response", lambda: responses.get_time_response(args, "U1", {})),
+        ("get_event_response", lambda: responses.get_event_response(code, event, "Asia/Singapore")),
+        ("set_event_view", lambda: responses.set_event_view(code, event, event["created_by"], "Asia/Singapore")),
+        ("reset_time_view", lambda: responses.reset_time_view(view)),
+        ("list_events_page", lambda: responses.list_events_page(store, None, None, "Asia/Singapore")),
+    ]
+
+
+def render_benchmarks(directory, iterations):
+    """CPU time and allocations per call of each response builder, serialization included."""
+    results = {}
+    for name, build in render_cases(directory):
+        render = lambda: json.dumps(build())  # noqa: E731
+        render()
+        t0 = time.process_time()
+        for _ in range(iterations):
+            render()
+        cpu_us = (time.process_time() - t0) / iterations * 1e6
+
+        tracemalloc.start()
+        allocated = 0
+        for _ in range(20):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            render()
+            allocated += tracemalloc.get_traced_memory()[1] - before
+        tracemalloc.stop()
+        results[f"render/{name}"] = {"cpu_us": cpu_us, "alloc_kb": allocated / 20 / 1024}
+        print(f"{name:>20}: {cpu_us:8.1f} us/response, {allocated / 20 / 1024:6.1f} KB allocated at peak")
+    return results
+
+
+# Imports the bot the way loadtest.load_bot() does and prints how long that took
+IMPORT_BOT = """
+import sys, time
+sys.path.insert(0, sys.argv[1])
+t0 = time.perf_counter()
+import timekeeper.app
+print(time.perf_counter() - t0)
+"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def first_response(fake, env, directory, timeout=60):
+    """Starts the bot in a new process; returns seconds until it acks a /get_time and until the reply arrives."""
+    from urllib.error import URLError
+    from urllib.request import Request, urlopen
+
+    port = free_port()
+    env = dict(env, PORT=str(port), EVENTS_DB=os.path.join(directory, "events.db"),
+               REMINDERS_DB=os.path.join(directory, "reminders.db"))
+    body = command_body(fake, "startup", "/get_time", "9:00 1/1/2030 Europe/Berlin", "U0")
+    fake.reset()
+    t0 = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(BASE_DIR, "__init__.py")], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            headers = {name: values[0] for name, values in signed_headers(body).items()}
+            try:
+                with urlopen(Request(f"http://127.0.0.1:{port}/slack/events", data=body.encode(), headers=headers),
+                             timeout=timeout) as response:
+                    response.read()
+                break
+            except (ConnectionError, URLError):
+                if process.poll() is not None or time.perf_counter() - t0 > timeout:
+                    raise RuntimeError("the bot exited or never started listening")
+                time.sleep(0.002)
+        acked = time.perf_counter() - t0
+        if not fake.wait_for(1, timeout=timeout):
+            raise RuntimeError("no reply to the first /get_time")
+        return acked, fake.responses["startup"][0] - t0
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def startup_benchmarks(fake, directory, runs):
+    """Median import time and time to first ack and reply over runs cold starts, in ms."""
+    env = dict(os.environ, SLACK_BOT_TOKEN=TOKEN, SLACK_SIGNING_SECRET=SIGNING_SECRET, EVENT_STORE="sqlite",
+               EVENTS_DB=os.path.join(directory, "import-events.db"),
+               REMINDERS_DB=os.path.join(directory, "import-reminders.db"))
+    imports = []
+    for _ in range(runs):
+        # Nothing listens on port 9: importing must not need Slack
+        output = subprocess.run([sys.executable, "-c", IMPORT_BOT, BASE_DIR], check=True, capture_output=True,
+                                text=True, env=dict(env, SLACK_API_URL="http://127.0.0.1:9/api/")).stdout
+        imports.append(float(output.split()[-1]))
+    acks, replies = [], []
+    for i in range(runs):
+        run_dir = os.path.join(directory, f"startup-{i}")
+        os.mkdir(run_dir)
+        acked, replied = first_response(fake, dict(env, SLACK_API_URL=fake.api_url), run_dir)
+        acks.append(acked)
+        replies.append(replied)
+    result = {
+        "import_ms": statistics.median(imports) * 1000,
+        "first_ack_ms": statistics.median(acks) * 1000,
+        "first_reply_ms": statistics.median(replies) * 1000,
+    }
+    print(f"startup: import {result['import_ms']:.0f} ms, first ack {result['first_ack_ms']:.0f} ms, "
+          f"first reply {result['first_reply_ms']:.0f} ms (median of {runs} cold starts)")
+    return {"startup": result}
+
+
+def compare(results, baseline, tolerance):
+    """Returns a line for every result that is worse than the baseline by more than tolerance."""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        if key == "startup":
+            for metric in ("import_ms", "first_ack_ms", "first_reply_ms"):
+                limit = base[metric] * (1 + tolerance) + LATENCY_SLACK_MS
+                if result[metric] > limit:
+                    regressions.append(f"{key}: {metric} {result[metric]:.0f} > {limit:.0f} "
+                                       f"(baseline {base[metric]:.0f})")
+            continue
+        if key.startswith("render/"):
+            for metric in ("cpu_us", "alloc_kb"):
+                limit = base[metric] * (1 + tolerance)
+                if result[metric] > limit:
+                    regressions.append(f"{key}: {metric} {result[metric]:.1f} > {limit:.1f} "
+                                       f"(baseline {base[metric]:.1f})")
+            continue
+        if result["completed"] < result["requests"]:
+            regressions.append(f"{key}: only {result['completed']} of {result['requests']} requests completed")
+        for metric in ("p50_ms", "p99_ms"):
+            limit = base[metric] * (1 + tolerance) + LATENCY_SLACK_MS
+            if result[metric] > limit:
+                regressions.append(f"{key}: {metric} {result[metric]:.2f} > {limit:.2f} (baseline {base[metric]:.2f})")
+        limit = base["throughput"] * (1 - tolerance)
+        if result["throughput"] < limit:
+            regressions.append(f"{key}: throughput {result['throughput']:.1f} < {limit:.1f} "
+                               f"(baseline {base['throughput']:.1f})")
+        if base.get("peak_alloc_mb") and result.get("peak_alloc_mb"):
+            limit = base["peak_alloc_mb"] * (1 + tolerance)
+            if result["peak_alloc_mb"] > limit:
+                regressions.append(f"{key}: peak_alloc_mb {result['peak_alloc_mb']:.1f} > {limit:.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,1000,100000", help="comma separated event store sizes")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--store", choices=("sqlite", "json"), default="sqlite")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario and size")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--users", type=int, default=50, help="distinct users sending requests")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the fake users.info and views.* take")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="also record peak Python allocations per scenario, in a separate pass")
+    parser.add_argument("--render", action="store_true",
+                        help="micro-benchmark the response builders instead of the handlers")
+    parser.add_argument("--iterations", type=int, default=2000, help="calls per builder with --render")
+    parser.add_argument("--startup", action="store_true",
+                        help="measure import time and time to first response instead of the handlers")
+    parser.add_argument("--runs", type=int, default=5, help="cold starts with --startup")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before failing, 0.25 = 25%%")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    scenarios = [scenario for scenario in args.scenarios.split(",") if scenario]
+    results = {}
+    fake = FakeSlack(latency=args.latency).start()
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.startup:
+            results.update(startup_benchmarks(fake, tmp, args.runs))
+            sizes = []
+        bot = load_bot(fake, tmp, 6 * 60 * 60)
+        if args.render:
+            results.update(render_benchmarks(tmp, args.iterations))
+            sizes = []
+        saved = {}
+        track_saves(bot, saved)
+        for size in sizes:
+            directory = os.path.join(tmp, str(size))
+            os.mkdir(directory)
+            bot.event_store.close()
+            bot.event_store = open_store(bot, args.store, directory)
+            t0 = time.perf_counter()
+            seed(bot.event_store, size)
+            print(f"seeded {size} events in {time.perf_counter() - t0:.2f}s")
+            # Like prewarm() does, so /find_event is measured against a built index
+            t0 = time.perf_counter()
+            bot.event_store.search("")
+            print(f"indexed {size} events for search in {time.perf_counter() - t0:.2f}s")
+
+            for scenario in scenarios:
+                fake.reset()
+                requests = list(payloads(fake, scenario, args.requests, size, args.users))
+                latencies, elapsed = run(bot, fake, scenario, requests, args.concurrency, saved)
+                peak = None
+                if args.tracemalloc:
+                    # A second, untimed pass: tracing allocations would distort the latencies
+                    fake.reset()
+                    tracemalloc.start()
+                    run(bot, fake, scenario, list(payloads(fake, scenario, args.requests, size, args.users, "mem")),
+                        args.concurrency, saved)
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                result = results[f"{args.store}/{scenario}@{size}"] = summarize(latencies, elapsed, len(requests), peak)
+                memory = f", peak alloc {result['peak_alloc_mb']:.1f} MB" if peak is not None else ""
+                print(f"{scenario:>12} @ {size:>8}: {result['completed']}/{len(requests)} in {elapsed:.2f}s = "
+                      f"{result['throughput']:.1f} req/s, p50 {result['p50_ms']:.2f} ms, "
+                      f"p99 {result['p99_ms']:.2f} ms, max RSS {result['max_rss_mb']:.0f} MB{memory}")
+    fake.stop()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"saved baseline to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}, run with --save-baseline to create one")
+        return 0
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""A local stand-in for the Slack Web API and response_url endpoints, for load tests and benchmarks.
+
+Point SLACK_API_URL at `FakeSlack.api_url` and send payloads whose response_url is
+`FakeSlack.response_url(request_id)`; every call is answered with a canned success and
+recorded so the caller can wait for replies.
+"""
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class _Server(ThreadingHTTPServer):
+    # socketserver's default backlog of 5 drops connections under load, which then stall
+    # for a second in SYN retransmits and swamp whatever is being measured
+    request_queue_size = 256
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Bots started by benchmark.py --startup are killed with connections still open
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeSlack:
+    def __init__(self, latency=0.0, timezones=None, default_timezone="Asia/Singapore"):
+        self.latency = latency
+        self.timezones = timezones or {}
+        self.default_timezone = default_timezone
+        self.calls = Counter()
+        self.responses = {}  # request id -> (arrival time, payload)
+        self._cond = threading.Condition()
+        self._server = _Server(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    @property
+    def api_url(self):
+        return self.url + "/api/"
+
+    def response_url(self, request_id):
+        return f"{self.url}/respond/{request_id}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset(self):
+        with self._cond:
+            self.calls.clear()
+            self.responses.clear()
+
+    def wait_for(self, count, timeout=60):
+        """Blocks until count responses have arrived, returning False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while len(self.responses) < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _record(self, method, request_id=None, payload=None):
+        with self._cond:
+            self.calls[method] += 1
+            if request_id is not None:
+                self.responses[request_id] = (time.perf_counter(), payload)
+                self._cond.notify_all()
+
+    def _answer(self, method, params):
+        if method == "auth.test":
+            return {"ok": True, "url": "https://example.slack.com/", "team": "Test", "user": "timekeeper",
+                    "team_id": "T000", "user_id": "UBOT", "bot_id": "BBOT"}
+        if method == "users.info":
+            if self.latency:
+                time.sleep(self.latency)
+            user_id = params.get("user", "")
+            return {"ok": True, "user": {"id": user_id, "tz": self.timezones.get(user_id, self.default_timezone)}}
+        if method in ("views.open", "views.update"):
+            if self.latency:
+                time.sleep(self.latency)
+            return {"ok": True, "view": {"id": "V000"}}
+        if method in ("chat.scheduleMessage", "chat.postMessage", "chat.postEphemeral"):
+            return {"ok": True, "channel": params.get("channel"), "ts": f"{time.time():.6f}",
+                    "scheduled_message_id": "Q000"}
+        return {"ok": True}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _params(self):
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                if raw:
+                    if self.headers.get("Content-Type", "").startswith("application/json"):
+                        params.update(json.loads(raw))
+                    else:
+                        params.update({k: v[0] for k, v in parse_qs(raw.decode()).items()})
+                return url.path, params
+
+            def _send(self, body):
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _dispatch(self):
+                path, params = self._params()
+                if path.startswith("/respond/"):
+                    fake._record("response_url", path[len("/respond/"):], params)
+                    self._send({"ok": True})
+                elif path.startswith("/api/"):
+                    method = path[len("/api/"):]
+                    answer = fake._answer(method, params)
+                    fake._record(method, params.get("trigger_id") if method == "views.open" else None, params)
+                    self._send(answer)
+                else:
+                    self.send_error(404)
+
+            do_GET = _dispatch
+            do_POST = _dispatch
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
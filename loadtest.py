@@ -0,0 +1,171 @@
+"""Throughput of the sync App against the asyncio AsyncApp, with a stubbed Slack API.
+
+    python loadtest.py --requests 500 --concurrency 50 --latency 0.2
+
+Every request uses a different user so each one pays a (slow) users.info call, unless
+--cache is given. Latency is measured from dispatch to the reply reaching response_url.
+"""
+import argparse
+import asyncio
+import importlib
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from fake_slack import FakeSlack
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SIGNING_SECRET = "loadtest-secret"
+TOKEN = "xoxb-loadtest"
+
+
+def load_bot(fake, tmp, cache_ttl):
+    """Imports the bot from the timekeeper package next to this file, wired up to the fake Slack API."""
+    os.environ.update({
+        "SLACK_API_URL": fake.api_url,
+        "SLACK_BOT_TOKEN": TOKEN,
+        "SLACK_SIGNING_SECRET": SIGNING_SECRET,
+        "EVENT_STORE": "sqlite",
+        "EVENTS_DB": os.path.join(tmp, "events.db"),
+        "REMINDERS_DB": os.path.join(tmp, "reminders.db"),
+        "TZ_CACHE_TTL": str(cache_ttl),
+    })
+    return importlib.import_module("timekeeper.app")
+
+
+def seed(event_store, count):
+    now = time.time()
+    event_store.save_many(
+        (f"event{i}", {"description": f"Event {i}", "timestamp": now + i * 60, "created_by": "U0"})
+        for i in range(count)
+    )
+
+
+def payloads(fake, count, shared_users):
+    """Yields (request_id, form body) for a mix of /get_time, /get_event and /list_events."""
+    for i in range(count):
+        user = "U0" if shared_users else f"U{i}"
+        kind = i % 3
+        if kind == 0:
+            command, text = "/get_time", f"<@{user}> 9:00 1/1/2030 Europe/Berlin"
+        elif kind == 1:
+            command, text = "/get_event", f"event{i % 100}"
+        else:
+            command, text = "/list_events", "day"
+        request_id = f"r{i}"
+        yield request_id, urlencode({
+            "command": command,
+            "text": text,
+            "user_id": user,
+            "team_id": "T000",
+            "channel_id": "C000",
+            "trigger_id": request_id,
+            "response_url": fake.response_url(request_id),
+        })
+
+
+def signed_headers(body):
+    from slack_sdk.signature import SignatureVerifier
+
+    timestamp = str(int(time.time()))
+    signature = SignatureVerifier(SIGNING_SECRET).generate_signature(timestamp=timestamp, body=body)
+    return {
+        "content-type": ["application/x-www-form-urlencoded"],
+        "x-slack-request-timestamp": [timestamp],
+        "x-slack-signature": [signature],
+    }
+
+
+def run_sync(bot, fake, requests, concurrency):
+    from slack_bolt.request import BoltRequest
+
+    started = {}
+
+    def send(item):
+        request_id, body = item
+        started[request_id] = time.perf_counter()
+        bot.app.dispatch(BoltRequest(body=body, headers=signed_headers(body)))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, requests))
+    return started
+
+
+def run_async(async_app, http, fake, requests, concurrency):
+    from slack_bolt.request.async_request import AsyncBoltRequest
+
+    started = {}
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def send(request_id, body):
+            async with semaphore:
+                started[request_id] = time.perf_counter()
+                await async_app.async_dispatch(AsyncBoltRequest(body=body, headers=signed_headers(body)))
+
+        await asyncio.gather(*(send(request_id, body) for request_id, body in requests))
+        # Listeners keep running after the ack, wait for their replies on the same loop
+        while len(fake.responses) < len(requests):
+            await asyncio.sleep(0.01)
+        await http.close()
+
+    asyncio.run(main())
+    return started
+
+
+def report(name, fake, started, elapsed):
+    latencies = sorted(fake.responses[r][0] - started[r] for r in started if r in fake.responses)
+    if not latencies:
+        print(f"{name:>6}: no responses")
+        return
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name:>6}: {len(latencies)} replies in {elapsed:.2f}s = {len(latencies) / elapsed:.1f} req/s, "
+          f"p50 {statistics.median(latencies) * 1000:.1f} ms, p99 {p99 * 1000:.1f} ms, "
+          f"users.info calls {fake.calls['users.info']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds the fake users.info takes")
+    parser.add_argument("--events", type=int, default=1000, help="events to seed the store with")
+    parser.add_argument("--cache", action="store_true", help="let the timezone cache absorb lookups")
+    parser.add_argument("--mode", choices=("sync", "async", "both"), default="both")
+    args = parser.parse_args()
+
+    fake = FakeSlack(latency=args.latency).start()
+    with tempfile.TemporaryDirectory() as tmp:
+        bot = load_bot(fake, tmp, 6 * 60 * 60 if args.cache else 0)
+        seed(bot.event_store, args.events)
+
+        if args.mode in ("sync", "both"):
+            fake.reset()
+            requests = list(payloads(fake, args.requests, args.cache))
+            t0 = time.perf_counter()
+            started = run_sync(bot, fake, requests, args.concurrency)
+            fake.wait_for(len(requests), timeout=600)
+            report("sync", fake, started, time.perf_counter() - t0)
+
+        if args.mode in ("async", "both"):
+            from timekeeper.async_app import AsyncSlackHttp, create_async_app
+
+            bot.timezone_cache.invalidate()
+            http = AsyncSlackHttp(TOKEN, base_url=fake.api_url)
+            async_app = create_async_app(bot.event_store, bot.timezone_cache, bot.reminders, TOKEN,
+                                         SIGNING_SECRET, base_url=fake.api_url, http=http)
+            fake.reset()
+            requests = list(payloads(fake, args.requests, args.cache))
+            t0 = time.perf_counter()
+            started = run_async(async_app, http, fake, requests, args.concurrency)
+            report("async", fake, started, time.perf_counter() - t0)
+    fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Many processes writing to one event store at once, checking nothing is lost.
+
+    python stress.py --store both --processes 8 --saves 200
+
+Every process
+- increments a shared counter event with compare-and-swap saves, retrying on VersionConflict,
+- creates events under its own codes,
+- races the others to create the same codes, which only one process may win each.
+Afterwards the counter must equal the number of increments, every event must be there and
+every contested code must have exactly one winner.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from timekeeper.event_store import EventExists, VersionConflict, open_event_store
+
+COUNTER = "counter"
+
+
+def event(description, created_by="U0"):
+    return {"description": description, "timestamp": 1893456000.0, "created_by": created_by}
+
+
+def writer(kind, path, worker, saves, results):
+    store = open_event_store(kind, path)
+    conflicts = won = 0
+    for i in range(saves):
+        while True:
+            current = store.get(COUNTER)
+            try:
+                store.save(COUNTER, event(str(int(current["description"]) + 1)),
+                           expected_version=current["version"], owner="U0")
+                break
+            except VersionConflict:
+                conflicts += 1
+        store.save(f"w{worker}-{i}", event(f"worker {worker}", f"U{worker}"), expected_version=0)
+        try:
+            store.save(f"race-{i}", event(f"won by {worker}", f"U{worker}"), expected_version=0)
+            won += 1
+        except EventExists:
+            pass
+    store.close()
+    results.put((worker, conflicts, won))
+
+
+def run(kind, processes, saves):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "events.json" if kind == "json" else "events.db")
+        if kind == "json":
+            with open(path, "w") as f:
+                f.write("{}")
+        store = open_event_store(kind, path)
+        store.save(COUNTER, event("0"), expected_version=0)
+
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=writer, args=(kind, path, worker, saves, results))
+                   for worker in range(processes)]
+        t0 = time.perf_counter()
+        for process in workers:
+            process.start()
+        outcomes = [results.get() for _ in workers]
+        for process in workers:
+            process.join()
+        elapsed = time.perf_counter() - t0
+
+        # A fresh store, so nothing is served from a snapshot taken before the writers ran
+        store = open_event_store(kind, path)
+        problems = []
+        counter = store.get(COUNTER)
+        expected = processes * saves
+        if int(counter["description"]) != expected or counter["version"] != expected + 1:
+            problems.append(f"counter is {counter['description']} at version {counter['version']}, "
+                            f"expected {expected} at version {expected + 1}")
+        missing = [f"w{worker}-{i}" for worker in range(processes) for i in range(saves)
+                   if store.get(f"w{worker}-{i}") is None]
+        if missing:
+            problems.append(f"{len(missing)} created events are missing, e.g. {missing[:3]}")
+        wins = sum(won for _, _, won in outcomes)
+        if wins != saves:
+            problems.append(f"{wins} processes won {saves} contested codes")
+        if store.count() != 1 + expected + saves:
+            problems.append(f"{store.count()} events stored, expected {1 + expected + saves}")
+
+        conflicts = sum(conflicts for _, conflicts, _ in outcomes)
+        writes = expected * 3
+        print(f"{kind:>6}: {processes} processes, {writes} saves in {elapsed:.2f}s = {writes / elapsed:.0f} saves/s, "
+              f"{conflicts} version conflicts retried")
+        for problem in problems:
+            print(f"{kind:>6}: FAILED {problem}")
+        return not problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", choices=("sqlite", "json", "both"), default="both")
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--saves", type=int, default=100, help="counter increments per process")
+    args = parser.parse_args()
+
+    kinds = ("sqlite", "json") if args.store == "both" else (args.store,)
+    ok = all([run(kind, args.processes, args.saves) for kind in kinds])
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
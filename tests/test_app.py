@@ -0,0 +1,124 @@
+"""The sync and async apps end to end, against the fake Slack API the load test uses."""
+import asyncio
+import json
+import os
+import time
+from urllib.parse import urlencode
+
+import pytest
+
+import loadtest
+from fake_slack import FakeSlack
+from timekeeper.recurrence import rule
+
+
+@pytest.fixture(scope="module")
+def fake():
+    fake = FakeSlack().start()
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture(scope="module")
+def bot(fake, tmp_path_factory):
+    environ = dict(os.environ)
+    bot = loadtest.load_bot(fake, str(tmp_path_factory.mktemp("bot")), 3600)
+    bot.build_services()
+    yield bot
+    os.environ.clear()
+    os.environ.update(environ)
+
+
+def command_body(fake, request_id, command, text):
+    return urlencode({
+        "command": command,
+        "text": text,
+        "user_id": "U1",
+        "team_id": "T000",
+        "channel_id": "C1",
+        "trigger_id": request_id,
+        "response_url": fake.response_url(request_id),
+    })
+
+
+def action_body(fake, request_id, action_id, value):
+    return urlencode({"payload": json.dumps({
+        "type": "block_actions",
+        "user": {"id": "U1"},
+        "team": {"id": "T000"},
+        "channel": {"id": "C1"},
+        "trigger_id": request_id,
+        "response_url": fake.response_url(request_id),
+        "actions": [{"type": "button", "action_id": action_id, "block_id": "b", "value": value,
+                     "action_ts": str(time.time())}],
+    })})
+
+
+def dispatch(bot, fake, request_id, body):
+    """Sends a request through the sync app and returns what it responded with."""
+    from slack_bolt.request import BoltRequest
+
+    response = bot.app.dispatch(BoltRequest(body=body, headers=loadtest.signed_headers(body)))
+    assert response.status == 200
+    bot.workers.join()
+    deadline = time.monotonic() + 5
+    while request_id not in fake.responses:
+        assert time.monotonic() < deadline, f"no response to {request_id}"
+        time.sleep(0.01)
+    return fake.responses[request_id][1]
+
+
+@pytest.mark.parametrize("zone, reply", [
+    ("Asia/Singapre", "Did you mean `Asia/Singapore`"),
+    ("Xyzzyq", "Please use a valid timezone like"),
+])
+def test_get_event_with_unknown_timezone_replies(bot, fake, zone, reply):
+    bot.event_store.save("meet", {"description": "Meet", "timestamp": time.time() + 600, "created_by": "U1"})
+    request_id = f"get-event-{zone}"
+    response = dispatch(bot, fake, request_id, command_body(fake, request_id, "/get_event", f"meet {zone}"))
+    assert response["text"].startswith(f"❌ Unknown timezone `{zone}`.")
+    assert reply in response["text"]
+
+
+def test_get_event_with_unknown_timezone_replies_in_async_app(bot, fake):
+    from slack_bolt.request.async_request import AsyncBoltRequest
+    from timekeeper.async_app import create_async_app
+
+    bot.event_store.save("meet", {"description": "Meet", "timestamp": time.time() + 600, "created_by": "U1"})
+    body = command_body(fake, "async-get-event", "/get_event", "meet Asia/Singapre")
+
+    async def send():
+        app = create_async_app(bot.event_store, bot.timezone_cache, bot.reminders, token=loadtest.TOKEN,
+                               signing_secret=loadtest.SIGNING_SECRET, base_url=bot.SLACK_API_URL)
+        await app.async_dispatch(AsyncBoltRequest(body=body, headers=loadtest.signed_headers(body)))
+        for _ in range(500):
+            if "async-get-event" in fake.responses:
+                return fake.responses["async-get-event"][1]
+            await asyncio.sleep(0.01)
+
+    response = asyncio.run(send())
+    assert response is not None, "no response from the async app"
+    assert "Did you mean `Asia/Singapore`" in response["text"]
+
+
+def test_list_events_pages_end(bot, fake):
+    now = time.time()
+    bot.event_store.save("daily-standup", {"description": "Standup", "timestamp": now - 30 * 86400, "created_by": "U1",
+                                           "recurrence": rule("daily", "UTC")})
+    bot.event_store.save_many((f"list-{i:02}", {"description": "Event", "timestamp": now + i, "created_by": "U1"})
+                              for i in range(12))
+    response = dispatch(bot, fake, "list", command_body(fake, "list", "/list_events", ""))
+    codes = []
+    for page in range(20):
+        assert "blocks" in response, response
+        blocks = response["blocks"]
+        codes += [block["text"]["text"].split("`")[1] for block in blocks if block["type"] == "section"]
+        button = blocks[-1].get("elements", [{}])[0]
+        if button.get("action_id") != "list_events_page":
+            break
+        request_id = f"list-page-{page}"
+        response = dispatch(bot, fake, request_id, action_body(fake, request_id, "list_events_page", button["value"]))
+    else:
+        pytest.fail("/list_events kept offering another page")
+    assert codes.count("daily-standup") == 1
+    assert [code for code in codes if code.startswith("list-")] == [f"list-{i:02}" for i in range(12)]
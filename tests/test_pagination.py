@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+from timekeeper.event_store import JsonEventStore, SqliteEventStore
+from timekeeper.recurrence import rule
+from timekeeper.responses import EVENTS_PER_PAGE, list_events_page
+
+NOW = 1_700_000_000
+
+
+@pytest.fixture(params=["sqlite", "json"])
+def store(request, tmp_path):
+    if request.param == "json":
+        path = tmp_path / "events.json"
+        path.write_text("{}")
+        store = JsonEventStore(str(path))
+    else:
+        store = SqliteEventStore(str(tmp_path / "events.db"))
+    yield store
+    store.close()
+
+
+def one_off(timestamp, description="Event"):
+    return {"description": description, "timestamp": timestamp, "created_by": "U1"}
+
+
+def daily(timestamp):
+    return {**one_off(timestamp, "Standup"), "recurrence": rule("daily", "UTC")}
+
+
+def pages(store, start, end, now=None, limit=100):
+    """Walks list_events_page() the way the next page button does; returns each page's codes."""
+    found = []
+    after = None
+    while len(found) < limit:
+        blocks = list_events_page(store, start, end, "UTC", after=after, now=now)
+        found.append([block["text"]["text"].split("`")[1] for block in blocks if block["type"] == "section"])
+        if blocks[-1]["type"] != "actions" or blocks[-1]["elements"][0]["action_id"] != "list_events_page":
+            return found
+        cursor = json.loads(blocks[-1]["elements"][0]["value"])
+        after, now = cursor["after"], cursor.get("now")
+        assert (cursor["start"], cursor["end"]) == (start, end)
+    raise AssertionError(f"still paging after {limit} pages")
+
+
+def test_between_resumes_after_cursor_with_ties_broken_by_code(store):
+    # Ten events at the same time, so the page boundary falls between equal timestamps
+    store.save_many((f"e{i}", one_off(NOW)) for i in range(10))
+    store.save("later", one_off(NOW + 60))
+    first = list(store.between(limit=4))
+    assert [code for code, _ in first] == ["e0", "e1", "e2", "e3"]
+    rest = list(store.between(after=[NOW, "e3"]))
+    assert [code for code, _ in rest] == ["e4", "e5", "e6", "e7", "e8", "e9", "later"]
+
+
+def test_between_cursor_respects_window(store):
+    store.save_many((f"e{i:02}", one_off(NOW + i)) for i in range(20))
+    page = list(store.between(NOW + 5, NOW + 10, after=[NOW + 6, "e06"]))
+    assert [code for code, _ in page] == ["e07", "e08", "e09"]
+
+
+def test_pages_cover_every_event_once(store):
+    count = EVENTS_PER_PAGE * 2 + 3
+    store.save_many((f"e{i:03}", one_off(NOW + i // 2)) for i in range(count))
+    found = pages(store, NOW, NOW + count)
+    assert [len(page) for page in found] == [EVENTS_PER_PAGE, EVENTS_PER_PAGE, 3]
+    assert sum(found, []) == [f"e{i:03}" for i in range(count)]
+
+
+def test_window_lists_every_occurrence_in_order(store):
+    store.save("standup", daily(NOW - 3600))
+    store.save("review", one_off(NOW + 86400))
+    found = sum(pages(store, NOW, NOW + 3 * 86400), [])
+    assert found == ["standup", "review", "standup", "standup"]
+
+
+def test_open_ended_listing_ends(store):
+    # A recurring event has no last occurrence; without an interval it's listed once
+    store.save("standup", daily(NOW - 400 * 86400))
+    store.save_many((f"e{i:02}", one_off(NOW - 1000 + i)) for i in range(EVENTS_PER_PAGE + 5))
+    store.save("soon", one_off(NOW + 3600))
+    found = sum(pages(store, None, None, now=NOW), [])
+    assert found.count("standup") == 1
+    assert found[-2:] == ["standup", "soon"]
+    assert len(found) == EVENTS_PER_PAGE + 7
+
+
+def test_open_ended_listing_keeps_its_now_across_pages(store):
+    # The standup's next occurrence lands on the first page
+    store.save("standup", daily(NOW - 10 * 86400 + 5))
+    store.save_many((f"e{i:02}", one_off(NOW + i)) for i in range(EVENTS_PER_PAGE + 1))
+    first = list_events_page(store, None, None, "UTC", now=NOW)
+    assert "`standup`" in json.dumps(first)
+    cursor = json.loads(first[-1]["elements"][0]["value"])
+    assert cursor["now"] == NOW
+
+    def codes(now):
+        blocks = list_events_page(store, None, None, "UTC", after=cursor["after"], now=now)
+        return [block["text"]["text"].split("`")[1] for block in blocks if block["type"] == "section"]
+
+    assert "standup" not in codes(cursor["now"])
+    # Asked for a day later, its next occurrence would have moved past the cursor and shown up again
+    assert "standup" in codes(NOW + 86400)
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+from itertools import islice
+
+import pytest
+import pytz
+
+from timekeeper.recurrence import NextOccurrences, _Rule, expand, occurrences, rule, upcoming
+
+BERLIN = pytz.timezone("Europe/Berlin")
+
+
+def event(first, freq, timezone_name="Europe/Berlin"):
+    return {"description": "Standup", "timestamp": first, "created_by": "U1", "recurrence": rule(freq, timezone_name)}
+
+
+def local(timestamp, tz=BERLIN):
+    return datetime.fromtimestamp(timestamp, tz).replace(tzinfo=None)
+
+
+def test_daily_keeps_wall_clock_time_across_dst():
+    standup = event(BERLIN.localize(datetime(2024, 3, 28, 9)).timestamp(), "daily")
+    days = [local(e["timestamp"]) for _, e in islice(occurrences("standup", standup), 7)]
+    assert days == [datetime(2024, 3, 28, 9) + timedelta(days=i) for i in range(7)]
+    # Berlin moved to summer time on 31 March, so that day is an hour shorter
+    stamps = [e["timestamp"] for _, e in islice(occurrences("standup", standup), 5)]
+    assert [b - a for a, b in zip(stamps, stamps[1:])] == [86400, 86400, 82800, 86400]
+
+
+def test_monthly_on_the_31st_falls_on_the_last_day():
+    review = event(BERLIN.localize(datetime(2024, 1, 31, 17)).timestamp(), "monthly")
+    days = [local(e["timestamp"]).date().isoformat() for _, e in islice(occurrences("review", review), 5)]
+    assert days == ["2024-01-31", "2024-02-29", "2024-03-31", "2024-04-30", "2024-05-31"]
+
+
+def test_weekly_occurrence_in_skipped_hour_moves_past_the_gap():
+    # 2:30 doesn't exist in Berlin on 31 March 2024
+    night = event(BERLIN.localize(datetime(2024, 3, 24, 2, 30)).timestamp(), "weekly")
+    second = _Rule(night).nth(1)
+    assert local(second) == datetime(2024, 3, 31, 3, 30)
+
+
+@pytest.mark.parametrize("freq", ["daily", "weekly", "monthly"])
+def test_index_from_finds_the_first_occurrence_at_or_after(freq):
+    recurring = _Rule(event(BERLIN.localize(datetime(2023, 1, 31, 9)).timestamp(), freq))
+    stamps = [recurring.nth(n) for n in range(60)]
+    for start in [stamps[0] - 1, stamps[0], stamps[10], stamps[10] + 1, stamps[40] - 1, stamps[59]]:
+        n = recurring.index_from(start)
+        assert stamps[n] >= start
+        assert n == 0 or stamps[n - 1] < start
+
+
+def test_occurrences_inside_window():
+    standup = event(BERLIN.localize(datetime(2024, 1, 1, 9)).timestamp(), "weekly")
+    start = BERLIN.localize(datetime(2024, 2, 1)).timestamp()
+    end = BERLIN.localize(datetime(2024, 3, 1)).timestamp()
+    days = [local(e["timestamp"]).day for _, e in occurrences("standup", standup, start, end)]
+    assert days == [5, 12, 19, 26]
+
+
+def test_occurrences_resume_after_cursor():
+    standup = event(BERLIN.localize(datetime(2024, 1, 1, 9)).timestamp(), "daily")
+    first = list(islice(occurrences("standup", standup), 4))
+    cursor = [first[1][1]["timestamp"], "standup"]
+    assert list(islice(occurrences("standup", standup, after=cursor), 2)) == first[2:]
+
+
+def test_expand_orders_by_timestamp_then_code():
+    first = BERLIN.localize(datetime(2024, 1, 1, 9)).timestamp()
+    events = [("b", event(first, "daily")), ("a", event(first, "weekly"))]
+    merged = [(code, local(e["timestamp"]).day) for code, e in
+              expand(events, end=BERLIN.localize(datetime(2024, 1, 3)).timestamp())]
+    assert merged == [("a", 1), ("b", 1), ("b", 2)]
+
+
+def test_upcoming_lists_each_event_once_at_its_next_occurrence():
+    first = BERLIN.localize(datetime(2024, 1, 1, 9)).timestamp()
+    now = BERLIN.localize(datetime(2024, 6, 5, 12)).timestamp()
+    events = [("daily", event(first, "daily")), ("weekly", event(first, "weekly"))]
+    found = [(code, local(e["timestamp"])) for code, e in upcoming(events, now)]
+    assert found == [("daily", datetime(2024, 6, 6, 9)), ("weekly", datetime(2024, 6, 10, 9))]
+    cursor = [BERLIN.localize(datetime(2024, 6, 6, 9)).timestamp(), "daily"]
+    assert [code for code, _ in upcoming(events, now, after=cursor)] == ["weekly"]
+
+
+def test_next_occurrence_is_cached_until_it_passes_or_the_rule_changes():
+    cache = NextOccurrences()
+    standup = event(BERLIN.localize(datetime(2024, 1, 1, 9)).timestamp(), "daily")
+    now = BERLIN.localize(datetime(2024, 6, 5, 12)).timestamp()
+    upcoming_at = cache.get("standup", standup, now)
+    assert local(upcoming_at) == datetime(2024, 6, 6, 9)
+    assert cache.get("standup", standup, now + 3600) == upcoming_at
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1}
+    assert local(cache.get("standup", standup, upcoming_at + 1)) == datetime(2024, 6, 7, 9)
+    assert local(cache.get("standup", {**standup, "recurrence": rule("weekly", "Europe/Berlin")}, now)) == \
+        datetime(2024, 6, 10, 9)
+    assert cache.stats()["misses"] == 3
@@ -0,0 +1,58 @@
+import sqlite3
+import time
+
+import pytest
+
+from timekeeper.recurrence import rule
+from timekeeper.reminders import ReminderScheduler, event_key
+from timekeeper.responses import reschedule_reminders
+
+WEEK = 7 * 86400
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    scheduler = ReminderScheduler(str(tmp_path / "reminders.db"), send=lambda *args: None)
+    yield scheduler
+    scheduler.stop()
+
+
+def weekly(first, description="Standup"):
+    return {"description": description, "timestamp": first, "created_by": "U1", "recurrence": rule("weekly", "UTC")}
+
+
+def pending(scheduler):
+    with sqlite3.connect(scheduler.path) as conn:
+        return conn.execute("SELECT dedup_key, post_at, text FROM reminders WHERE status = 'pending' "
+                            "ORDER BY post_at").fetchall()
+
+
+@pytest.fixture
+def standup(scheduler):
+    """A weekly standup with reminders for its second and third occurrences."""
+    first = int(time.time()) // 3600 * 3600 + 86400
+    for occurrence in (first + WEEK, first + 2 * WEEK):
+        scheduler.add("U1", event_key("standup", occurrence=occurrence), occurrence, "🔔 Reminder: Standup",
+                      event_code="standup")
+    return weekly(first)
+
+
+def test_description_edit_keeps_each_occurrence(scheduler, standup):
+    first = standup["timestamp"]
+    note = reschedule_reminders(scheduler, "standup", {**standup, "description": "Daily sync"}, previous=standup)
+    assert note
+    assert pending(scheduler) == [
+        (event_key("standup", occurrence=first + WEEK), first + WEEK, "🔔 Reminder: Daily sync"),
+        (event_key("standup", occurrence=first + 2 * WEEK), first + 2 * WEEK, "🔔 Reminder: Daily sync"),
+    ]
+
+
+@pytest.mark.parametrize("shift", [3600, WEEK])
+def test_moved_rule_moves_each_occurrence_to_its_counterpart(scheduler, standup, shift):
+    # Moved by a whole week, each reminder lands where the next one was
+    first = standup["timestamp"] + shift
+    reschedule_reminders(scheduler, "standup", weekly(first), previous=standup)
+    assert [(key, post_at) for key, post_at, _ in pending(scheduler)] == [
+        (event_key("standup", occurrence=first + WEEK), first + WEEK),
+        (event_key("standup", occurrence=first + 2 * WEEK), first + 2 * WEEK),
+    ]
@@ -0,0 +1,17 @@
+import time
+
+from timekeeper.event_store import SqliteEventStore
+
+
+def test_search_without_waiting_builds_the_index_in_the_background(tmp_path):
+    store = SqliteEventStore(str(tmp_path / "events.db"))
+    store.save_many([("standup", {"description": "Daily standup", "timestamp": 0, "created_by": "U1"}),
+                     ("review", {"description": "Design review", "timestamp": 0, "created_by": "U1"})])
+    # Nothing is indexed yet, so the answer is nothing rather than a wait
+    assert store.search("standup", wait=False) == []
+    deadline = time.monotonic() + 5
+    while not store.search("standup", wait=False):
+        assert time.monotonic() < deadline, "the index was never built"
+        time.sleep(0.01)
+    assert [code for code, _ in store.search("standup", wait=False)] == ["standup"]
+    store.close()
@@ -0,0 +1,49 @@
+import sqlite3
+import threading
+
+from timekeeper.sqlite_db import Connections
+
+
+def closed(conn):
+    try:
+        conn.execute("SELECT 1")
+    except sqlite3.ProgrammingError:
+        return True
+    return False
+
+
+def test_close_closes_every_threads_connection(tmp_path):
+    connections = Connections(str(tmp_path / "test.db"))
+    opened, ready, done = [], threading.Barrier(4), threading.Event()
+
+    def worker():
+        opened.append(connections.get())
+        ready.wait(5)
+        done.wait(5)
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    mine = connections.get()
+    ready.wait(5)
+    assert len({id(conn) for conn in opened + [mine]}) == 4
+    connections.close()
+    done.set()
+    for thread in threads:
+        thread.join()
+    assert all(closed(conn) for conn in opened + [mine])
+    # Asking again after close() reconnects
+    assert not closed(connections.get())
+    connections.close()
+
+
+def test_finished_threads_connections_are_closed(tmp_path):
+    connections = Connections(str(tmp_path / "test.db"))
+    opened = []
+    thread = threading.Thread(target=lambda: opened.append(connections.get()))
+    thread.start()
+    thread.join()
+    assert not closed(opened[0])
+    connections.get()
+    assert closed(opened[0])
+    connections.close()
@@ -0,0 +1,95 @@
+from datetime import datetime
+
+import pytest
+import pytz
+
+from timekeeper.time_ranges import interval_range, localize_boundary
+
+NEW_YORK = pytz.timezone("America/New_York")
+LONDON = pytz.timezone("Europe/London")
+UTC = pytz.utc
+
+
+def at(tz, *args):
+    return tz.localize(datetime(*args))
+
+
+def hours(seconds):
+    return seconds / 3600
+
+
+@pytest.mark.parametrize("day, length", [
+    ((2024, 3, 10, 12), 23),  # clocks go forward at 2:00
+    ((2024, 11, 3, 12), 25),  # clocks go back at 2:00
+    ((2024, 6, 1, 12), 24),
+])
+def test_day_follows_dst(day, length):
+    start, end = interval_range("day", NEW_YORK, at(NEW_YORK, *day))
+    assert hours(end - start) == length
+    assert start == at(NEW_YORK, *day[:3]).timestamp()
+
+
+def test_week_starts_on_monday_and_spans_dst():
+    # Wednesday 13 March 2024, in the week the US clocks went forward
+    start, end = interval_range("week", NEW_YORK, at(NEW_YORK, 2024, 3, 13, 9))
+    assert datetime.fromtimestamp(start, NEW_YORK).replace(tzinfo=None) == datetime(2024, 3, 11)
+    assert hours(end - start) == 7 * 24
+
+
+def test_week_containing_the_change():
+    start, end = interval_range("week", NEW_YORK, at(NEW_YORK, 2024, 3, 8, 9))
+    assert hours(end - start) == 7 * 24 - 1
+
+
+@pytest.mark.parametrize("tz, now, length", [
+    (NEW_YORK, (2024, 3, 15), 31 * 24 - 1),
+    (LONDON, (2024, 10, 15), 31 * 24 + 1),
+    (UTC, (2024, 2, 15), 29 * 24),
+])
+def test_month_follows_dst(tz, now, length):
+    start, end = interval_range("month", tz, at(tz, *now))
+    assert hours(end - start) == length
+
+
+def test_december_ends_at_new_year():
+    start, end = interval_range("month", UTC, at(UTC, 2024, 12, 31, 23))
+    assert (start, end) == (at(UTC, 2024, 12, 1).timestamp(), at(UTC, 2025, 1, 1).timestamp())
+
+
+def test_year():
+    start, end = interval_range("year", LONDON, at(LONDON, 2024, 7, 1))
+    assert (start, end) == (at(LONDON, 2024, 1, 1).timestamp(), at(LONDON, 2025, 1, 1).timestamp())
+
+
+def test_hour_in_repeated_hour_is_an_hour_long():
+    # 1:30 happens twice on 3 November 2024 in New York; take the second one
+    now = NEW_YORK.localize(datetime(2024, 11, 3, 1, 30), is_dst=False)
+    start, end = interval_range("hour", NEW_YORK, now)
+    assert hours(end - start) == 1
+    assert start <= now.timestamp() < end
+    assert start == now.timestamp() - 30 * 60
+
+
+def test_minute():
+    now = at(UTC, 2024, 1, 1, 12, 34, 56)
+    assert interval_range("minute", UTC, now) == (at(UTC, 2024, 1, 1, 12, 34).timestamp(),
+                                                  at(UTC, 2024, 1, 1, 12, 35).timestamp())
+
+
+def test_unknown_interval_means_all_events():
+    assert interval_range("fortnight", UTC) is None
+    assert interval_range("", UTC) is None
+
+
+def test_day_starting_in_skipped_hour_starts_when_the_clocks_jump():
+    # Havana's clocks went from midnight straight to 1:00 on 10 March 2024
+    havana = pytz.timezone("America/Havana")
+    assert localize_boundary(havana, datetime(2024, 3, 10)) == at(havana, 2024, 3, 10, 1)
+    start, end = interval_range("day", havana, at(havana, 2024, 3, 10, 12))
+    assert start == at(havana, 2024, 3, 10, 1).timestamp()
+    assert hours(end - start) == 23
+
+
+def test_boundary_in_repeated_hour_is_the_first():
+    boundary = localize_boundary(NEW_YORK, datetime(2024, 11, 3, 1, 30))
+    assert boundary.timestamp() == NEW_YORK.localize(datetime(2024, 11, 3, 1, 30), is_dst=True).timestamp()
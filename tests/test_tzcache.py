@@ -0,0 +1,121 @@
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from timekeeper.slack_http import SlackHttp
+from timekeeper.tzcache import RateLimited, TimezoneCache
+
+
+class SlowFetch:
+    """A users.info stand-in that holds every call until released, counting them."""
+
+    def __init__(self, timezones=None):
+        self.timezones = timezones or {}
+        self.calls = Counter()
+        self.batches = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self, user_id):
+        with self._lock:
+            self.calls[user_id] += 1
+        self.started.set()
+        self.release.wait(5)
+        return self.timezones.get(user_id, "Asia/Tokyo")
+
+    def many(self, user_ids):
+        with self._lock:
+            self.batches.append(sorted(user_ids))
+        self.started.set()
+        self.release.wait(5)
+        return {user_id: self.timezones.get(user_id, "Asia/Tokyo") for user_id in user_ids}
+
+
+def test_concurrent_misses_for_a_user_make_one_fetch():
+    fetch = SlowFetch({"U1": "Europe/Berlin"})
+    cache = TimezoneCache(fetch)
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        results = [pool.submit(cache.get, "U1") for _ in range(20)]
+        assert fetch.started.wait(5)
+        fetch.release.set()
+        assert {future.result() for future in results} == {"Europe/Berlin"}
+    assert fetch.calls == {"U1": 1}
+    assert cache.stats()["misses"] == 1
+    assert cache.get("U1") == "Europe/Berlin"
+    assert fetch.calls == {"U1": 1}
+
+
+def test_different_users_are_fetched_separately():
+    fetch = SlowFetch()
+    fetch.release.set()
+    cache = TimezoneCache(fetch)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(cache.get, ["U1", "U2", "U1", "U3", "U2"]))
+    assert fetch.calls == {"U1": 1, "U2": 1, "U3": 1}
+
+
+def test_get_many_batches_misses_and_waits_for_lookups_in_flight():
+    fetch = SlowFetch({"U1": "Europe/Berlin", "U2": "US/Pacific"})
+    cache = TimezoneCache(fetch, fetch_many=fetch.many)
+    cache.put("U3", "Asia/Singapore")
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        single = pool.submit(cache.get, "U1")
+        assert fetch.started.wait(5)
+        many = pool.submit(cache.get_many, ["U1", "U2", "U3", "U4"])
+        fetch.release.set()
+        assert single.result() == "Europe/Berlin"
+        assert many.result() == {"U1": "Europe/Berlin", "U2": "US/Pacific", "U3": "Asia/Singapore",
+                                 "U4": "Asia/Tokyo"}
+    # U1 was already being fetched and U3 cached, so only the rest went out, together
+    assert fetch.calls == {"U1": 1}
+    assert fetch.batches == [["U2", "U4"]]
+
+
+def test_waiters_share_the_fallback_when_the_fetch_fails():
+    release = threading.Event()
+    calls = []
+
+    def failing(user_id):
+        calls.append(user_id)
+        release.wait(5)
+        raise OSError("connection reset")
+
+    cache = TimezoneCache(failing, default="America/New_York")
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        results = [pool.submit(cache.get, "U1") for _ in range(5)]
+        release.set()
+        assert {future.result() for future in results} == {"America/New_York"}
+    assert calls == ["U1"]
+
+
+def test_rate_limit_serves_stale_values_without_fetching():
+    calls = []
+
+    def fetch(user_id):
+        calls.append(user_id)
+        raise RateLimited(60)
+
+    cache = TimezoneCache(fetch, ttl=0, default="America/New_York")
+    cache.put("U1", "Europe/Berlin")
+    assert cache.get("U1") == "Europe/Berlin"
+    assert calls == ["U1"]
+    # Backing off: neither the expired entry nor an unknown user is fetched
+    assert cache.get("U1") == "Europe/Berlin"
+    assert cache.get("U2") == "America/New_York"
+    assert calls == ["U1"]
+    assert cache.stats()["blocked_for"] > 0
+
+
+def test_refused_lookup_falls_back_without_caching(monkeypatch):
+    # Slack answers 200 with ok: false for an unknown user or a revoked token
+    http = SlackHttp("xoxb-test")
+    answers = []
+    monkeypatch.setattr(http, "_call", lambda method, token, params: answers.append(method) or
+                        {"ok": False, "error": "user_not_found"})
+    cache = TimezoneCache(http.user_timezone, default="America/New_York")
+    assert cache.get("U1") == "America/New_York"
+    assert cache.get("U1") == "America/New_York"
+    assert answers == ["users.info", "users.info"]
+    assert cache.stats()["size"] == 0
+    http.close()
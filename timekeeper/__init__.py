@@ -0,0 +1,5 @@
+"""The bot's modules: the Bolt app in app, the asyncio one in async_app, and what they share.
+
+Nothing is imported here, so `python -m timekeeper.bulk` and the scripts next to this
+package load only the modules they use.
+"""
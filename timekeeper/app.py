@@ -0,0 +1,597 @@
+import functools
+import json
+import os
+import tempfile
+import threading
+
+# The bot's folder, one up from this package, where its data files live by default
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only light modules are imported up front. slack_bolt, slack_sdk, requests and dotenv load
+# when the app is built, and the timezone index and tzdata when they're first needed, so
+# importing this module is fast and never touches the network.
+from . import bulk
+from .metrics import metrics
+from .responses import (
+    DEFAULT_TIMEZONE,
+    EVENTS_PER_PAGE,
+    OPTIONS_LIMIT,
+    UNKNOWN_IMPORT_FORMAT,
+    event_options,
+    export_comment,
+    export_format,
+    find_event_response,
+    find_event_view,
+    get_event_response,
+    get_event_timezone,
+    get_event_users,
+    get_time_response,
+    get_time_users,
+    import_events_view,
+    import_report,
+    list_events_page,
+    load_zone_groups,
+    reschedule_reminders,
+    reset_time_view,
+    save_conflict,
+    save_error,
+    save_failure,
+    schedule_reminder,
+    set_event_view,
+    store_error,
+    submitted_event,
+    submitted_import,
+    unknown_timezone,
+    zone_group_command,
+)
+from .recurrence import next_occurrences
+from .render import formatter
+from .time_ranges import interval_range
+from .tz_resolver import UnknownTimezone, resolver
+from .tzcache import RateLimited
+from .workspaces import DEFAULT_SCOPES, bot_token, installation_stores, oauth_settings, shard_path
+
+# The shared services below, built by build_services() on first use
+SERVICES = ("event_store", "event_shards", "installation_store", "state_store", "slack_http", "web_client",
+            "timezone_cache", "reminders", "workers")
+
+_build_lock = threading.RLock()
+_services_built = False
+_app = None
+
+@functools.lru_cache(maxsize=None)
+def load_env():
+    """Reads .env into the environment, once, before any setting is read."""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+def build_services():
+    """Builds the Slack clients, event store, timezone cache, reminder queue and worker pool.
+
+    With SLACK_CLIENT_ID set the bot is installed into workspaces over OAuth: tokens come
+    from installation_store and every workspace gets an event store of its own from
+    event_shards, with event_store left as None.
+    """
+    global SLACK_API_URL, SLACK_TIMEOUT, _services_built
+    global event_store, event_shards, installation_store, state_store
+    global slack_http, web_client, timezone_cache, reminders, workers
+    with _build_lock:
+        if _services_built:
+            return
+        load_env()
+        from slack_sdk.http_retry.builtin_handlers import (
+            ConnectionErrorRetryHandler,
+            RateLimitErrorRetryHandler,
+            ServerErrorRetryHandler,
+        )
+
+        from .event_store import EventStoreShards, open_event_store
+        from .reminders import ReminderScheduler
+        from .slack_http import SlackHttp, TimedWebClient
+        from .tzcache import TimezoneCache
+        from .workers import WorkerPool
+
+        SLACK_API_URL = os.getenv("SLACK_API_URL", "https://slack.com/api/")
+        SLACK_TIMEOUT = float(os.getenv("SLACK_TIMEOUT", 5))
+
+        # Bolt's client, also used to send reminders
+        web_client = TimedWebClient(
+            token=os.getenv("SLACK_BOT_TOKEN"),
+            base_url=SLACK_API_URL,
+            timeout=SLACK_TIMEOUT,
+            retry_handlers=[
+                ConnectionErrorRetryHandler(max_retry_count=2),
+                RateLimitErrorRetryHandler(max_retry_count=2),
+                ServerErrorRetryHandler(max_retry_count=2),
+            ],
+        )
+
+        # Construct full path to events.json inside the same folder
+        events_path = os.path.join(BASE_DIR, "events.json")
+        # Events live in SQLite by default; EVENT_STORE=json keeps using events.json directly.
+        # An existing events.json is imported into the database the first time it is opened.
+        kind = os.getenv("EVENT_STORE", "sqlite")
+        if os.getenv("SLACK_CLIENT_ID"):
+            installation_store, state_store = installation_stores(os.getenv("INSTALLATIONS_DIR", BASE_DIR))
+            # One store per workspace under EVENTS_DIR, so workspaces never see each other's codes
+            # and a big workspace's events are never loaded to answer another's commands
+            events_dir = os.getenv("EVENTS_DIR", os.path.join(BASE_DIR, "events"))
+            os.makedirs(events_dir, exist_ok=True)
+
+            def open_shard(team_id):
+                path = shard_path(events_dir, team_id, ".json" if kind == "json" else ".db")
+                if kind == "json" and not os.path.exists(path):
+                    try:
+                        with open(path, "x") as f:
+                            f.write("{}")
+                    except FileExistsError:
+                        pass
+                return metrics.instrument(open_event_store(kind, path), "event_store")
+
+            event_store = None
+            event_shards = EventStoreShards(open_shard, max_open=int(os.getenv("EVENT_STORE_SHARDS", 64)))
+        else:
+            installation_store = state_store = event_shards = None
+            event_store = metrics.instrument(open_event_store(
+                kind,
+                events_path if kind == "json" else os.getenv("EVENTS_DB", os.path.join(BASE_DIR, "events.db")),
+                legacy_json_path=events_path,
+            ), "event_store")
+        # Shared keep-alive session for the Slack calls we make outside of Bolt's client
+        slack_http = SlackHttp(os.getenv("SLACK_BOT_TOKEN"), base_url=SLACK_API_URL, timeout=SLACK_TIMEOUT)
+
+        timezone_cache = TimezoneCache(
+            slack_http.user_timezone,
+            ttl=int(os.getenv("TZ_CACHE_TTL", 6 * 60 * 60)),
+            fetch_many=slack_http.user_timezones,
+        )
+
+        # Reminders are queued in SQLite and sent by a background thread, so they survive restarts
+        # and repeated clicks on the same "Remind me" button don't schedule duplicates
+        reminders = ReminderScheduler(
+            os.getenv("REMINDERS_DB", os.path.join(BASE_DIR, "reminders.db")),
+            send_reminder,
+            rate=float(os.getenv("REMINDER_RATE", 10)),
+        )
+
+        # Handlers ack straight away and leave the slow part (Slack API calls, the event store,
+        # rendering) to this pool, so Slack gets its response well within 3 seconds
+        workers = WorkerPool(
+            workers=int(os.getenv("WORKER_THREADS", 8)),
+            max_queue=int(os.getenv("WORKER_QUEUE", 200)),
+        )
+
+        # Served on /metrics next to the latency histograms; TIMEKEEPER_PROFILE=0.05 profiles 5% of handler runs
+        metrics.collect("timekeeper_workers", workers.stats)
+        metrics.collect("timekeeper_tz_cache", timezone_cache.stats)
+        if event_shards is not None:
+            metrics.collect("timekeeper_event_shards", event_shards.stats)
+        else:
+            metrics.collect("timekeeper_event_store", event_store.stats)
+        metrics.collect("timekeeper_reminders", reminders.stats)
+        metrics.collect("timekeeper_next_occurrences", next_occurrences.stats)
+        metrics.profile_rate = float(os.getenv("TIMEKEEPER_PROFILE", 0))
+        _services_built = True
+
+def create_app():
+    """Builds a Bolt app with every command and action below registered on it.
+
+    The token is checked with auth.test on the first request instead of here, so building
+    the app doesn't touch the network either.
+    """
+    from slack_bolt import App
+
+    build_services()
+    settings = install_settings()
+    if settings is not None:
+        # Bolt looks up the bot token of the workspace each request comes from
+        app = App(client=web_client, signing_secret=os.getenv("SLACK_SIGNING_SECRET"), oauth_settings=settings)
+    else:
+        app = App(
+            client=web_client,
+            signing_secret=os.getenv("SLACK_SIGNING_SECRET"),
+            token_verification_enabled=False,
+        )
+    # Time every request from arrival to ack
+    app.use(metrics.middleware)
+    app.command("/get_time")(handle_get_time)
+    app.command("/zone_group")(handle_zone_group)
+    app.command("/get_event")(handle_get_event)
+    app.command("/set_event")(handle_set_event)
+    app.view("save_event")(handle_save_event)
+    app.action("reset_time")(handle_reset_time)
+    app.action("reminder")(handle_reminder)
+    app.command("/list_events")(handle_list_events)
+    app.action("list_events_page")(handle_list_events_page)
+    app.command("/find_event")(handle_find_event)
+    app.options("event_search")(handle_event_options)
+    app.action("event_search")(handle_event_selected)
+    app.command("/export_events")(handle_export_events)
+    app.command("/import_events")(handle_import_events)
+    app.view("import_events")(handle_import_file)
+    return app
+
+def install_settings(asynchronous=False):
+    """Bolt's OAuth settings when installed into many workspaces, else None."""
+    if installation_store is None:
+        return None
+    return oauth_settings(
+        os.getenv("SLACK_CLIENT_ID"),
+        os.getenv("SLACK_CLIENT_SECRET"),
+        installation_store,
+        state_store,
+        scopes=os.getenv("SLACK_SCOPES", DEFAULT_SCOPES),
+        asynchronous=asynchronous,
+    )
+
+def get_app():
+    """The app this module serves, built by create_app() on first use."""
+    global _app
+    with _build_lock:
+        if _app is None:
+            _app = create_app()
+    return _app
+
+def __getattr__(name):
+    # `app` and the services are built when someone first asks for them, not at import
+    if name == "app":
+        return get_app()
+    if name in SERVICES:
+        build_services()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def prewarm():
+    """Loads what the first requests would otherwise wait for: the timezone index, tzdata and
+    formatters for the default timezone, and the event store (the JSON snapshot, or SQLite's pages)
+    with its search index."""
+    build_services()
+    resolver.find(DEFAULT_TIMEZONE)
+    formatter(DEFAULT_TIMEZONE, "%Y-%m-%d %H:%M:%S %Z")(0)
+    # Workspaces' stores open when their first request comes in
+    if event_store is not None:
+        # An empty search matches nothing, but builds the search index
+        event_store.search("")
+
+def on_listening():
+    """Runs once the port is bound: starts sending reminders and prewarms in the background,
+    unless TIMEKEEPER_PREWARM=0."""
+    reminders.start()
+    if os.getenv("TIMEKEEPER_PREWARM", "1").lower() in ("1", "true", "yes"):
+        threading.Thread(target=prewarm, name="timekeeper-prewarm", daemon=True).start()
+
+def workspace(context):
+    """The workspace a request came from, or "" when there is only the one."""
+    return context.team_id if event_shards is not None else ""
+
+def store_for(team_id):
+    """The event store of a workspace ("" for the single-workspace store)."""
+    return event_shards.for_team(team_id) if event_shards is not None else event_store
+
+def workspace_token(context):
+    """The bot token for the request's workspace, or None to use SLACK_BOT_TOKEN."""
+    return context.bot_token if installation_store is not None else None
+
+def get_user_timezone(user_id, context):
+    """Fetches the user's timezone from Slack API, going to the network only on a cache miss."""
+    return timezone_cache.get(user_id, workspace_token(context))
+
+def get_user_timezones(user_ids, context):
+    """Fetches several users' timezones in one pass."""
+    return timezone_cache.get_many(user_ids, workspace_token(context))
+
+def send_reminder(user_id, text, team_id=""):
+    """Delivers a due reminder as a DM, telling the scheduler when Slack wants us to slow down."""
+    from slack_sdk.errors import SlackApiError
+
+    # Outside of a request there's no context to take the workspace's token from
+    token = {"token": bot_token(installation_store, team_id)} if team_id else {}
+    try:
+        web_client.chat_postMessage(channel=user_id, text=text, **token)
+    except SlackApiError as e:
+        if e.response.status_code == 429:
+            raise RateLimited(int(e.response.headers.get("Retry-After", 30))) from e
+        raise
+
+def in_background(work, *args, busy=None):
+    """Hands work to the worker pool; if the queue is full, calls busy() or else runs it right here."""
+    if not workers.submit(metrics.run, work.__name__, work, *args):
+        if busy is None:
+            metrics.run(work.__name__, work, *args)
+        else:
+            busy()
+
+def too_busy(respond):
+    return lambda: respond("⏳ TimeKeeper is busy right now, please try again in a moment.")
+
+# get time
+def handle_get_time(ack, respond, command, context):
+    ack()
+    in_background(get_time, command, respond, context, busy=too_busy(respond))
+
+def get_time(command, respond, context):
+    args = command.get("text", "").strip().split()
+    try:
+        groups = load_zone_groups(store_for(workspace(context)), args)
+    except Exception as e:
+        respond(store_error(e, "reading zone groups"))
+        return
+    # Resolve every mentioned user (and the caller) in one go
+    timezones = get_user_timezones(get_time_users(args, command["user_id"], groups), context)
+    respond(**get_time_response(args, command["user_id"], timezones, groups))
+
+def handle_zone_group(ack, respond, command, context):
+    ack()
+    in_background(zone_group, command, respond, context, busy=too_busy(respond))
+
+def zone_group(command, respond, context):
+    args = command.get("text", "").strip().split()
+    try:
+        store = store_for(workspace(context))
+    except Exception as e:
+        respond(store_error(e, "reading zone groups"))
+        return
+    respond(**zone_group_command(store, args, command["user_id"]))
+
+def handle_get_event(ack, respond, command, context):
+    ack()
+    in_background(get_event, command, respond, context, busy=too_busy(respond))
+
+def get_event(command, respond, context):
+    command_args = command.get("text", "").strip().split()
+    event_id = command_args[0] if command_args else None
+    if not event_id:
+        respond("❌ Please provide an event ID.")
+        return
+    timezones = get_user_timezones(get_event_users(command_args, command["user_id"]), context)
+
+    try:
+        timezone_name = get_event_timezone(command_args, command["user_id"], timezones)
+        event = store_for(workspace(context)).get(event_id)
+    except UnknownTimezone as e:
+        respond(unknown_timezone(e))
+        return
+    except Exception as e:
+        respond(store_error(e, "retrieving event"))
+        return
+    respond(**get_event_response(event_id, event, timezone_name))
+
+def handle_set_event(ack, respond, command, client, context):
+    ack()
+    in_background(set_event, command, respond, client, context, busy=too_busy(respond))
+
+def set_event(command, respond, client, context):
+    code = command.get("text", "").strip()
+    if not code:
+        respond("❌ Please provide an event ID.")
+        return
+    try:
+        # Get user's timezone
+        user_timezone_name = get_user_timezone(command["user_id"], context)
+        event = store_for(workspace(context)).get(code)
+        view = set_event_view(code, event, command["user_id"], user_timezone_name)
+        if view is None:
+            respond("❌ Event has been created by another user.")
+            return
+        client.views_open(trigger_id=command["trigger_id"], view=view)
+    except Exception as e:
+        respond(store_error(e, "retrieving event"))
+
+def handle_save_event(ack, body, view, client, context):
+    # Only the cheap checks happen before the ack: the form itself, the code, owner and version
+    try:
+        new_code, original_code, event, version = submitted_event(view, body["user"]["id"])
+        team_id = workspace(context)
+        errors = save_conflict(store_for(team_id), new_code, original_code, version, body["user"]["id"])
+        if errors:
+            ack(response_action="errors", errors=errors)
+            return
+    except Exception as e:
+        ack(response_action="errors", errors=save_error(e))
+        return
+    # ✅ Everything is fine — close modal and save in the background
+    ack()
+    in_background(save_event, new_code, original_code, event, version, client, team_id)
+
+def save_event(new_code, original_code, event, version, client, team_id=""):
+    try:
+        # Save the event, renaming it if the code has changed. The store checks again, atomically,
+        # that the code is free and the event is still theirs and unchanged since the modal opened.
+        store = store_for(team_id)
+        previous = store.get(original_code or new_code)
+        store.save(new_code, event, original_code=original_code, expected_version=version, owner=event["created_by"])
+    except Exception as e:
+        notify_failure(client, event["created_by"], save_failure(e, new_code))
+        return
+    # The rule or first occurrence may have changed
+    next_occurrences.forget(original_code, new_code)
+    # Reminders people already set for this event follow it to its new time and code
+    try:
+        note = reschedule_reminders(reminders, new_code, event, original_code, team_id, previous)
+        if note:
+            client.chat_postMessage(channel=event["created_by"], text=note)
+    except Exception as e:
+        notify_failure(client, event["created_by"], f"❌ Reminders for `{new_code}` were not updated: `{str(e)}`")
+
+def notify_failure(client, user_id, text):
+    """The modal is already closed once we save, so failures go to the user's DMs."""
+    client.chat_postMessage(channel=user_id, text=text)
+
+def handle_reset_time(ack, body, client):
+    ack()
+    in_background(reset_time, body, client)
+
+def reset_time(body, client):
+    view = body["view"]
+    # Update the modal
+    client.views_update(
+        view_id=view["id"],
+        view=reset_time_view(view)
+    )
+
+def handle_reminder(ack, client, action, respond, body, context):
+    ack()
+    in_background(set_reminder, client, action, respond, body, workspace(context), busy=too_busy(respond))
+
+def set_reminder(client, action, respond, body, team_id):
+    try:
+        respond(schedule_reminder(reminders, action, body, team_id=team_id))
+    except Exception as e:
+        respond(f"❌ Error setting reminder: `{str(e)}`")
+
+def handle_list_events(ack, respond, command, context):
+    ack()
+    in_background(list_events, command, respond, context, busy=too_busy(respond))
+
+def list_events(command, respond, context):
+    interval = command.get("text", "").strip()
+    timezone_name = get_user_timezone(command["user_id"], context)
+
+    try:
+        # Turn the interval into a UTC [start, end) window and only read events inside it
+        # Default to all events if no interval is specified
+        start, end = interval_range(interval, resolver.timezone(timezone_name)) or (None, None)
+        blocks = list_events_page(store_for(workspace(context)), start, end, timezone_name)
+        if not blocks:
+            respond("❌ No events found.")
+            return
+        respond(blocks=blocks)
+    except Exception as e:
+        respond(store_error(e, "listing events"))
+
+def handle_list_events_page(ack, action, respond, context):
+    ack()
+    in_background(list_events_next_page, action, respond, context, busy=too_busy(respond))
+
+def list_events_next_page(action, respond, context):
+    try:
+        cursor = json.loads(action["value"])
+        blocks = list_events_page(
+            store_for(workspace(context)), cursor["start"], cursor["end"], cursor["timezone"], after=cursor["after"],
+            now=cursor.get("now"),
+        )
+        if not blocks:
+            respond("❌ No more events.")
+            return
+        respond(blocks=blocks, replace_original=True)
+    except Exception as e:
+        respond(f"❌ Error listing events: `{str(e)}`")
+
+def handle_find_event(ack, respond, command, client, context):
+    ack()
+    in_background(find_event, command, respond, client, context, busy=too_busy(respond))
+
+def find_event(command, respond, client, context):
+    query = command.get("text", "").strip()
+    try:
+        if not query:
+            # Without a query, open a modal that autocompletes codes as they type
+            client.views_open(trigger_id=command["trigger_id"], view=find_event_view())
+            return
+        timezone_name = get_user_timezone(command["user_id"], context)
+        # One more than fits, to know whether to tell them to narrow it down
+        results = store_for(workspace(context)).search(query, EVENTS_PER_PAGE + 1)
+        respond(**find_event_response(query, results, timezone_name))
+    except Exception as e:
+        respond(store_error(e, "searching events"))
+
+def handle_event_options(ack, payload, context):
+    # Slack drops options that take more than 3 seconds, and a search takes milliseconds,
+    # so answer right here rather than from the worker pool; but not while the index is built
+    try:
+        results = store_for(workspace(context)).search(payload.get("value", ""), OPTIONS_LIMIT, wait=False)
+    except Exception as e:
+        metrics.error(e, doing="searching events")
+        results = []
+    ack(options=event_options(results))
+
+def handle_event_selected(ack, body, action, client, context):
+    ack()
+    in_background(show_selected_event, body, action, client, context)
+
+def show_selected_event(body, action, client, context):
+    code = action["selected_option"]["value"]
+    timezone_name = get_user_timezone(body["user"]["id"], context)
+    event = store_for(workspace(context)).get(code)
+    client.views_update(view_id=body["view"]["id"], view=find_event_view(code, event, timezone_name))
+
+def handle_export_events(ack, respond, command, client, context):
+    ack()
+    in_background(export_events, command, respond, client, context, busy=too_busy(respond))
+
+def export_events(command, respond, client, context):
+    fmt = export_format(command.get("text", ""))
+    if fmt is None:
+        respond("❌ Export as `ndjson`, `csv` or `ics`.")
+        return
+    try:
+        # Streamed to disk and uploaded from there, so the events are never all in memory at once
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, f"events.{fmt}")
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                stats = bulk.export_events(store_for(workspace(context)), fmt, f)
+            channel = client.conversations_open(users=command["user_id"])["channel"]["id"]
+            client.files_upload_v2(channel=channel, file=path, filename=f"events.{fmt}",
+                                   initial_comment=export_comment(fmt, stats))
+    except Exception as e:
+        respond(store_error(e, "exporting events"))
+        return
+    respond(f"📤 Sent you `events.{fmt}` in a DM.")
+
+def handle_import_events(ack, respond, command, client):
+    ack()
+    in_background(open_import_events, command, respond, client, busy=too_busy(respond))
+
+def open_import_events(command, respond, client):
+    try:
+        client.views_open(trigger_id=command["trigger_id"], view=import_events_view())
+    except Exception as e:
+        respond(f"❌ Error opening the import: `{str(e)}`")
+
+def handle_import_file(ack, body, view, client, context):
+    file, fmt = submitted_import(view)
+    if fmt is None:
+        ack(response_action="errors", errors={"file_block": UNKNOWN_IMPORT_FORMAT})
+        return
+    # A big file takes longer than Slack waits for the modal to close, so report by DM
+    ack()
+    in_background(import_events, file, fmt, body["user"]["id"], client, workspace(context),
+                  workspace_token(context))
+
+def import_events(file, fmt, user_id, client, team_id, token):
+    try:
+        # Downloaded as it is imported; everything is imported as theirs, and their events only
+        stats = bulk.import_events(store_for(team_id), fmt,
+                                   slack_http.download_lines(file["url_private_download"], token), owner=user_id)
+    except Exception as e:
+        notify_failure(client, user_id, store_error(e, "importing events", f"importing `{file.get('name')}`"))
+        return
+    client.chat_postMessage(channel=user_id, text=import_report(file.get("name"), stats))
+
+def main():
+    """Serves the bot on $PORT until it is stopped."""
+    load_env()
+    port = int(os.getenv("PORT", 3000))
+    if os.getenv("TIMEKEEPER_ASYNC", "").lower() in ("1", "true", "yes"):
+        from .async_app import create_async_app, serve
+
+        build_services()
+        serve(create_async_app(
+            event_store,
+            timezone_cache,
+            reminders,
+            token=os.getenv("SLACK_BOT_TOKEN"),
+            signing_secret=os.getenv("SLACK_SIGNING_SECRET"),
+            base_url=SLACK_API_URL,
+            timeout=SLACK_TIMEOUT,
+            event_shards=event_shards,
+            oauth_settings=install_settings(asynchronous=True),
+        ), port=port, ready=on_listening)
+    else:
+        from .server import serve
+
+        serve(get_app(), metrics, port=port, ready=on_listening)
+
+if __name__ == "__main__":
+    main()
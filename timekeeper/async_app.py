@@ -0,0 +1,486 @@
+"""The same commands and actions as app.py on slack_bolt's AsyncApp.
+
+Timezone lookups go through aiohttp and event store calls run in worker threads, so a
+slow users.info or views.open call never holds up other requests. Select it with
+TIMEKEEPER_ASYNC=1.
+"""
+import asyncio
+import json
+import os
+import tempfile
+
+import aiohttp
+from aiohttp import web
+from slack_bolt.async_app import AsyncApp
+from slack_sdk.http_retry.builtin_async_handlers import (
+    AsyncConnectionErrorRetryHandler,
+    AsyncRateLimitErrorRetryHandler,
+    AsyncServerErrorRetryHandler,
+)
+from slack_sdk.web.async_client import AsyncWebClient
+
+from . import bulk
+from .metrics import metrics
+from .recurrence import next_occurrences
+from .responses import (
+    EVENTS_PER_PAGE,
+    OPTIONS_LIMIT,
+    UNKNOWN_IMPORT_FORMAT,
+    event_options,
+    export_comment,
+    export_format,
+    find_event_response,
+    find_event_view,
+    get_event_response,
+    get_event_timezone,
+    get_event_users,
+    get_time_response,
+    get_time_users,
+    import_events_view,
+    import_report,
+    list_events_page,
+    load_zone_groups,
+    reschedule_reminders,
+    reset_time_view,
+    save_error,
+    schedule_reminder,
+    set_event_view,
+    store_error,
+    submitted_event,
+    submitted_import,
+    unknown_timezone,
+    zone_group_command,
+)
+from .slack_http import DEFAULT_BASE_URL, checked, timezone_of
+from .time_ranges import interval_range
+from .tz_resolver import UnknownTimezone, resolver
+from .tzcache import RateLimited
+
+
+class AsyncSlackHttp:
+    """aiohttp counterpart of SlackHttp: pooled connections, timeouts and bounded retries."""
+
+    def __init__(self, token, base_url=DEFAULT_BASE_URL, timeout=5, max_retries=3,
+                 backoff=0.5, max_backoff=30, pool_size=20):
+        self.token = token
+        self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+        self._session = None
+
+    def session(self):
+        # aiohttp sessions belong to the running loop, so create it on first use
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=self.timeout,
+            )
+        return self._session
+
+    async def call(self, method, token=None, **params):
+        with metrics.timer("slack_http", method=method):
+            return checked(method, await self._call(method, token, params))
+
+    async def _call(self, method, token, params):
+        headers = {"Authorization": f"Bearer {token or self.token}"}
+        attempt = 0
+        while True:
+            try:
+                async with self.session().get(self.base_url + method, params=params, headers=headers) as response:
+                    if response.status == 429:
+                        retry_after = int(response.headers.get("Retry-After", 1))
+                        if attempt >= self.max_retries or retry_after > self.max_backoff:
+                            raise RateLimited(retry_after)
+                        delay = retry_after
+                    elif response.status >= 500 and attempt < self.max_retries:
+                        delay = self._delay(attempt)
+                    else:
+                        response.raise_for_status()
+                        return await response.json()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._delay(attempt)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def _delay(self, attempt):
+        return min(self.backoff * (2 ** attempt), self.max_backoff)
+
+    async def user_timezone(self, user_id, token=None):
+        return timezone_of(await self.call("users.info", token=token, user=user_id))
+
+    async def download(self, url, out, token=None, chunk_size=1 << 16):
+        """Streams a file shared with the bot (its url_private_download) into the binary file out."""
+        headers = {"Authorization": f"Bearer {token or self.token}"}
+        # The session's total timeout is for API calls; a big file only has to keep arriving
+        timeout = aiohttp.ClientTimeout(sock_read=self.timeout.total)
+        with metrics.timer("slack_http", method="files.download"):
+            async with self.session().get(url, headers=headers, timeout=timeout) as response:
+                response.raise_for_status()
+                if response.content_type == "text/html":
+                    raise PermissionError("Slack didn't send the file, the app needs the files:read scope")
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    out.write(chunk)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+
+class TimedAsyncWebClient(AsyncWebClient):
+    """AsyncWebClient with every API call timed as the slack_api phase."""
+
+    async def api_call(self, api_method, **kwargs):
+        with metrics.timer("slack_api", method=api_method):
+            return await super().api_call(api_method, **kwargs)
+
+
+class AsyncTimezones:
+    """Looks users up through the shared TimezoneCache, coalescing concurrent misses."""
+
+    def __init__(self, cache, http):
+        self.cache = cache
+        self.http = http
+        self._pending = {}
+
+    async def get(self, user_id, token=None):
+        timezone = self.cache.lookup(user_id)
+        if timezone is not None:
+            return timezone
+        pending = self._pending.get(user_id)
+        if pending is None:
+            pending = self._pending[user_id] = asyncio.ensure_future(self._fetch(user_id, token))
+            pending.add_done_callback(lambda _: self._pending.pop(user_id, None))
+        return await asyncio.shield(pending)
+
+    async def _fetch(self, user_id, token):
+        try:
+            timezone = await self.http.user_timezone(user_id, token)
+        except Exception as e:
+            return self.cache.failed(user_id, e)
+        self.cache.put(user_id, timezone)
+        return timezone
+
+    async def get_many(self, user_ids, token=None):
+        user_ids = list(dict.fromkeys(user_ids))
+        timezones = await asyncio.gather(*(self.get(user_id, token) for user_id in user_ids))
+        return dict(zip(user_ids, timezones))
+
+
+def create_async_app(event_store, timezone_cache, reminders, token, signing_secret,
+                     base_url=DEFAULT_BASE_URL, timeout=5, http=None, event_shards=None, oauth_settings=None):
+    """Builds an AsyncApp sharing the sync app's event store, timezone cache and reminder queue.
+
+    With oauth_settings the app is installed into many workspaces, and each workspace's
+    events come from event_shards instead of event_store.
+    """
+    app = AsyncApp(
+        client=TimedAsyncWebClient(
+            token=token,
+            base_url=base_url,
+            timeout=timeout,
+            retry_handlers=[
+                AsyncConnectionErrorRetryHandler(max_retry_count=2),
+                AsyncRateLimitErrorRetryHandler(max_retry_count=2),
+                AsyncServerErrorRetryHandler(max_retry_count=2),
+            ],
+        ),
+        signing_secret=signing_secret,
+        oauth_settings=oauth_settings,
+    )
+    app.use(metrics.async_middleware)
+    http = http or AsyncSlackHttp(token, base_url=base_url, timeout=timeout)
+    timezones = AsyncTimezones(timezone_cache, http)
+
+    def workspace(context):
+        return context.team_id if event_shards is not None else ""
+
+    def workspace_token(context):
+        return context.bot_token if event_shards is not None else None
+
+    async def store_for(context):
+        if event_shards is None:
+            return event_store
+        # Opening a workspace's store may read its whole file, so keep it off the loop
+        return await asyncio.to_thread(event_shards.for_team, context.team_id)
+
+    @app.command("/get_time")
+    @metrics.async_handler
+    async def handle_get_time(ack, respond, command, context):
+        await ack()
+        args = command.get("text", "").strip().split()
+        try:
+            groups = await asyncio.to_thread(load_zone_groups, await store_for(context), args)
+        except Exception as e:
+            await respond(store_error(e, "reading zone groups"))
+            return
+        found = await timezones.get_many(get_time_users(args, command["user_id"], groups), workspace_token(context))
+        await respond(**get_time_response(args, command["user_id"], found, groups))
+
+    @app.command("/zone_group")
+    @metrics.async_handler
+    async def handle_zone_group(ack, respond, command, context):
+        await ack()
+        args = command.get("text", "").strip().split()
+        try:
+            store = await store_for(context)
+        except Exception as e:
+            await respond(store_error(e, "reading zone groups"))
+            return
+        await respond(**await asyncio.to_thread(zone_group_command, store, args, command["user_id"]))
+
+    @app.command("/get_event")
+    @metrics.async_handler
+    async def handle_get_event(ack, respond, command, context):
+        await ack()
+        command_args = command.get("text", "").strip().split()
+        event_id = command_args[0] if command_args else None
+        if not event_id:
+            await respond("❌ Please provide an event ID.")
+            return
+        found = await timezones.get_many(get_event_users(command_args, command["user_id"]), workspace_token(context))
+
+        try:
+            timezone_name = get_event_timezone(command_args, command["user_id"], found)
+            event = await asyncio.to_thread((await store_for(context)).get, event_id)
+        except UnknownTimezone as e:
+            await respond(unknown_timezone(e))
+            return
+        except Exception as e:
+            await respond(store_error(e, "retrieving event"))
+            return
+        await respond(**get_event_response(event_id, event, timezone_name))
+
+    @app.command("/set_event")
+    @metrics.async_handler
+    async def handle_set_event(ack, respond, command, client, context):
+        await ack()
+        code = command.get("text", "").strip()
+        if not code:
+            await respond("❌ Please provide an event ID.")
+            return
+        try:
+            user_timezone_name = await timezones.get(command["user_id"], workspace_token(context))
+            event = await asyncio.to_thread((await store_for(context)).get, code)
+            view = set_event_view(code, event, command["user_id"], user_timezone_name)
+            if view is None:
+                await respond("❌ Event has been created by another user.")
+                return
+            await client.views_open(trigger_id=command["trigger_id"], view=view)
+        except Exception as e:
+            await respond(store_error(e, "retrieving event"))
+
+    @app.view("save_event")
+    @metrics.async_handler
+    async def handle_save_event(ack, body, view, client, context):
+        try:
+            new_code, original_code, event, version = submitted_event(view, body["user"]["id"])
+            store = await store_for(context)
+            previous = await asyncio.to_thread(store.get, original_code or new_code)
+            await asyncio.to_thread(store.save, new_code, event, original_code=original_code,
+                                    expected_version=version, owner=event["created_by"])
+        except Exception as e:
+            await ack(response_action="errors", errors=save_error(e))
+            return
+        await ack()
+        # The rule or first occurrence may have changed
+        next_occurrences.forget(original_code, new_code)
+        # The modal is closed by now, so report on the reminders by DM
+        try:
+            note = await asyncio.to_thread(
+                reschedule_reminders, reminders, new_code, event, original_code, workspace(context), previous
+            )
+            if note:
+                await client.chat_postMessage(channel=event["created_by"], text=note)
+        except Exception as e:
+            await client.chat_postMessage(
+                channel=event["created_by"], text=f"❌ Reminders for `{new_code}` were not updated: `{str(e)}`"
+            )
+
+    @app.action("reset_time")
+    @metrics.async_handler
+    async def handle_reset_time(ack, body, client):
+        await ack()
+        view = body["view"]
+        await client.views_update(view_id=view["id"], view=reset_time_view(view))
+
+    @app.action("reminder")
+    @metrics.async_handler
+    async def handle_reminder(ack, client, action, respond, body, context):
+        await ack()
+        try:
+            await respond(await asyncio.to_thread(
+                schedule_reminder, reminders, action, body, team_id=workspace(context)
+            ))
+        except Exception as e:
+            await respond(f"❌ Error setting reminder: `{str(e)}`")
+
+    @app.command("/list_events")
+    @metrics.async_handler
+    async def handle_list_events(ack, respond, command, context):
+        await ack()
+        interval = command.get("text", "").strip()
+        timezone_name = await timezones.get(command["user_id"], workspace_token(context))
+        try:
+            start, end = interval_range(interval, resolver.timezone(timezone_name)) or (None, None)
+            blocks = await asyncio.to_thread(list_events_page, await store_for(context), start, end, timezone_name)
+            if not blocks:
+                await respond("❌ No events found.")
+                return
+            await respond(blocks=blocks)
+        except Exception as e:
+            await respond(store_error(e, "listing events"))
+
+    @app.action("list_events_page")
+    @metrics.async_handler
+    async def handle_list_events_page(ack, action, respond, context):
+        await ack()
+        try:
+            cursor = json.loads(action["value"])
+            blocks = await asyncio.to_thread(
+                list_events_page, await store_for(context), cursor["start"], cursor["end"], cursor["timezone"],
+                after=cursor["after"], now=cursor.get("now"),
+            )
+            if not blocks:
+                await respond("❌ No more events.")
+                return
+            await respond(blocks=blocks, replace_original=True)
+        except Exception as e:
+            await respond(f"❌ Error listing events: `{str(e)}`")
+
+    @app.command("/find_event")
+    @metrics.async_handler
+    async def handle_find_event(ack, respond, command, client, context):
+        await ack()
+        query = command.get("text", "").strip()
+        try:
+            if not query:
+                await client.views_open(trigger_id=command["trigger_id"], view=find_event_view())
+                return
+            timezone_name = await timezones.get(command["user_id"], workspace_token(context))
+            store = await store_for(context)
+            results = await asyncio.to_thread(store.search, query, EVENTS_PER_PAGE + 1)
+            await respond(**find_event_response(query, results, timezone_name))
+        except Exception as e:
+            await respond(store_error(e, "searching events"))
+
+    @app.options("event_search")
+    @metrics.async_handler
+    async def handle_event_options(ack, payload, context):
+        try:
+            store = await store_for(context)
+            # Slack drops options that take more than 3 seconds, so don't wait for the index to be built
+            results = await asyncio.to_thread(store.search, payload.get("value", ""), OPTIONS_LIMIT, wait=False)
+        except Exception as e:
+            metrics.error(e, doing="searching events")
+            results = []
+        await ack(options=event_options(results))
+
+    @app.action("event_search")
+    @metrics.async_handler
+    async def handle_event_selected(ack, body, action, client, context):
+        await ack()
+        code = action["selected_option"]["value"]
+        timezone_name = await timezones.get(body["user"]["id"], workspace_token(context))
+        event = await asyncio.to_thread((await store_for(context)).get, code)
+        await client.views_update(view_id=body["view"]["id"], view=find_event_view(code, event, timezone_name))
+
+    def export_file(store, fmt, path):
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            return bulk.export_events(store, fmt, f)
+
+    @app.command("/export_events")
+    @metrics.async_handler
+    async def handle_export_events(ack, respond, command, client, context):
+        await ack()
+        fmt = export_format(command.get("text", ""))
+        if fmt is None:
+            await respond("❌ Export as `ndjson`, `csv` or `ics`.")
+            return
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, f"events.{fmt}")
+                stats = await asyncio.to_thread(export_file, await store_for(context), fmt, path)
+                channel = (await client.conversations_open(users=command["user_id"]))["channel"]["id"]
+                await client.files_upload_v2(channel=channel, file=path, filename=f"events.{fmt}",
+                                             initial_comment=export_comment(fmt, stats))
+        except Exception as e:
+            await respond(store_error(e, "exporting events"))
+            return
+        await respond(f"📤 Sent you `events.{fmt}` in a DM.")
+
+    @app.command("/import_events")
+    @metrics.async_handler
+    async def handle_import_events(ack, respond, command, client):
+        await ack()
+        try:
+            await client.views_open(trigger_id=command["trigger_id"], view=import_events_view())
+        except Exception as e:
+            await respond(f"❌ Error opening the import: `{str(e)}`")
+
+    def import_file(store, fmt, path, user_id):
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            return bulk.import_events(store, fmt, f, owner=user_id)
+
+    @app.view("import_events")
+    @metrics.async_handler
+    async def handle_import_file(ack, body, view, client, context):
+        file, fmt = submitted_import(view)
+        if fmt is None:
+            await ack(response_action="errors", errors={"file_block": UNKNOWN_IMPORT_FORMAT})
+            return
+        await ack()
+        user_id = body["user"]["id"]
+        try:
+            # Downloaded to disk first, so the file is read a line at a time off the loop
+            with tempfile.NamedTemporaryFile(suffix=f".{fmt}") as f:
+                await http.download(file["url_private_download"], f, workspace_token(context))
+                f.flush()
+                stats = await asyncio.to_thread(import_file, await store_for(context), fmt, f.name, user_id)
+        except Exception as e:
+            text = store_error(e, "importing events", f"importing `{file.get('name')}`")
+            await client.chat_postMessage(channel=user_id, text=text)
+            return
+        await client.chat_postMessage(channel=user_id, text=import_report(file.get("name"), stats))
+
+    return app
+
+
+def serve(app, port=3000, ready=None):
+    """Starts the AsyncApp's aiohttp server with /metrics and /profile next to /slack/events.
+
+    ready() is called once the port is bound.
+    """
+    async def metrics_text(request):
+        return web.Response(text=metrics.render(), content_type="text/plain")
+
+    async def profile_text(request):
+        return web.Response(text=metrics.profile(), content_type="text/plain")
+
+    server = app.server(port=port)
+    server.web_app.router.add_get("/metrics", metrics_text)
+    server.web_app.router.add_get("/profile", profile_text)
+    if ready is None:
+        server.start()
+        return
+
+    # web.run_app() has no hook between binding and serving, so run the site ourselves
+    async def run():
+        runner = web.AppRunner(server.web_app)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, host=server.host, port=port).start()
+            print(f"⚡️ TimeKeeper (asyncio) is running on port {port}, metrics on /metrics")
+            ready()
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,474 @@
+"""Streaming import and export of events as NDJSON, CSV or iCalendar (ICS).
+
+    python -m timekeeper.bulk export events.ndjson
+    python -m timekeeper.bulk import events.csv --created-by U0123
+    python -m timekeeper.bulk export - --format ics --store json --path events.json > events.ics
+
+Files are read and written a line at a time, so neither side holds the whole file. Imports
+are validated event by event and handed to the store's save_many() in batches, one
+transaction (or, for events.json, one rewrite) each. Upserts are keyed by event code and
+skip events already stored exactly as imported, so importing the same file twice writes
+nothing the second time. Both directions report their throughput in events per second.
+
+NDJSON has one event per line: {"code": ..., "description": ..., "timestamp": ...,
+"created_by": ..., "recurrence": {"freq": ..., "timezone": ...}}. CSV has the columns
+code, description, timestamp, created_by, repeats and timezone. Timestamps are epoch
+seconds or ISO 8601 times with a UTC offset, or without one when a timezone is given. ICS
+exports open in calendar apps, and ICS imports take timed events with at most a daily,
+weekly or monthly RRULE.
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+from .recurrence import rule
+from .time_ranges import localize_boundary
+from .tz_resolver import UnknownTimezone, resolver
+
+FORMATS = ("ndjson", "csv", "ics")
+EXTENSIONS = {".ndjson": "ndjson", ".jsonl": "ndjson", ".csv": "csv", ".ics": "ics"}
+CSV_FIELDS = ("code", "description", "timestamp", "created_by", "repeats", "timezone")
+# Import stats keep the first few errors rather than one per line of a bad file
+MAX_ERRORS = 10
+
+# The bot's folder, where its stores are by default
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class InvalidEvent(ValueError):
+    """Raised for an event that can't be imported; the rest of the file still is."""
+
+
+def format_for(name):
+    """The format a file name's extension stands for, or None."""
+    return EXTENSIONS.get(os.path.splitext(name or "")[1].lower())
+
+
+def _iso(timestamp):
+    moment = datetime.fromtimestamp(timestamp, timezone.utc)
+    return moment.isoformat(timespec="seconds" if timestamp == int(timestamp) else "microseconds")
+
+
+def _timestamp(value, timezone_name):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        timestamp = float(value)
+    elif isinstance(value, str) and value.strip():
+        value = value.strip()
+        try:
+            timestamp = float(value)
+        except ValueError:
+            try:
+                moment = datetime.fromisoformat(value)
+            except ValueError:
+                raise InvalidEvent(f"timestamp `{value}` is neither epoch seconds nor an ISO 8601 time") from None
+            if moment.tzinfo is None:
+                if not timezone_name:
+                    raise InvalidEvent(f"timestamp `{value}` needs a UTC offset or a timezone")
+                moment = localize_boundary(resolver.timezone(timezone_name), moment)
+            timestamp = moment.timestamp()
+    else:
+        raise InvalidEvent("timestamp is missing")
+    if not math.isfinite(timestamp):
+        raise InvalidEvent(f"timestamp `{value}` is not a time")
+    return timestamp
+
+
+def validate(record, owner=None, created_by=None):
+    """Turns a record read from a file into a (code, event) pair, or raises InvalidEvent.
+
+    A record has code, description, timestamp, created_by, repeats and timezone, any of them
+    possibly missing. owner replaces whatever created_by the record has; created_by only
+    fills it in when missing.
+    """
+    code = record.get("code")
+    if not isinstance(code, str) or code.split() != [code]:
+        raise InvalidEvent(f"code `{code}` must be one word" if code else "code is missing")
+    description = record.get("description") or ""
+    if not isinstance(description, str):
+        raise InvalidEvent(f"description of `{code}` is not text")
+    creator = owner or record.get("created_by") or created_by
+    if not isinstance(creator, str) or not creator:
+        raise InvalidEvent(f"`{code}` has no created_by")
+    timezone_name = record.get("timezone") or None
+    try:
+        event = {
+            "description": description,
+            "timestamp": _timestamp(record.get("timestamp"), timezone_name),
+            "created_by": creator,
+        }
+        repeats = (record.get("repeats") or "never").strip().lower()
+        if repeats != "never":
+            if not timezone_name:
+                raise InvalidEvent(f"`{code}` repeats {repeats} but has no timezone")
+            event["recurrence"] = rule(repeats, timezone_name)
+    except InvalidEvent as e:
+        raise InvalidEvent(f"`{code}`: {e}") from None
+    except (UnknownTimezone, ValueError, AttributeError) as e:
+        raise InvalidEvent(f"`{code}`: {e}") from None
+    return code, event
+
+
+# Readers take an iterable of lines and yield (line number, record), or (line number,
+# InvalidEvent) for what can't be read, and carry on with the next event
+
+def read_ndjson(lines):
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, InvalidEvent(f"not JSON: {e}")
+            continue
+        if not isinstance(record, dict):
+            yield number, InvalidEvent("not a JSON object")
+            continue
+        recurrence = record.get("recurrence")
+        if isinstance(recurrence, dict):
+            # What export_events() writes, nested like the stores keep it
+            record = {**record, "repeats": recurrence.get("freq"), "timezone": recurrence.get("timezone")}
+        yield number, record
+
+
+def read_csv(lines):
+    reader = csv.DictReader(lines)
+    missing = {"code", "timestamp"} - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError(f"CSV header has no {', '.join(sorted(missing))} column")
+    for record in reader:
+        yield reader.line_num, record
+
+
+def _unfold(lines):
+    """Yields (line number, content line), joining folded continuation lines."""
+    current = None
+    start = 0
+    for number, line in enumerate(lines, 1):
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield start, current
+        current, start = line, number
+    if current is not None:
+        yield start, current
+
+
+def _property(line):
+    """Splits `NAME;PARAM=value:value` into (NAME, {PARAM: value}, value)."""
+    quoted = False
+    for i, c in enumerate(line):
+        if c == '"':
+            quoted = not quoted
+        elif c == ":" and not quoted:
+            head, value = line[:i], line[i + 1:]
+            break
+    else:
+        return line.upper(), {}, ""
+    name, *params = head.split(";")
+    return name.upper(), {
+        key.upper(): param_value.strip('"') for key, _, param_value in (param.partition("=") for param in params)
+    }, value
+
+
+def _unescape(text):
+    out = []
+    chars = iter(text)
+    for c in chars:
+        if c == "\\":
+            c = next(chars, "")
+            c = "\n" if c in ("n", "N") else c
+        out.append(c)
+    return "".join(out)
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+_RRULE_FREQ = {"DAILY": "daily", "WEEKLY": "weekly", "MONTHLY": "monthly"}
+
+
+def _ics_record(properties):
+    record = {"code": None, "description": None}
+    code = properties.get("X-TIMEKEEPER-CODE")
+    if code is not None:
+        record["code"] = _unescape(code[1])
+    elif "UID" in properties:
+        # Other calendars' UIDs are often `id@domain`; the id is the code
+        record["code"] = _unescape(properties["UID"][1]).split("@")[0]
+    if "SUMMARY" in properties:
+        summary = _unescape(properties["SUMMARY"][1])
+        # Events without a description are exported with their code as the title
+        record["description"] = "" if code is not None and summary == record["code"] else summary
+    if "X-TIMEKEEPER-CREATED-BY" in properties:
+        record["created_by"] = _unescape(properties["X-TIMEKEEPER-CREATED-BY"][1])
+    if "DTSTART" not in properties:
+        raise InvalidEvent(f"`{record['code']}` has no DTSTART")
+    params, value = properties["DTSTART"]
+    if params.get("VALUE", "DATE-TIME").upper() != "DATE-TIME" or "T" not in value:
+        raise InvalidEvent(f"`{record['code']}` is an all-day event, which events can't be")
+    try:
+        local = datetime.strptime(value.rstrip("Zz"), "%Y%m%dT%H%M%S")
+    except ValueError:
+        raise InvalidEvent(f"`{record['code']}` has an unreadable DTSTART `{value}`") from None
+    if value[-1:] in "Zz":
+        record["timestamp"] = local.replace(tzinfo=timezone.utc).timestamp()
+        record["timezone"] = "UTC"
+    elif "TZID" in params:
+        record["timestamp"] = local.isoformat()
+        record["timezone"] = params["TZID"]
+    else:
+        raise InvalidEvent(f"`{record['code']}` has a floating DTSTART, with neither a UTC time nor a TZID")
+    if "RRULE" in properties:
+        parts = dict(part.partition("=")[::2] for part in properties["RRULE"][1].upper().split(";"))
+        record["repeats"] = _RRULE_FREQ.get(parts.pop("FREQ", None))
+        if parts.pop("INTERVAL", "1") != "1" or record["repeats"] is None:
+            raise InvalidEvent(f"`{record['code']}` repeats other than daily, weekly or monthly")
+        parts.pop("WKST", None)
+        if record["repeats"] == "monthly" and parts.get("BYSETPOS") == "-1":
+            # The last day of shorter months, which is how export_events() says "the 29th, 30th or 31st"
+            parts.pop("BYSETPOS")
+            parts.pop("BYMONTHDAY", None)
+        if parts:
+            raise InvalidEvent(f"`{record['code']}` has an RRULE with {', '.join(sorted(parts))}, "
+                               "which events can't repeat by")
+    return record
+
+
+def read_ics(lines):
+    properties = None
+    start = 0
+    for number, line in _unfold(lines):
+        name, params, value = _property(line)
+        if name == "BEGIN" and value.upper() == "VEVENT":
+            properties, start = {}, number
+        elif name == "END" and value.upper() == "VEVENT" and properties is not None:
+            try:
+                yield start, _ics_record(properties)
+            except InvalidEvent as e:
+                yield start, e
+            properties = None
+        elif properties is not None:
+            # Nested components like VALARM don't override the event's own properties
+            properties.setdefault(name, (params, value))
+
+
+READERS = {"ndjson": read_ndjson, "csv": read_csv, "ics": read_ics}
+
+
+def write_ndjson(events, out):
+    for code, event in events:
+        out.write(json.dumps({"code": code, **event}, separators=(",", ":"), ensure_ascii=False))
+        out.write("\n")
+
+
+def write_csv(events, out):
+    writer = csv.writer(out)
+    writer.writerow(CSV_FIELDS)
+    for code, event in events:
+        recurrence = event.get("recurrence") or {}
+        writer.writerow((code, event.get("description", ""), _iso(event["timestamp"]), event["created_by"],
+                         recurrence.get("freq", ""), recurrence.get("timezone", "")))
+
+
+def _fold(line):
+    """Folds a content line into 75-octet lines without splitting a character."""
+    data = line.encode()
+    if len(data) <= 75:
+        return line + "\r\n"
+    parts = []
+    while data:
+        cut = min(len(data), 75 if not parts else 74)
+        # Back off to the start of a UTF-8 character
+        while cut < len(data) and data[cut] & 0xC0 == 0x80:
+            cut -= 1
+        parts.append(data[:cut].decode())
+        data = data[cut:]
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _rrule(recurrence, local):
+    freq = recurrence["freq"].upper()
+    if recurrence["freq"] == "monthly" and local.day > 28:
+        # Monthly events on the 29th to 31st fall on the last day of shorter months
+        days = ",".join(str(day) for day in range(28, local.day + 1))
+        return f"FREQ=MONTHLY;BYMONTHDAY={days};BYSETPOS=-1"
+    return f"FREQ={freq}"
+
+
+def write_ics(events, out):
+    """Writes a VCALENDAR with a VEVENT per event, in UTC unless the event repeats.
+
+    Recurring events keep their local time and TZID, so calendars move them with DST like
+    we do. Times are to the second: fractional seconds don't survive the round trip.
+    """
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    out.write("BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//TimeKeeper//Events//EN\r\nCALSCALE:GREGORIAN\r\n")
+    for code, event in events:
+        lines = ["BEGIN:VEVENT", f"UID:{_escape(code)}@timekeeper", f"DTSTAMP:{stamp}"]
+        recurrence = event.get("recurrence")
+        if recurrence:
+            local = datetime.fromtimestamp(event["timestamp"], resolver.timezone(recurrence["timezone"]))
+            lines.append(f"DTSTART;TZID={recurrence['timezone']}:{local.strftime('%Y%m%dT%H%M%S')}")
+            lines.append(f"RRULE:{_rrule(recurrence, local)}")
+        else:
+            moment = datetime.fromtimestamp(event["timestamp"], timezone.utc)
+            lines.append(f"DTSTART:{moment.strftime('%Y%m%dT%H%M%SZ')}")
+        lines.append(f"SUMMARY:{_escape(event.get('description') or code)}")
+        lines.append(f"X-TIMEKEEPER-CODE:{_escape(code)}")
+        lines.append(f"X-TIMEKEEPER-CREATED-BY:{_escape(event['created_by'])}")
+        lines.append("END:VEVENT")
+        out.write("".join(_fold(line) for line in lines))
+    out.write("END:VCALENDAR\r\n")
+
+
+WRITERS = {"ndjson": write_ndjson, "csv": write_csv, "ics": write_ics}
+
+
+def _rate(count, seconds):
+    return round(count / seconds) if seconds > 0 else count
+
+
+def import_events(store, fmt, lines, batch_size=None, owner=None, created_by=None):
+    """Validates and upserts the events in lines, an iterable of text lines in format fmt.
+
+    Events go to store.save_many() batch_size at a time (store.batch_size by default, 0 for
+    all at once). With owner, every event is imported as theirs and events stored under
+    someone else are left alone; created_by only fills in events that don't say who made them.
+    Raises ValueError if the file as a whole can't be read; invalid events are only counted.
+
+    Returns stats: read, written, skipped (already stored as is, or someone else's), invalid,
+    the first few errors, seconds and events_per_second.
+    """
+    if batch_size is None:
+        batch_size = store.batch_size
+    stats = {"read": 0, "written": 0, "skipped": 0, "invalid": 0, "errors": []}
+    started = time.perf_counter()
+    batch = []
+
+    def flush():
+        written = store.save_many(batch, only_owned=owner is not None)
+        stats["written"] += written
+        stats["skipped"] += len(batch) - written
+        batch.clear()
+
+    for number, record in READERS[fmt](lines):
+        stats["read"] += 1
+        try:
+            if isinstance(record, InvalidEvent):
+                raise record
+            batch.append(validate(record, owner, created_by))
+        except InvalidEvent as e:
+            stats["invalid"] += 1
+            if len(stats["errors"]) < MAX_ERRORS:
+                stats["errors"].append(f"line {number}: {e}")
+            continue
+        if batch_size and len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    stats["seconds"] = time.perf_counter() - started
+    stats["events_per_second"] = _rate(stats["read"], stats["seconds"])
+    return stats
+
+
+def export_events(store, fmt, out):
+    """Writes every event in store to the text stream out in format fmt.
+
+    Open files for CSV and ICS with newline="", they have line endings of their own.
+    Returns stats: events, seconds and events_per_second.
+    """
+    count = 0
+
+    def counted():
+        nonlocal count
+        for item in store.items():
+            count += 1
+            yield item
+
+    started = time.perf_counter()
+    WRITERS[fmt](counted(), out)
+    seconds = time.perf_counter() - started
+    return {"events": count, "seconds": seconds, "events_per_second": _rate(count, seconds)}
+
+
+def import_summary(stats):
+    return (f"Imported {stats['read']} events in {stats['seconds']:.2f}s ({stats['events_per_second']} events/sec): "
+            f"{stats['written']} written, {stats['skipped']} unchanged or someone else's, {stats['invalid']} invalid")
+
+
+def export_summary(stats):
+    return f"Exported {stats['events']} events in {stats['seconds']:.2f}s ({stats['events_per_second']} events/sec)"
+
+
+def open_store(kind, path, team=None):
+    """Opens the store the bot would use: EVENTS_DB or events.json, or a workspace's under EVENTS_DIR."""
+    from .event_store import open_event_store
+    from .workspaces import shard_path
+
+    if path is None:
+        if team:
+            path = shard_path(os.getenv("EVENTS_DIR", os.path.join(BASE_DIR, "events")), team,
+                              ".json" if kind == "json" else ".db")
+        elif kind == "json":
+            path = os.path.join(BASE_DIR, "events.json")
+        else:
+            path = os.getenv("EVENTS_DB", os.path.join(BASE_DIR, "events.db"))
+    if kind == "json" and not os.path.exists(path):
+        with open(path, "w") as f:
+            f.write("{}")
+    return open_event_store(kind, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("import", "export"))
+    parser.add_argument("file", help="file to read or write, - for stdin or stdout")
+    parser.add_argument("--format", choices=FORMATS, help="defaults to the file's extension")
+    parser.add_argument("--store", choices=("sqlite", "json"), default=os.getenv("EVENT_STORE", "sqlite"))
+    parser.add_argument("--path", help="the store's file, defaults to the bot's")
+    parser.add_argument("--team", help="a workspace's store under EVENTS_DIR, when installed into several")
+    parser.add_argument("--batch-size", type=int,
+                        help="events per transaction, 0 for one; defaults to 1000, or one for the JSON store")
+    parser.add_argument("--created-by", help="user ID for events that don't say who created them")
+    args = parser.parse_args()
+
+    fmt = args.format or format_for(args.file)
+    if fmt is None:
+        parser.error("can't tell the format from the file name, pass --format")
+    store = open_store(args.store, args.path, args.team)
+    try:
+        if args.command == "export":
+            if args.file == "-":
+                stats = export_events(store, fmt, sys.stdout)
+            else:
+                with open(args.file, "w", encoding="utf-8", newline="") as f:
+                    stats = export_events(store, fmt, f)
+            print(export_summary(stats), file=sys.stderr)
+            return 0
+        try:
+            if args.file == "-":
+                stats = import_events(store, fmt, sys.stdin, args.batch_size, created_by=args.created_by)
+            else:
+                with open(args.file, encoding="utf-8-sig", newline="") as f:
+                    stats = import_events(store, fmt, f, args.batch_size, created_by=args.created_by)
+        except (OSError, ValueError) as e:
+            print(f"Can't import {args.file}: {e}", file=sys.stderr)
+            return 1
+        print(import_summary(stats), file=sys.stderr)
+        for error in stats["errors"]:
+            print(f"  {error}", file=sys.stderr)
+        return 1 if stats["invalid"] else 0
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
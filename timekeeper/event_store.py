@@ -0,0 +1,782 @@
+import bisect
+import json
+import logging
+import os
+import stat
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from types import MappingProxyType
+
+from .search import SearchIndex
+from .sqlite_db import Connections, add_column
+
+try:
+    import fcntl
+except ImportError:  # Windows: only one process may write events.json there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# How many changes a store remembers for changes(); a search index further behind is rebuilt
+CHANGE_LOG_SIZE = 10000
+
+
+class EventExists(Exception):
+    """Raised when saving under a code that already belongs to another event."""
+
+
+class VersionConflict(Exception):
+    """Raised when the event was saved by someone else since the version being edited was read."""
+
+
+class NotOwner(Exception):
+    """Raised when saving over an event that belongs to someone else."""
+
+
+def _check_save(code, original_code, old, taken, expected_version=None, owner=None):
+    """Checks a save against what is stored and returns the new event's version.
+
+    old is the event stored under original_code (or code), taken whether a rename would land
+    on an existing event. Stores call this inside the same lock or transaction as the write.
+    """
+    if taken or (expected_version == 0 and old is not None):
+        raise EventExists(code)
+    if expected_version and (old is None or old.get("version", 1) != expected_version):
+        raise VersionConflict(code)
+    if owner is not None and old is not None and old["created_by"] != owner:
+        raise NotOwner(code)
+    return old.get("version", 1) + 1 if old is not None else 1
+
+
+def _unchanged(old, event):
+    return all(old.get(field) == event.get(field) for field in ("description", "timestamp", "created_by", "recurrence"))
+
+
+class EventStore:
+    """Storage for events, keyed by event code.
+
+    An event is a dict with `description`, `timestamp` (UTC epoch seconds) and `created_by`.
+    Stored events also carry a `version` that goes up by one on every save. Recurring events
+    have a `recurrence` rule too, and `timestamp` is their first occurrence (see recurrence.py).
+    """
+
+    # How many events bulk imports (bulk.py) pass to save_many() at a time, 0 for all of them
+    batch_size = 1000
+
+    def __init__(self):
+        self._search = None  # (SearchIndex, changes() position it is up to date with)
+        self._search_lock = threading.Lock()
+        self._indexing = False  # a background build is under way
+
+    def get(self, code):
+        raise NotImplementedError
+
+    def save(self, code, event, original_code=None, expected_version=None, owner=None):
+        """Inserts or replaces an event, renaming it from original_code when that differs.
+
+        Returns the saved event's version. Raises EventExists when renaming onto a code that is
+        already taken, or creating one (expected_version=0) that exists. With expected_version,
+        raises VersionConflict unless that is the stored version; with owner, raises NotOwner
+        unless they created the stored event. The checks and the write happen atomically.
+        """
+        raise NotImplementedError
+
+    def delete(self, code):
+        raise NotImplementedError
+
+    def save_many(self, events, only_owned=False):
+        """Upserts an iterable of (code, event) pairs and returns how many were written.
+
+        An event that is already stored exactly as given is left alone, version included, so
+        saving the same events twice changes nothing. With only_owned, so are events stored
+        under another creator.
+        """
+        written = 0
+        for code, event in events:
+            old = self.get(code)
+            if old is not None and (_unchanged(old, event) or only_owned and old["created_by"] != event["created_by"]):
+                continue
+            self.save(code, event)
+            written += 1
+        return written
+
+    def items(self):
+        """Yields (code, event) pairs."""
+        raise NotImplementedError
+
+    def between(self, start=None, end=None, after=None, limit=None, recurring=True):
+        """Yields (code, event) pairs with start <= timestamp < end, in (timestamp, code) order.
+
+        None leaves that end of the range open. after is a (timestamp, code) cursor from a
+        previous page, and limit caps how many events are returned. recurring=False leaves
+        out recurring events, whose later occurrences the timestamp doesn't cover.
+        """
+        raise NotImplementedError
+
+    def recurring(self):
+        """Yields (code, event) pairs for the events with a recurrence rule."""
+        for code, event in self.items():
+            if event.get("recurrence"):
+                yield code, event
+
+    def count(self):
+        return sum(1 for _ in self.items())
+
+    def changes(self, since=None):
+        """Returns (position, codes): the codes saved or deleted since an earlier position.
+
+        Pass the position back next time. codes is None when the store can't tell (since is
+        None, or too far behind), and everything has to be read again.
+        """
+        return None, None
+
+    def search(self, query, limit=10, wait=True):
+        """Returns up to limit (code, event) pairs matching query, best first (see search.py).
+
+        The index is built on the first search, then kept up to date from changes(), so
+        saves by this or any other process only cost re-indexing the events they touched.
+        Building it takes seconds for a big store: with wait=False, a search that would have
+        to build it, or wait for a build under way, returns [] and builds it in the background.
+        """
+        if not self._search_lock.acquire(blocking=wait):
+            return []
+        try:
+            index, position = self._search or (None, None)
+            position, codes = self.changes(position)
+            if index is None or codes is None or len(codes) > len(index) // 4:
+                if not wait:
+                    self._index_in_background()
+                    return []
+                index = SearchIndex(self.items())
+            else:
+                for code in codes:
+                    event = self.get(code)
+                    if event is None:
+                        index.remove(code)
+                    else:
+                        index.add(code, event)
+            self._search = index, position
+            found = index.search(query, limit)
+        finally:
+            self._search_lock.release()
+        return [(code, event) for code, event in ((code, self.get(code)) for code in found) if event is not None]
+
+    def _index_in_background(self):
+        # Called holding _search_lock, which the build waits for
+        if self._indexing:
+            return
+        self._indexing = True
+
+        def build():
+            try:
+                self.search("")
+            except Exception:
+                logger.exception("Building the search index failed")
+            finally:
+                self._indexing = False
+
+        threading.Thread(target=build, name="timekeeper-search-index", daemon=True).start()
+
+    def stats(self):
+        return {"events": self.count()}
+
+    def get_zone_group(self, name):
+        """Returns the /get_time zone group saved under name as {"zones": [...], "created_by": ...}, or None."""
+        raise NotImplementedError
+
+    def save_zone_group(self, name, zones, created_by):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class _Snapshot:
+    """An immutable view of events.json: the events plus a sorted (timestamp, code) index."""
+
+    __slots__ = ("events", "index", "recurring", "stamp", "loaded_at")
+
+    def __init__(self, events, index, stamp):
+        self.events = MappingProxyType(events)
+        self.index = index
+        self.recurring = frozenset(code for code, event in events.items() if event.get("recurrence"))
+        self.stamp = stamp
+        self.loaded_at = time.monotonic()
+
+
+# os.umask() can only be read by setting it, so do that once, before any threads start
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _dump_json(data, path):
+    # Write to a temp file and rename so readers never see a half-written file
+    directory, name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.splitext(name)[0]}-")
+    try:
+        # mkstemp() makes the file 0600; keep the mode the file had, or would get from open()
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            mode = 0o666 & ~_UMASK
+        os.fchmod(fd, mode)
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class JsonEventStore(EventStore):
+    """The original events.json file, rewritten atomically on every save.
+
+    Reads are served from an in-memory snapshot that is swapped out whole, so readers never
+    lock. The snapshot is rebuilt after our own saves, and when the file's mtime, size or
+    inode changes behind our back (checked at most every `recheck` seconds).
+    """
+
+    # Every save_many() rewrites the whole file, so imports make just the one
+    batch_size = 0
+
+    def __init__(self, path, recheck=1.0):
+        super().__init__()
+        self.path = path
+        self.recheck = recheck
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = 0.0
+        self.reloads = 0
+        self.reload_seconds = 0.0
+        self.last_reload_seconds = 0.0
+        # Every write and reload bumps the generation and logs the codes it touched
+        self._generation = 0
+        self._log = deque(maxlen=CHANGE_LOG_SIZE)
+
+    def _stamp(self):
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _load(self):
+        started = time.perf_counter()
+        stamp = self._stamp()
+        with open(self.path, "r") as f:
+            events = json.load(f)
+        snapshot = _Snapshot(events, tuple(sorted((event["timestamp"], code) for code, event in events.items())), stamp)
+        elapsed = time.perf_counter() - started
+        self.reloads += 1
+        self.reload_seconds += elapsed
+        self.last_reload_seconds = elapsed
+        return snapshot
+
+    def _current(self, force=False):
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and not force and now - self._checked_at < self.recheck:
+            return snapshot
+        # Only one thread checks the file; everyone else keeps reading the snapshot they have
+        if not self._lock.acquire(blocking=snapshot is None or force):
+            return snapshot
+        try:
+            return self._refresh()
+        finally:
+            self._lock.release()
+
+    def _refresh(self):
+        # Call with self._lock held
+        self._checked_at = time.monotonic()
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.stamp != self._stamp():
+            old, snapshot = snapshot, self._load()
+            self._snapshot = snapshot
+            self._generation += 1
+            if old is not None:
+                # Work out what the other process changed, so search only re-indexes that
+                self._log.append((self._generation, frozenset(
+                    code for code, event in snapshot.events.items() if old.events.get(code) != event
+                ).union(old.events.keys() - snapshot.events.keys())))
+        return snapshot
+
+    def _dump(self, events):
+        _dump_json(events, self.path)
+        return self._stamp()
+
+    @contextmanager
+    def _file_lock(self):
+        """Holds an exclusive lock on events.json.lock, so other processes' writes wait for ours."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.path + ".lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _write(self, change):
+        """Applies change(events, index) to copies of the latest snapshot and saves the result.
+
+        change returns the codes it touched, or False to leave the file alone.
+        """
+        # The file lock makes the re-read, change and rewrite atomic across processes too
+        with self._lock, self._file_lock():
+            snapshot = self._refresh()
+            events = dict(snapshot.events)
+            index = list(snapshot.index)
+            codes = change(events, index)
+            if codes is False:
+                return
+            self._snapshot = _Snapshot(events, tuple(index), self._dump(events))
+            self._checked_at = time.monotonic()
+            self._generation += 1
+            self._log.append((self._generation, frozenset(codes)))
+
+    @staticmethod
+    def _unindex(index, timestamp, code):
+        i = bisect.bisect_left(index, (timestamp, code))
+        if i < len(index) and index[i] == (timestamp, code):
+            del index[i]
+
+    def get(self, code):
+        event = self._current().events.get(code)
+        return dict(event) if event is not None else None
+
+    def save(self, code, event, original_code=None, expected_version=None, owner=None):
+        saved = {}
+
+        def change(events, index):
+            old_code = original_code or code
+            version = _check_save(code, old_code, events.get(old_code),
+                                  old_code != code and code in events, expected_version, owner)
+            old = events.pop(old_code, None)
+            if old is not None:
+                self._unindex(index, old["timestamp"], old_code)
+            events[code] = saved["event"] = {**event, "version": version}
+            bisect.insort(index, (event["timestamp"], code))
+            return old_code, code
+
+        self._write(change)
+        return saved["event"]["version"]
+
+    def save_many(self, events, only_owned=False):
+        """Upserts an iterable of (code, event) pairs with a single rewrite of the file."""
+        written = []
+
+        def change(current, index):
+            for code, event in events:
+                old = current.get(code)
+                if old is not None and (_unchanged(old, event) or
+                                        only_owned and old["created_by"] != event["created_by"]):
+                    continue
+                current[code] = {**event, "version": old.get("version", 1) + 1 if old else 1}
+                written.append(code)
+            if not written:
+                return False
+            index[:] = sorted((event["timestamp"], code) for code, event in current.items())
+            return written
+
+        self._write(change)
+        return len(written)
+
+    def delete(self, code):
+        def change(events, index):
+            old = events.pop(code, None)
+            if old is None:
+                return False
+            self._unindex(index, old["timestamp"], code)
+            return (code,)
+
+        self._write(change)
+
+    def items(self):
+        for code, event in self._current().events.items():
+            yield code, dict(event)
+
+    def between(self, start=None, end=None, after=None, limit=None, recurring=True):
+        snapshot = self._current()
+        index = snapshot.index
+        lo = 0 if start is None else bisect.bisect_left(index, (start,))
+        hi = len(index) if end is None else bisect.bisect_left(index, (end,))
+        if after is not None:
+            lo = max(lo, bisect.bisect_right(index, tuple(after)))
+        if recurring or not snapshot.recurring:
+            if limit is not None:
+                hi = min(hi, lo + limit)
+            for _, code in index[lo:hi]:
+                yield code, dict(snapshot.events[code])
+            return
+        # Recurring events are few, so skipping them keeps this close to a slice
+        returned = 0
+        for i in range(lo, hi):
+            if limit is not None and returned == limit:
+                return
+            code = index[i][1]
+            if code not in snapshot.recurring:
+                returned += 1
+                yield code, dict(snapshot.events[code])
+
+    def recurring(self):
+        snapshot = self._current()
+        for code in sorted(snapshot.recurring):
+            yield code, dict(snapshot.events[code])
+
+    def count(self):
+        return len(self._current().events)
+
+    def changes(self, since=None):
+        # Picks up another process's writes, at most every `recheck` seconds like reads do
+        self._current()
+        with self._lock:
+            generation = self._generation
+            if since is None:
+                return generation, None
+            if since == generation:
+                return generation, ()
+            # The log has to reach back to the first change after since
+            if not self._log or self._log[0][0] > since + 1:
+                return generation, None
+            return generation, set().union(*(codes for logged, codes in self._log if logged > since))
+
+    def stats(self):
+        """Reload counts and timings, and how old the snapshot being served is."""
+        snapshot = self._snapshot
+        return {
+            "events": len(snapshot.events) if snapshot else 0,
+            "reloads": self.reloads,
+            "reload_seconds_total": self.reload_seconds,
+            "reload_seconds_last": self.last_reload_seconds,
+            "snapshot_age": time.monotonic() - snapshot.loaded_at if snapshot else None,
+            "since_last_check": time.monotonic() - self._checked_at,
+        }
+
+    # Zone groups are few and small, so they live in their own file next to events.json
+    # (zone_groups.json), or for a workspace's T123.json next to it in T123.zone_groups.json
+    def _groups_path(self):
+        directory, name = os.path.split(self.path)
+        stem = os.path.splitext(name)[0]
+        return os.path.join(directory, "zone_groups.json" if stem == "events" else f"{stem}.zone_groups.json")
+
+    def get_zone_group(self, name):
+        try:
+            with open(self._groups_path(), "r") as f:
+                group = json.load(f).get(name)
+        except FileNotFoundError:
+            return None
+        return group
+
+    def save_zone_group(self, name, zones, created_by):
+        with self._lock, self._file_lock():
+            try:
+                with open(self._groups_path(), "r") as f:
+                    groups = json.load(f)
+            except FileNotFoundError:
+                groups = {}
+            groups[name] = {"zones": list(zones), "created_by": created_by}
+            # Replaced whole like events.json, so get_zone_group() can read it without the lock
+            _dump_json(groups, self._groups_path())
+
+
+class SqliteEventStore(EventStore):
+    """Events in an SQLite database in WAL mode, indexed by code, timestamp and creator."""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._connections = Connections(path)
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS events (
+                code TEXT PRIMARY KEY,
+                description TEXT NOT NULL DEFAULT '',
+                timestamp REAL NOT NULL,
+                created_by TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 1,
+                recurrence TEXT
+            );
+            DROP INDEX IF EXISTS events_timestamp;
+            CREATE INDEX IF NOT EXISTS events_timestamp_code ON events (timestamp, code);
+            CREATE INDEX IF NOT EXISTS events_created_by ON events (created_by);
+            CREATE TABLE IF NOT EXISTS zone_groups (
+                name TEXT PRIMARY KEY,
+                zones TEXT NOT NULL,
+                created_by TEXT NOT NULL
+            );
+        """)
+        # Every write, from any process, logs the codes it touched for changes(). The log
+        # trims itself to the last CHANGE_LOG_SIZE or so every thousand entries.
+        self._connect().executescript(f"""
+            CREATE TABLE IF NOT EXISTS event_changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                code TEXT NOT NULL
+            );
+            CREATE TRIGGER IF NOT EXISTS events_inserted AFTER INSERT ON events BEGIN
+                INSERT INTO event_changes (code) VALUES (NEW.code);
+            END;
+            CREATE TRIGGER IF NOT EXISTS events_updated AFTER UPDATE ON events BEGIN
+                INSERT INTO event_changes (code) VALUES (NEW.code);
+            END;
+            CREATE TRIGGER IF NOT EXISTS events_deleted AFTER DELETE ON events BEGIN
+                INSERT INTO event_changes (code) VALUES (OLD.code);
+            END;
+            CREATE TRIGGER IF NOT EXISTS event_changes_trimmed AFTER INSERT ON event_changes
+            WHEN NEW.seq % 1000 = 0 BEGIN
+                DELETE FROM event_changes WHERE seq <= NEW.seq - {CHANGE_LOG_SIZE};
+            END;
+        """)
+        # Databases from before versioning get the column, with every event at version 1
+        add_column(self._connect(), "events", "version", "INTEGER NOT NULL DEFAULT 1")
+        # and from before recurring events, with none recurring
+        add_column(self._connect(), "events", "recurrence", "TEXT")
+        self._connect().execute(
+            "CREATE INDEX IF NOT EXISTS events_recurring ON events (code) WHERE recurrence IS NOT NULL"
+        )
+
+    def _connect(self):
+        return self._connections.get()
+
+    @staticmethod
+    def _event(row):
+        event = {
+            "description": row["description"],
+            "timestamp": row["timestamp"],
+            "created_by": row["created_by"],
+            "version": row["version"],
+        }
+        if row["recurrence"]:
+            event["recurrence"] = json.loads(row["recurrence"])
+        return event
+
+    @staticmethod
+    def _recurrence(event):
+        return json.dumps(event["recurrence"]) if event.get("recurrence") else None
+
+    def get(self, code):
+        row = self._connect().execute(
+            "SELECT description, timestamp, created_by, version, recurrence FROM events WHERE code = ?", (code,)
+        ).fetchone()
+        return self._event(row) if row else None
+
+    def save(self, code, event, original_code=None, expected_version=None, owner=None):
+        conn = self._connect()
+        # BEGIN IMMEDIATE takes the write lock up front, so no other connection or process can
+        # change the event between the checks and the write
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            old_code = original_code or code
+            row = conn.execute(
+                "SELECT description, timestamp, created_by, version, recurrence FROM events WHERE code = ?", (old_code,)
+            ).fetchone()
+            taken = old_code != code and conn.execute("SELECT 1 FROM events WHERE code = ?", (code,)).fetchone()
+            version = _check_save(code, old_code, self._event(row) if row else None, taken, expected_version, owner)
+            if old_code != code:
+                conn.execute("DELETE FROM events WHERE code = ?", (old_code,))
+            conn.execute(
+                "INSERT INTO events (code, description, timestamp, created_by, version, recurrence) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (code) DO UPDATE SET description = excluded.description, "
+                "timestamp = excluded.timestamp, created_by = excluded.created_by, version = excluded.version, "
+                "recurrence = excluded.recurrence",
+                (code, event["description"], event["timestamp"], event["created_by"], version,
+                 self._recurrence(event)),
+            )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return version
+
+    def save_many(self, events, only_owned=False):
+        """Upserts an iterable of (code, event) pairs in a single transaction."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # The WHERE turns updates that would change nothing (or, with only_owned, someone
+            # else's event) into no-ops, which rowcount doesn't count
+            written = conn.executemany(
+                "INSERT INTO events (code, description, timestamp, created_by, recurrence) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (code) DO UPDATE SET description = excluded.description, "
+                "timestamp = excluded.timestamp, created_by = excluded.created_by, version = events.version + 1, "
+                "recurrence = excluded.recurrence "
+                "WHERE (events.description, events.timestamp, events.created_by, events.recurrence) IS NOT "
+                "(excluded.description, excluded.timestamp, excluded.created_by, excluded.recurrence)"
+                + (" AND events.created_by = excluded.created_by" if only_owned else ""),
+                ((code, event.get("description", ""), event["timestamp"], event["created_by"], self._recurrence(event))
+                 for code, event in events),
+            ).rowcount
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return written
+
+    def delete(self, code):
+        self._connect().execute("DELETE FROM events WHERE code = ?", (code,))
+
+    def items(self):
+        rows = self._connect().execute(
+            "SELECT code, description, timestamp, created_by, version, recurrence FROM events ORDER BY timestamp, code"
+        )
+        for row in rows:
+            yield row["code"], self._event(row)
+
+    def between(self, start=None, end=None, after=None, limit=None, recurring=True):
+        where = []
+        params = []
+        if not recurring:
+            where.append("recurrence IS NULL")
+        if start is not None:
+            where.append("timestamp >= ?")
+            params.append(start)
+        if end is not None:
+            where.append("timestamp < ?")
+            params.append(end)
+        if after is not None:
+            where.append("(timestamp, code) > (?, ?)")
+            params.extend(after)
+        sql = "SELECT code, description, timestamp, created_by, version, recurrence FROM events"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY timestamp, code"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        rows = self._connect().execute(sql, params)
+        for row in rows:
+            yield row["code"], self._event(row)
+
+    def recurring(self):
+        rows = self._connect().execute(
+            "SELECT code, description, timestamp, created_by, version, recurrence FROM events "
+            "WHERE recurrence IS NOT NULL ORDER BY code"
+        )
+        for row in rows:
+            yield row["code"], self._event(row)
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    def changes(self, since=None):
+        conn = self._connect()
+        # One read transaction, so the log can't be trimmed between looking at it and reading it
+        conn.execute("BEGIN")
+        try:
+            # As two subqueries each is a single index lookup; MIN() and MAX() together scan the table
+            oldest, position = conn.execute(
+                "SELECT (SELECT MIN(seq) FROM event_changes), (SELECT MAX(seq) FROM event_changes)"
+            ).fetchone()
+            position = position or 0
+            if since is None or since > position or (oldest is not None and oldest > since + 1):
+                return position, None
+            return position, {row[0] for row in conn.execute(
+                "SELECT code FROM event_changes WHERE seq > ?", (since,)
+            )}
+        finally:
+            conn.execute("COMMIT")
+
+    def get_zone_group(self, name):
+        row = self._connect().execute(
+            "SELECT zones, created_by FROM zone_groups WHERE name = ?", (name,)
+        ).fetchone()
+        return {"zones": json.loads(row["zones"]), "created_by": row["created_by"]} if row else None
+
+    def save_zone_group(self, name, zones, created_by):
+        self._connect().execute(
+            "INSERT INTO zone_groups (name, zones, created_by) VALUES (?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET zones = excluded.zones, created_by = excluded.created_by",
+            (name, json.dumps(list(zones)), created_by),
+        )
+
+    def migrate_json(self, json_path):
+        """One-shot import of an old events.json, which is renamed afterwards so it only runs once."""
+        try:
+            with open(json_path, "r") as f:
+                events = json.load(f)
+        except FileNotFoundError:
+            return 0
+        self.save_many(events.items())
+        try:
+            os.replace(json_path, json_path + ".migrated")
+        except FileNotFoundError:
+            # Another process starting up migrated it too; save_many() made that harmless
+            pass
+        return len(events)
+
+    def close(self):
+        self._connections.close()
+
+
+class EventStoreShards:
+    """One event store per workspace, for installs into many workspaces.
+
+    Each workspace's store is opened on first use and cached; beyond max_open, the least
+    recently used are closed, so memory stays bounded however many workspaces install us.
+    Opening happens outside the shared lock, so a large workspace's snapshot loading doesn't
+    hold up lookups for the others.
+    """
+
+    def __init__(self, open_store, max_open=64):
+        self.open_store = open_store
+        self.max_open = max_open
+        self._stores = OrderedDict()  # team_id -> store, least recently used first
+        self._opening = {}  # team_id -> lock held while that store is being opened
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.opened = 0
+        self.evicted = 0
+
+    def for_team(self, team_id):
+        """Returns the workspace's event store, opening it if it isn't open already."""
+        with self._lock:
+            store = self._stores.get(team_id)
+            if store is not None:
+                self._stores.move_to_end(team_id)
+                self.hits += 1
+                return store
+            opening = self._opening.setdefault(team_id, threading.Lock())
+        with opening:
+            # Someone else may have opened it while we waited
+            with self._lock:
+                store = self._stores.get(team_id)
+                if store is not None:
+                    self._stores.move_to_end(team_id)
+                    return store
+            store = self.open_store(team_id)
+            evicted = []
+            with self._lock:
+                self._stores[team_id] = store
+                self._opening.pop(team_id, None)
+                self.opened += 1
+                while len(self._stores) > self.max_open:
+                    evicted.append(self._stores.popitem(last=False)[1])
+                    self.evicted += 1
+        # This closes every thread's connection to them. The least recently used store is rarely still
+        # in use; a request that is loses any query it is reading from, and reconnects for its next
+        for old in evicted:
+            old.close()
+        return store
+
+    def stats(self):
+        with self._lock:
+            return {"open": len(self._stores), "hits": self.hits, "opened": self.opened, "evicted": self.evicted}
+
+    def close(self):
+        with self._lock:
+            stores = list(self._stores.values())
+            self._stores.clear()
+        for store in stores:
+            store.close()
+
+
+def open_event_store(kind, path, legacy_json_path=None):
+    """Opens the store named by kind ("sqlite" or "json")."""
+    if kind == "json":
+        return JsonEventStore(path)
+    if kind == "sqlite":
+        store = SqliteEventStore(path)
+        if legacy_json_path:
+            store.migrate_json(legacy_json_path)
+        return store
+    raise ValueError(f"Unknown event store {kind!r}")
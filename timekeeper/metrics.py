@@ -0,0 +1,282 @@
+"""Prometheus-style metrics for the bot: latency histograms, phase timers and error counts.
+
+    timekeeper_request_seconds{handler}   time from a request arriving to it being acked
+    timekeeper_handler_seconds{handler}   time spent doing the work behind a command, action or view
+    timekeeper_phase_seconds{phase, ...}  Slack HTTP calls, event store reads and writes, rendering
+    timekeeper_errors_total{...}          exceptions by class and where they happened
+
+render() returns the text exposition format served at /metrics. With a profile rate set,
+that fraction of handler runs is also profiled with cProfile, and profile() reports the
+functions they spent the most time in.
+"""
+import bisect
+import cProfile
+import functools
+import inspect
+import io
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def handler_name(body):
+    """The command, action_id or view callback_id a Slack request is for."""
+    if "command" in body:
+        return body["command"]
+    if body.get("actions"):
+        return body["actions"][0].get("action_id", "action")
+    if "view" in body and body.get("type", "").startswith("view_"):
+        return body["view"].get("callback_id", "view")
+    return body.get("type", "unknown")
+
+
+class _Instrumented:
+    """Wraps an object so every method call is timed as a phase, labelled with the method name."""
+
+    def __init__(self, target, metrics, phase):
+        self._target = target
+        self._metrics = metrics
+        self._phase = phase
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr) or name.startswith("_"):
+            return attr
+        timed = self._metrics.timed(self._phase, op=name)(attr)
+        # Cache the wrapper so later lookups skip __getattr__
+        setattr(self, name, timed)
+        return timed
+
+
+class Metrics:
+    def __init__(self, buckets=BUCKETS, profile_rate=0.0):
+        self.buckets = buckets
+        self.profile_rate = profile_rate
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._collectors = []
+        self._profile_lock = threading.Lock()
+        self._profile = None
+        self.profiled = 0
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def error(self, e, **labels):
+        self.increment("timekeeper_errors_total", error=type(e).__name__, **labels)
+
+    @contextmanager
+    def timer(self, phase, **labels):
+        """Times the block as timekeeper_phase_seconds, counting any exception that escapes it."""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.error(e, phase=phase)
+            raise
+        finally:
+            self.observe("timekeeper_phase_seconds", time.perf_counter() - started, phase=phase, **labels)
+
+    def timed(self, phase, **labels):
+        """Decorator form of timer(), labelled with the function's name unless op is given."""
+        def decorator(fn):
+            op = labels.get("op", fn.__name__)
+
+            if inspect.isgeneratorfunction(fn):
+                # A generator does its work as it is iterated, not when it is called
+                @functools.wraps(fn)
+                def wrapper(*args, **kwargs):
+                    return self._timed_iteration(fn(*args, **kwargs), phase, {**labels, "op": op})
+            else:
+                @functools.wraps(fn)
+                def wrapper(*args, **kwargs):
+                    with self.timer(phase, **{**labels, "op": op}):
+                        return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _timed_iteration(self, generator, phase, labels):
+        """Yields what generator does, timing the steps that produce items (not the caller's work
+        between them) as one timekeeper_phase_seconds observation once it finishes or is closed."""
+        spent = 0.0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(generator)
+                except StopIteration:
+                    return
+                except Exception as e:
+                    self.error(e, phase=phase)
+                    raise
+                finally:
+                    spent += time.perf_counter() - started
+                yield item
+        finally:
+            generator.close()
+            self.observe("timekeeper_phase_seconds", spent, phase=phase, **labels)
+
+    def instrument(self, target, phase):
+        """Returns a stand-in for target whose public methods are timed as phase."""
+        return _Instrumented(target, self, phase)
+
+    def collect(self, prefix, stats):
+        """Adds the numbers stats() returns to every render(), as prefix_<key> gauges."""
+        self._collectors.append((prefix, stats))
+
+    def run(self, handler, work, *args):
+        """Runs the work behind a handler, timing it and counting the exception if it fails."""
+        started = time.perf_counter()
+        try:
+            if self.profile_rate and random.random() < self.profile_rate:
+                return self._profiled(work, *args)
+            return work(*args)
+        except Exception as e:
+            self.error(e, handler=handler)
+            raise
+        finally:
+            self.observe("timekeeper_handler_seconds", time.perf_counter() - started, handler=handler)
+
+    def async_handler(self, fn):
+        """Decorator timing an AsyncApp listener the way run() times sync work."""
+        handler = fn.__name__.removeprefix("handle_")
+
+        @functools.wraps(fn)
+        async def wrapper(**kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(**kwargs)
+            except Exception as e:
+                self.error(e, handler=handler)
+                raise
+            finally:
+                self.observe("timekeeper_handler_seconds", time.perf_counter() - started, handler=handler)
+        return wrapper
+
+    def middleware(self, body, next):
+        """Bolt middleware recording how long each request takes to be acked."""
+        started = time.perf_counter()
+        try:
+            return next()
+        finally:
+            self.observe("timekeeper_request_seconds", time.perf_counter() - started, handler=handler_name(body))
+
+    async def async_middleware(self, body, next):
+        started = time.perf_counter()
+        try:
+            return await next()
+        finally:
+            self.observe("timekeeper_request_seconds", time.perf_counter() - started, handler=handler_name(body))
+
+    def _profiled(self, work, *args):
+        # Only one profiler can be active at a time, so skip sampling while another run is profiled
+        if not self._profile_lock.acquire(blocking=False):
+            return work(*args)
+        try:
+            profiler = cProfile.Profile()
+            try:
+                return profiler.runcall(work, *args)
+            finally:
+                with self._lock:
+                    if self._profile is None:
+                        self._profile = pstats.Stats(profiler)
+                    else:
+                        self._profile.add(profiler)
+                    self.profiled += 1
+        finally:
+            self._profile_lock.release()
+
+    def profile(self, limit=40):
+        """The functions the sampled handler runs spent the most cumulative time in."""
+        with self._lock:
+            if self._profile is None:
+                return "No profiles sampled yet, set TIMEKEEPER_PROFILE to a sample rate like 0.05.\n"
+            out = io.StringIO()
+            self._profile.stream = out
+            out.write(f"{self.profiled} sampled runs\n")
+            self._profile.sort_stats("cumulative").print_stats(limit)
+            return out.getvalue()
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            snapshot = [(key, h.counts[:], h.sum, h.count) for key, h in histograms]
+
+        typed = set()
+        for (name, labels), counts, total, count in snapshot:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        for (name, labels), value in counters:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for prefix, stats in self._collectors:
+            try:
+                values = stats()
+            except Exception as e:
+                lines.append(f"# {prefix} unavailable: {type(e).__name__}")
+                continue
+            for key, value in values.items():
+                if isinstance(value, (int, float)):
+                    lines.append(f"# TYPE {prefix}_{key} gauge")
+                    lines.append(f"{prefix}_{key} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
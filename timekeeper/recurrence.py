@@ -0,0 +1,177 @@
+"""Recurring events: occurrences of daily, weekly and monthly rules, computed on demand.
+
+A recurring event keeps its first occurrence in `timestamp` and its rule in `recurrence`,
+e.g. {"freq": "weekly", "timezone": "Europe/Berlin"}. Every later occurrence falls on the
+same wall-clock time in that timezone, so a 9:00 standup stays at 9:00 across DST changes.
+Nothing is materialized: occurrences() only computes the ones inside the window it is
+asked about.
+"""
+import calendar
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from .time_ranges import localize_boundary
+from .tz_resolver import resolver
+
+FREQUENCIES = ("daily", "weekly", "monthly")
+# Days per step of the fixed-length frequencies; monthly steps are calendar months
+_DAYS = {"daily": 1, "weekly": 7}
+
+
+def rule(freq, timezone_name):
+    """Builds a recurrence rule, checking the frequency and canonicalizing the timezone."""
+    if freq not in FREQUENCIES:
+        raise ValueError(f"Unknown recurrence {freq!r}")
+    return {"freq": freq, "timezone": resolver.canonical(timezone_name)}
+
+
+def _add_months(local, months):
+    month = local.month - 1 + months
+    year = local.year + month // 12
+    month = month % 12 + 1
+    # The 31st falls on the last day of shorter months
+    return local.replace(year=year, month=month, day=min(local.day, calendar.monthrange(year, month)[1]))
+
+
+class _Rule:
+    """One event's rule with its first occurrence in wall-clock time, ready to step through."""
+
+    __slots__ = ("tz", "local", "freq", "first")
+
+    def __init__(self, event):
+        recurrence = event["recurrence"]
+        if recurrence["freq"] not in FREQUENCIES:
+            raise ValueError(f"Unknown recurrence {recurrence['freq']!r}")
+        self.tz = resolver.timezone(recurrence["timezone"])
+        self.freq = recurrence["freq"]
+        self.first = event["timestamp"]
+        self.local = datetime.fromtimestamp(self.first, self.tz).replace(tzinfo=None)
+
+    def nth(self, n):
+        """UTC timestamp of occurrence n, counting the first as 0."""
+        if n == 0:
+            return self.first
+        if self.freq == "monthly":
+            local = _add_months(self.local, n)
+        else:
+            local = self.local + timedelta(days=_DAYS[self.freq] * n)
+        return localize_boundary(self.tz, local).timestamp()
+
+    def index_from(self, start):
+        """The first n whose occurrence is at or after start."""
+        if start is None or start <= self.first:
+            return 0
+        # Estimate a little low (DST moves occurrences by an hour either way), then step up
+        if self.freq == "monthly":
+            local = datetime.fromtimestamp(start, self.tz)
+            n = (local.year - self.local.year) * 12 + local.month - self.local.month - 1
+        else:
+            n = int((start - self.first) // (_DAYS[self.freq] * 86400)) - 1
+        n = max(n, 0)
+        while self.nth(n) < start:
+            n += 1
+        return n
+
+
+def occurrences(code, event, start=None, end=None, after=None):
+    """Yields (code, event) for each occurrence in [start, end), with its own timestamp.
+
+    after is a (timestamp, code) cursor like EventStore.between() takes. With end=None
+    this never stops, so take what you need from it.
+    """
+    recurring = _Rule(event)
+    lower = start
+    if after is not None and (lower is None or after[0] > lower):
+        lower = after[0]
+    n = recurring.index_from(lower)
+    while True:
+        timestamp = recurring.nth(n)
+        if end is not None and timestamp >= end:
+            return
+        if after is None or (timestamp, code) > tuple(after):
+            yield code, {**event, "timestamp": timestamp}
+        n += 1
+
+
+def expand(events, start=None, end=None, after=None):
+    """Merges the occurrences of several recurring (code, event) pairs in (timestamp, code) order."""
+    return heapq.merge(*(occurrences(code, event, start, end, after) for code, event in events),
+                       key=lambda item: (item[1]["timestamp"], item[0]))
+
+
+def upcoming(events, now=None, after=None):
+    """Each recurring (code, event) pair once, at its next occurrence, in (timestamp, code) order.
+
+    The next occurrence is the first at or after now; after is a cursor like expand() takes.
+    """
+    now = time.time() if now is None else now
+    found = sorted((next_occurrences.get(code, event, now), code, event) for code, event in events)
+    return ((code, {**event, "timestamp": timestamp}) for timestamp, code, event in found
+            if after is None or (timestamp, code) > tuple(after))
+
+
+def corresponding(before, after, timestamp):
+    """Where the occurrence of `before` at timestamp is once its rule or first occurrence is edited into `after`.
+
+    The nth occurrence stays the nth, so moving a standup from 9:00 to 10:00 moves each day's along.
+    """
+    return _Rule(after).nth(_Rule(before).index_from(timestamp))
+
+
+def describe(event):
+    """A short description of the rule, e.g. "weekly at 09:00 (Europe/Berlin)"."""
+    recurrence = event["recurrence"]
+    local = datetime.fromtimestamp(event["timestamp"], resolver.timezone(recurrence["timezone"]))
+    return f"{recurrence['freq']} at {local.strftime('%H:%M')} ({recurrence['timezone']})"
+
+
+class NextOccurrences:
+    """Caches each recurring event's next occurrence until it has passed or the rule changes."""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # code -> (rule signature, computed at, next occurrence)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _signature(event):
+        recurrence = event["recurrence"]
+        return event["timestamp"], recurrence["freq"], recurrence["timezone"]
+
+    def get(self, code, event, now=None):
+        """The timestamp of the first occurrence at or after now."""
+        now = time.time() if now is None else now
+        signature = self._signature(event)
+        with self._lock:
+            entry = self._entries.get(code)
+            # Valid for any time between when it was computed and the occurrence itself
+            if entry and entry[0] == signature and entry[1] <= now <= entry[2]:
+                self._entries.move_to_end(code)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+        upcoming = next(occurrences(code, event, start=now))[1]["timestamp"]
+        with self._lock:
+            self._entries[code] = (signature, now, upcoming)
+            self._entries.move_to_end(code)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return upcoming
+
+    def forget(self, *codes):
+        """Drops the cached occurrences of edited, renamed or deleted events."""
+        with self._lock:
+            for code in codes:
+                self._entries.pop(code, None)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+next_occurrences = NextOccurrences()
@@ -0,0 +1,260 @@
+import logging
+import threading
+import time
+
+from .sqlite_db import Connections, add_column
+from .tzcache import RateLimited
+
+logger = logging.getLogger(__name__)
+
+
+def event_key(code, team_id="", occurrence=None):
+    """The dedup key of a reminder for an event; events are only unique within a workspace.
+
+    Each occurrence of a recurring event, given by its timestamp, can have a reminder of its own.
+    """
+    key = f"event:{team_id}:{code}" if team_id else f"event:{code}"
+    return key if occurrence is None else f"{key}@{occurrence}"
+
+
+class ReminderScheduler:
+    """Persistent reminder queue, delivered by a background thread.
+
+    Reminders live in an SQLite table indexed by (status, post_at), so the worker only ever
+    reads what is due, and pending reminders survive restarts. There is at most one reminder
+    per user and key, so repeated "Remind me" clicks are free. Delivery is paced to `rate`
+    messages per second and backs off when Slack rate limits us.
+
+    Several processes may share one queue: each batch is claimed (status 'sending') in one
+    transaction before it is sent, so no two processes send the same reminder. A claim lasts
+    `claim_timeout` seconds; reminders claimed by a process that died are sent again after that.
+
+    send(user_id, text, team_id) delivers one reminder. team_id is "" unless the bot is
+    installed in several workspaces, and scopes a reminder's event code to its workspace.
+    """
+
+    def __init__(self, path, send, rate=10.0, batch_size=50, max_attempts=5, retry_delay=30, claim_timeout=300):
+        self.path = path
+        self.send = send
+        self.rate = rate
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.claim_timeout = claim_timeout
+        self._connections = Connections(path)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.sent = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS reminders (
+                id INTEGER PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                team_id TEXT NOT NULL DEFAULT '',
+                dedup_key TEXT NOT NULL,
+                event_code TEXT,
+                post_at REAL NOT NULL,
+                text TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                UNIQUE (user_id, dedup_key)
+            );
+            CREATE INDEX IF NOT EXISTS reminders_due ON reminders (status, post_at);
+        """)
+        conn = self._connect()
+        # Queues from before multi-workspace installs get the column, with every reminder in ""
+        add_column(conn, "reminders", "team_id", "TEXT NOT NULL DEFAULT ''")
+        conn.executescript("""
+            DROP INDEX IF EXISTS reminders_event;
+            CREATE INDEX IF NOT EXISTS reminders_team_event ON reminders (team_id, event_code);
+        """)
+
+    def _connect(self):
+        return self._connections.get()
+
+    def add(self, user_id, key, post_at, text, event_code=None, team_id=""):
+        """Schedules a reminder, returning False if the user already has one pending for this key."""
+        # A reminder that was already sent or cancelled is armed again rather than duplicated
+        cursor = self._connect().execute(
+            "INSERT INTO reminders (user_id, team_id, dedup_key, event_code, post_at, text) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (user_id, dedup_key) DO UPDATE SET post_at = excluded.post_at, text = excluded.text, "
+            "event_code = excluded.event_code, team_id = excluded.team_id, status = 'pending', attempts = 0 "
+            "WHERE reminders.status NOT IN ('pending', 'sending')",
+            (user_id, team_id, key, event_code, post_at, text),
+        )
+        if cursor.rowcount:
+            self._wake.set()
+            return True
+        return False
+
+    def reschedule(self, code, post_at, text, new_code=None, now=None, team_id="", move=None):
+        """Moves every pending reminder for a workspace's event to its new time, text and code.
+
+        Reminders for an event that has moved into the past are cancelled instead. Runs as
+        one UPDATE over the (team_id, event_code) index however many users subscribed, and returns
+        (moved, cancelled).
+
+        For a recurring event post_at is unused and move(post_at) gives the new time of the
+        occurrence a reminder is for, so each of a user's reminders keeps to its own occurrence.
+        """
+        new_code = new_code or code
+        now = now or time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if move:
+                moved, cancelled = self._move_occurrences(conn, code, text, new_code, now, team_id, move)
+            elif post_at <= now:
+                moved, cancelled = 0, conn.execute(
+                    "UPDATE reminders SET status = 'cancelled' "
+                    "WHERE team_id = ? AND event_code = ? AND status = 'pending'",
+                    (team_id, code),
+                ).rowcount
+            else:
+                # OR REPLACE: a leftover reminder already keyed on the new code gives way to the moved one
+                moved, cancelled = conn.execute(
+                    "UPDATE OR REPLACE reminders SET post_at = ?, text = ?, event_code = ?, dedup_key = ? "
+                    "WHERE team_id = ? AND event_code = ? AND status = 'pending' "
+                    "AND (post_at != ? OR text != ? OR event_code != ?)",
+                    (post_at, text, new_code, event_key(new_code, team_id), team_id, code, post_at, text, new_code),
+                ).rowcount, 0
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if moved:
+            self._wake.set()
+        return moved, cancelled
+
+    @staticmethod
+    def _move_occurrences(conn, code, text, new_code, now, team_id, move):
+        rows = conn.execute(
+            "SELECT id, post_at, text, event_code FROM reminders "
+            "WHERE team_id = ? AND event_code = ? AND status = 'pending'",
+            (team_id, code),
+        ).fetchall()
+        cancel, update = [], []
+        for row in rows:
+            post_at = move(row["post_at"])
+            if post_at != row["post_at"] and post_at <= now:
+                cancel.append((row["id"],))
+            elif (post_at, text, new_code) != (row["post_at"], row["text"], row["event_code"]):
+                update.append((post_at, text, new_code, event_key(new_code, team_id, post_at), row["id"]))
+        conn.executemany("UPDATE reminders SET status = 'cancelled' WHERE id = ?", cancel)
+        # Clear the keys first: a reminder can move onto the occurrence another one is leaving
+        conn.executemany("UPDATE reminders SET dedup_key = 'moving:' || id WHERE id = ?", [row[-1:] for row in update])
+        conn.executemany(
+            "UPDATE OR REPLACE reminders SET post_at = ?, text = ?, event_code = ?, dedup_key = ? WHERE id = ?", update
+        )
+        return len(update), len(cancel)
+
+    def pending(self):
+        return self._connect().execute("SELECT COUNT(*) FROM reminders WHERE status = 'pending'").fetchone()[0]
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="reminders", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                delivered = self.deliver_due()
+            except Exception:
+                logger.exception("Delivering reminders failed")
+                delivered = 0
+            if delivered:
+                continue
+            self._wake.wait(self._sleep_time())
+            self._wake.clear()
+
+    def _sleep_time(self):
+        row = self._connect().execute(
+            "SELECT MIN(post_at) FROM reminders WHERE status IN ('pending', 'sending')"
+        ).fetchone()
+        if row[0] is None:
+            return 60
+        return min(max(row[0] - time.time(), 0), 60)
+
+    def _claim(self, now):
+        """Marks a batch of due reminders as being sent by us and returns them.
+
+        Claimed reminders are due again when the claim runs out, which is how the ones a dead
+        process claimed come back. BEGIN IMMEDIATE makes picking and marking them one step.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "UPDATE reminders SET status = 'sending', post_at = ? WHERE id IN ("
+                "SELECT id FROM reminders WHERE status IN ('pending', 'sending') AND post_at <= ? "
+                "ORDER BY post_at LIMIT ?) "
+                "RETURNING id, user_id, team_id, text, attempts",
+                (now + self.claim_timeout, now, self.batch_size),
+            ).fetchall()
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return sorted(rows, key=lambda row: row["id"])
+
+    def _release(self, rows):
+        """Hands claimed reminders we didn't get to back to the queue, due straight away."""
+        self._connect().executemany(
+            "UPDATE reminders SET status = 'pending', post_at = ? WHERE id = ? AND status = 'sending'",
+            ((time.time(), row["id"]) for row in rows),
+        )
+
+    def deliver_due(self, now=None):
+        """Sends one batch of due reminders and returns how many were handled."""
+        conn = self._connect()
+        rows = self._claim(now or time.time())
+        interval = 1 / self.rate if self.rate else 0
+        for i, row in enumerate(rows):
+            if self._stop.is_set():
+                self._release(rows[i:])
+                break
+            started = time.monotonic()
+            try:
+                self.send(row["user_id"], row["text"], row["team_id"])
+            except RateLimited as e:
+                # Put this one and the rest of the batch back and try again later
+                self.rate_limited += 1
+                self._release(rows[i:])
+                self._stop.wait(e.retry_after)
+                break
+            except Exception:
+                logger.exception("Sending reminder %s failed", row["id"])
+                attempts = row["attempts"] + 1
+                if attempts >= self.max_attempts:
+                    self.failed += 1
+                    conn.execute("UPDATE reminders SET status = 'failed', attempts = ? WHERE id = ?",
+                                 (attempts, row["id"]))
+                else:
+                    conn.execute("UPDATE reminders SET status = 'pending', post_at = ?, attempts = ? WHERE id = ?",
+                                 (time.time() + self.retry_delay * 2 ** (attempts - 1), attempts, row["id"]))
+            else:
+                self.sent += 1
+                conn.execute("UPDATE reminders SET status = 'sent' WHERE id = ?", (row["id"],))
+            # Pace ourselves so a burst of due reminders doesn't trip Slack's rate limits
+            self._stop.wait(max(0.0, interval - (time.monotonic() - started)))
+        return len(rows)
+
+    def stats(self):
+        return {
+            "pending": self.pending(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "rate_limited": self.rate_limited,
+        }
@@ -0,0 +1,98 @@
+"""Block Kit templates and cached formatting for the response builders.
+
+A Template is compiled once from a Block Kit structure with Slot placeholders. fill()
+returns a structure that shares every part without a slot with the template, so a
+response only allocates the few dicts on the way to the values that change. The shared
+parts are frozen, so a caller can't modify one response and corrupt every later one.
+"""
+import functools
+import json
+from datetime import datetime
+
+from .tz_resolver import resolver
+
+# The C string encoder json.dumps uses, without the per-call setup of json.dumps
+_encode = json.encoder.encode_basestring
+
+
+class Slot:
+    """Marks where a template takes a value: fill(name=value)."""
+
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+
+class FrozenDict(dict):
+    """A dict that refuses changes; json.dumps serializes it like any other dict."""
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("template blocks are shared and read-only, copy them first")
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def copy(self):
+        return dict(self)
+
+
+def _compile(node):
+    """Returns (True, build(values)) for a node containing slots, or (False, frozen node)."""
+    if isinstance(node, Slot):
+        name = node.name
+        return True, lambda values: values[name]
+    if isinstance(node, dict):
+        parts = {key: _compile(value) for key, value in node.items()}
+        dynamic = tuple((key, build) for key, (is_dynamic, build) in parts.items() if is_dynamic)
+        if not dynamic:
+            return False, FrozenDict((key, value) for key, (_, value) in parts.items())
+        base = {key: value for key, (is_dynamic, value) in parts.items() if not is_dynamic}
+
+        def build_dict(values):
+            result = base.copy()
+            for key, build in dynamic:
+                result[key] = build(values)
+            return result
+        return True, build_dict
+    if isinstance(node, (list, tuple)):
+        parts = tuple(_compile(value) for value in node)
+        if not any(is_dynamic for is_dynamic, _ in parts):
+            return False, tuple(value for _, value in parts)
+        return True, lambda values: [build(values) if is_dynamic else build for is_dynamic, build in parts]
+    return False, node
+
+
+def freeze(tree):
+    """A read-only copy of a Block Kit structure without slots, to pass as a slot value."""
+    is_dynamic, frozen = _compile(tree)
+    if is_dynamic:
+        raise ValueError("freeze() takes a structure without slots, use a Template")
+    return frozen
+
+
+class Template:
+    def __init__(self, tree):
+        is_dynamic, built = _compile(tree)
+        self._build = built if is_dynamic else (lambda values: built)
+
+    def fill(self, **values):
+        return self._build(values)
+
+
+@functools.lru_cache(maxsize=512)
+def formatter(timezone_name, fmt):
+    """Returns a function that formats UTC timestamps in timezone_name."""
+    tz = resolver.timezone(timezone_name)
+
+    def format_timestamp(timestamp):
+        return datetime.fromtimestamp(timestamp, tz).strftime(fmt)
+    return format_timestamp
+
+
+def json_object(**fields):
+    """Serializes a flat dict of strings and numbers, skipping None, like a compact json.dumps."""
+    return "{" + ",".join(
+        f'"{key}":{_encode(value) if isinstance(value, str) else repr(value)}'
+        for key, value in fields.items() if value is not None
+    ) + "}"
@@ -0,0 +1,896 @@
+"""Builds the replies, modals and messages for each command.
+
+Nothing in here talks to Slack: the sync app in app.py and the asyncio app in
+async_app.py do the I/O (timezone lookups, event store, respond) and share these builders.
+"""
+import heapq
+import json
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+
+from .bulk import FORMATS, format_for, import_summary
+from .event_store import EventExists, NotOwner, VersionConflict
+from .metrics import metrics
+from .recurrence import FREQUENCIES, corresponding, describe, expand, next_occurrences, rule, upcoming
+from .reminders import event_key
+from .render import Slot, Template, formatter, freeze, json_object
+from .tz_resolver import UnknownTimezone, resolver
+
+DEFAULT_TIMEZONE = "America/New_York"
+
+CODE_TAKEN = "❌ Event with this code already exists."
+NOT_OWNER = "❌ You can only edit events you created."
+CHANGED_SINCE_OPENED = ("❌ Someone else changed this event after you opened it. "
+                        "Close this and run /set_event again to see their changes.")
+
+FULL_TIME = "%Y-%m-%d %H:%M:%S %Z"
+
+# Slack rejects messages with more than 50 blocks: two blocks per event plus the navigation row
+EVENTS_PER_PAGE = 24
+
+
+def mention_id(arg):
+    """Returns the user ID of a `<@U123>` or `<@U123|name>` mention, or None."""
+    if arg.startswith("<@"):
+        return arg[2:-1].split("|")[0]
+    return None
+
+
+def timezone_arg(arg, timezones):
+    """Returns the tz database name for an argument, looking mentions up in timezones."""
+    user_id = mention_id(arg)
+    if user_id:
+        # Extract the timezone name from the mention
+        return timezones[user_id]
+    return resolver.canonical(arg)
+
+
+def unknown_timezone(e):
+    """The reply to an UnknownTimezone, with its suggestions or else a few valid examples."""
+    if e.suggestions:
+        return f"❌ {e}"
+    return f"❌ {e} Please use a valid timezone like `Asia/Singapore`, `US/Pacific`, or `Europe/Berlin`."
+
+
+def store_error(e, doing, shown=None):
+    """Turns an event store exception into the message shown to the user.
+
+    doing labels the error metric, so it is one of a fixed few; shown replaces it in the message,
+    e.g. to name the file.
+    """
+    metrics.error(e, doing=doing)
+    if isinstance(e, FileNotFoundError):
+        return "❌ Events file not found."
+    if isinstance(e, json.JSONDecodeError):
+        return "❌ Error reading events file."
+    return f"❌ Error {shown or doing}: `{str(e)}`"
+
+
+REMIND_BUTTON = Template({
+    "type": "actions",
+    "elements": [
+        {
+            "type": "button",
+            "text": {
+                "type": "plain_text",
+                "text": "Remind me",
+                "emoji": True
+            },
+            "value": Slot("value"),
+            "action_id": "reminder"
+        }
+    ]
+})
+
+SECTION = Template({
+    "type": "section",
+    "text": {
+        "type": "mrkdwn",
+        "text": Slot("text")
+    }
+})
+
+
+def remind_button(timestamp, timezone_name, code=None, description=None, repeats=False):
+    # Field order matters to nobody, but the value is a JSON string reminder_message() reads back
+    return REMIND_BUTTON.fill(value=json_object(code=code, timestamp=timestamp, description=description,
+                                                timezone=timezone_name, repeats=1 if repeats else None))
+
+
+# get time
+# Result zones can name a saved group explicitly ("group:apac") or just by name ("apac")
+GROUP_PREFIX = "group:"
+# Keep each section well under Slack's 3000 character limit
+LINES_PER_SECTION = 20
+
+
+def get_time_group_names(args):
+    """Returns the zone groups a /get_time command may refer to."""
+    names = []
+    for arg in args[3:]:
+        if arg.startswith(GROUP_PREFIX):
+            names.append(arg[len(GROUP_PREFIX):])
+        elif not mention_id(arg) and resolver.find(arg) is None:
+            names.append(arg)
+    return names
+
+
+def get_time_targets(args, groups):
+    """Returns the result timezone arguments, with zone groups expanded into their zones."""
+    targets = []
+    for arg in args[3:]:
+        name = arg[len(GROUP_PREFIX):] if arg.startswith(GROUP_PREFIX) else arg
+        group = groups.get(name)
+        if group and (arg.startswith(GROUP_PREFIX) or resolver.find(arg) is None):
+            targets.extend(group["zones"])
+        else:
+            targets.append(arg)
+    return list(dict.fromkeys(targets))
+
+
+def get_time_users(args, user_id, groups=None):
+    """Returns the users whose timezones /get_time needs."""
+    users = [mention_id(arg) for arg in args[:1] + get_time_targets(args, groups or {})]
+    if len(args) <= 3:
+        users.append(user_id)
+    return [user for user in dict.fromkeys(users) if user]
+
+
+def target_timezone(arg, timezones):
+    if arg.startswith(GROUP_PREFIX):
+        raise ValueError(f"no zone group named '{arg[len(GROUP_PREFIX):]}'")
+    return timezone_arg(arg, timezones)
+
+
+def parse_time_parts(text):
+    time_parts = list(map(int, text.split(":")))
+    while len(time_parts) < 4:
+        time_parts.append(0)
+    return time_parts
+
+
+@metrics.timed("render")
+def get_time_response(args, user_id, timezones, groups=None):
+    """Builds the /get_time reply.
+
+    timezones maps every user from get_time_users to a timezone, and groups maps the names
+    from get_time_group_names to the saved groups that exist.
+    """
+    try:
+        if len(args) > 0:
+            org_timezone_name = timezone_arg(args[0], timezones)
+        else:
+            org_timezone_name = DEFAULT_TIMEZONE
+        org_timezone = resolver.timezone(org_timezone_name)
+
+        end_parts = None
+        if len(args) > 1:
+            # Either a single time or a window like 9-17 or 9:30-17:45
+            start_text, _, end_text = args[1].partition("-")
+            time_parts = parse_time_parts(start_text)
+            if end_text:
+                end_parts = parse_time_parts(end_text)
+        else:
+            time_parts = list(datetime.now(org_timezone).timetuple()[:6][3:7])  # Get current time in org timezone
+            time_parts.append(0)
+
+        now = datetime.now()
+        default_day = now.day
+        default_month = now.month
+        default_year = now.year
+
+        if len(args) > 2:
+            date_parts = list(map(int, args[2].split("/")))
+
+            # Fill in missing values from current date
+            if len(date_parts) == 1:
+                day = date_parts[0]
+                month = default_month
+                year = default_year
+            elif len(date_parts) == 2:
+                day, month = date_parts
+                year = default_year
+            elif len(date_parts) == 3:
+                day, month, year = date_parts
+            else:
+                raise ValueError("Invalid date format. Use DD, DD/MM, or DD/MM/YYYY.")
+        else:
+            # Default to today
+            day = default_day
+            month = default_month
+            year = default_year
+        # Format: datetime(year, month, day, hour, minute, second, microsecond)
+        dt = datetime(
+            year=year,
+            month=month,
+            day=day,
+            hour=time_parts[0],
+            minute=time_parts[1],
+            second=time_parts[2],
+            microsecond=time_parts[3],
+        )
+        end_dt = None
+        if end_parts:
+            end_dt = dt.replace(hour=end_parts[0], minute=end_parts[1], second=end_parts[2], microsecond=end_parts[3])
+            if end_dt <= dt:
+                # A window like 22-6 ends the next day
+                end_dt += timedelta(days=1)
+
+        # Localize in origin timezone, once
+        dt = org_timezone.localize(dt)
+        if end_dt:
+            end_dt = org_timezone.localize(end_dt)
+        if len(args) > 3:
+            result_names = [target_timezone(arg, timezones) for arg in get_time_targets(args, groups or {})]
+        else:
+            result_names = [timezones[user_id]]
+
+        # Convert the same instants to every result timezone
+        start = dt.timestamp()
+        end = end_dt.timestamp() if end_dt else None
+        lines = []
+        for user_tz_name in dict.fromkeys(result_names):
+            if end_dt:
+                short = formatter(user_tz_name, "%Y-%m-%d %H:%M")
+                lines.append(f"🕒 Time in `{user_tz_name}`: `{short(start)}` – `{short(end)}`")
+            else:
+                lines.append(f"🕒 Time in `{user_tz_name}`: `{formatter(user_tz_name, '%Y-%m-%d %H:%M:%S')(start)}`")
+
+        blocks = [
+            SECTION.fill(text="\n".join(lines[i:i + LINES_PER_SECTION]))
+            for i in range(0, len(lines), LINES_PER_SECTION)
+        ]
+        blocks.append(remind_button(start, result_names[0]))
+        return {"blocks": blocks}
+    except UnknownTimezone as e:
+        return {"text": unknown_timezone(e)}
+    except Exception as e:
+        return {"text": f"❌ Error parsing time: `{str(e)}`"}
+
+
+def load_zone_groups(event_store, args):
+    """Fetches the saved zone groups a /get_time command may refer to."""
+    groups = {}
+    for name in get_time_group_names(args):
+        group = event_store.get_zone_group(name)
+        if group:
+            groups[name] = group
+    return groups
+
+
+def zone_group_command(event_store, args, user_id):
+    """Shows (`/zone_group name`) or saves (`/zone_group name zone...`) a zone group."""
+    if not args:
+        return {"text": "❌ Please provide a group name."}
+    name, zones = args[0], args[1:]
+    try:
+        group = event_store.get_zone_group(name)
+        if not zones:
+            if not group:
+                return {"text": f"❌ No zone group named `{name}`."}
+            return {"text": f"🌐 Zone group `{name}`: " + ", ".join(group["zones"])}
+        if group and group["created_by"] != user_id:
+            return {"text": "❌ Zone group has been created by another user."}
+        # Keep mentions as they are so the group follows each user's current timezone
+        zones = [arg if mention_id(arg) else resolver.canonical(arg) for arg in zones]
+        event_store.save_zone_group(name, zones, user_id)
+        return {"text": f"✅ Saved zone group `{name}`: " + ", ".join(zones)}
+    except UnknownTimezone as e:
+        return {"text": f"❌ {e}"}
+    except Exception as e:
+        return {"text": f"❌ Error saving zone group: `{str(e)}`"}
+
+
+# get event
+def get_event_users(args, user_id):
+    """Returns the users whose timezones /get_event needs."""
+    if len(args) > 1:
+        return [user for user in [mention_id(args[1])] if user]
+    return [user_id]
+
+
+def get_event_timezone(args, user_id, timezones):
+    if len(args) > 1:
+        return timezone_arg(args[1], timezones)
+    return timezones[user_id]
+
+
+def next_time(code, event, now=None):
+    """When the event next happens: its timestamp, or for a recurring event the next occurrence."""
+    if event.get("recurrence"):
+        return next_occurrences.get(code, event, now)
+    return event["timestamp"]
+
+
+def repeats_line(event):
+    return f"🔁 Repeats: {describe(event)}\n" if event.get("recurrence") else ""
+
+
+@metrics.timed("render")
+def get_event_response(event_id, event, timezone_name):
+    if not event:
+        return {"text": f"❌ No event found with ID `{event_id}`."}
+    try:
+        when = next_time(event_id, event)
+        timestamp = formatter(timezone_name, FULL_TIME)(when)
+        repeats = repeats_line(event)
+    except Exception as e:
+        return {"text": f"❌ Error retrieving event: `{str(e)}`"}
+    return {"blocks": [
+        SECTION.fill(text=f"📅 Event: \n```{event['description']}```\n"
+                          f"🕒 {'Next time' if repeats else 'Time'}: `{timestamp}`\n"
+                          f"{repeats}"
+                          f"👤 Created by: <@{event['created_by']}>"),
+        remind_button(when, timezone_name, event_id, event["description"], bool(repeats)),
+    ]}
+
+
+# set event
+# "never" stands for no recurrence; the others are recurrence.FREQUENCIES
+RECURRENCE_OPTIONS = [
+    {"text": {"type": "plain_text", "text": label, "emoji": True}, "value": value}
+    for value, label in (("never", "Never"), ("daily", "Daily"), ("weekly", "Weekly"), ("monthly", "Monthly"))
+]
+RECURRENCE_OPTION = {option["value"]: freeze(option) for option in RECURRENCE_OPTIONS}
+
+SET_EVENT_MODAL = Template({
+    "type": "modal",
+    "callback_id": "save_event",
+    "title": {
+        "type": "plain_text",
+        "text": "Event Details",
+        "emoji": True
+    },
+    "submit": {
+        "type": "plain_text",
+        "text": "Submit",
+        "emoji": True
+    },
+    "close": {
+        "type": "plain_text",
+        "text": "Cancel",
+        "emoji": True
+    },
+    "blocks": [
+        {
+            "type": "input",
+            "block_id": "code_block",
+            "element": {
+                "type": "plain_text_input",
+                "action_id": "code_input",
+                "initial_value": Slot("code")
+            },
+            "label": {
+                "type": "plain_text",
+                "text": "Event code",
+                "emoji": True
+            }
+        },
+        {
+            "type": "section",
+            "block_id": "datepicker_block",
+            "text": {
+                "type": "mrkdwn",
+                "text": Slot("date_label")
+            },
+            "accessory": {
+                "type": "datepicker",
+                "initial_date": Slot("date"),
+                "placeholder": {
+                    "type": "plain_text",
+                    "text": "Select a date",
+                    "emoji": True
+                },
+                "action_id": "datepicker"
+            }
+        },
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": Slot("time_label")
+            }
+        },
+        {
+            "type": "actions",
+            "block_id": "timepicker_block",
+            "elements": [
+                {
+                    "type": "timepicker",
+                    "initial_time": Slot("time"),
+                    "placeholder": {
+                        "type": "plain_text",
+                        "text": "Select time",
+                        "emoji": True
+                    },
+                    "action_id": "timepicker"
+                },
+                {
+                    "type": "button",
+                    "text": {
+                        "type": "plain_text",
+                        "text": "Current time and day",
+                        "emoji": True
+                    },
+                    "value": "click_me_123",
+                    "action_id": "reset_time"
+                }
+            ]
+        },
+        {
+            "type": "input",
+            "block_id": "recurrence_block",
+            "element": {
+                "type": "static_select",
+                "action_id": "recurrence_select",
+                "options": RECURRENCE_OPTIONS,
+                "initial_option": Slot("recurrence")
+            },
+            "label": {
+                "type": "plain_text",
+                "text": "Repeats",
+                "emoji": True
+            }
+        },
+        {
+            "type": "input",
+            "block_id": "description_block",
+            "element": {
+                "type": "plain_text_input",
+                "multiline": True,
+                "action_id": "description_input",
+                "initial_value": Slot("description")
+            },
+            "label": {
+                "type": "plain_text",
+                "text": "Description",
+                "emoji": True
+            }
+        }
+    ],
+    "private_metadata": Slot("private_metadata"),
+})
+
+
+def set_event_modal(code, description, timestamp, user_timezone_name, private_metadata, recurrence=None):
+    return SET_EVENT_MODAL.fill(
+        code=code,
+        description=description,
+        recurrence=RECURRENCE_OPTION.get(recurrence, RECURRENCE_OPTIONS[0]),
+        date_label=f"Date (in {user_timezone_name}):",
+        date=formatter(user_timezone_name, "%Y-%m-%d")(timestamp),
+        time_label=f"Time (in {user_timezone_name}):",
+        time=formatter(user_timezone_name, "%H:%M")(timestamp),
+        private_metadata=private_metadata,
+    )
+
+
+@metrics.timed("render")
+def set_event_view(code, event, user_id, user_timezone_name):
+    """Builds the /set_event modal, or returns None if someone else owns the event."""
+    if event and user_id != event["created_by"]:
+        return None
+    # Saving checks the event is still at this version, so concurrent edits aren't silently lost
+    metadata = json_object(original_code=code, user_timezone=user_timezone_name,
+                           version=event.get("version", 1) if event else 0)
+    if event:
+        recurrence = event.get("recurrence")
+        return set_event_modal(code, event["description"], event["timestamp"], user_timezone_name, metadata,
+                               recurrence["freq"] if recurrence else None)
+    # Validates the timezone up front, like the lookups below would
+    resolver.timezone(user_timezone_name)
+    return set_event_modal(code, "", int(time.time()), user_timezone_name, metadata)
+
+
+def submitted_event(view, user_id):
+    """Reads a submitted /set_event modal into (new_code, original_code, event, version).
+
+    version is the one the modal was opened at (0 for a new event), or None if it didn't say.
+    """
+    values = view["state"]["values"]
+    new_code = values["code_block"]["code_input"]["value"]
+    date = values["datepicker_block"]["datepicker"]["selected_date"]
+    time = values["timepicker_block"]["timepicker"]["selected_time"]
+    description = values["description_block"]["description_input"]["value"]
+    # Modals opened before recurrence existed don't have the select
+    selected = values.get("recurrence_block", {}).get("recurrence_select", {}).get("selected_option")
+    freq = selected["value"] if selected else "never"
+    meta = json.loads(view.get("private_metadata", "{}"))
+    original_code = meta.get("original_code", new_code)
+    user_timezone_name = meta.get("user_timezone", DEFAULT_TIMEZONE)
+
+    # Parse the date/time in user's timezone and convert to UTC timestamp
+    user_timezone = resolver.timezone(user_timezone_name)
+    naive_datetime = datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M")
+    localized_datetime = user_timezone.localize(naive_datetime)
+    event = {
+        "description": description,
+        "timestamp": localized_datetime.timestamp(),
+        "created_by": user_id
+    }
+    if freq in FREQUENCIES:
+        # Occurrences keep the wall-clock time the user picked, in their timezone
+        event["recurrence"] = rule(freq, user_timezone_name)
+    return new_code, original_code, event, meta.get("version")
+
+
+def save_conflict(event_store, new_code, original_code, version, user_id):
+    """Returns the errors to show on a submitted modal that can't be saved, or None.
+
+    These are cheap early checks so the user sees the problem on the modal; the event store
+    repeats them atomically when it saves.
+    """
+    if new_code != original_code and event_store.get(new_code):
+        return {"code_block": CODE_TAKEN}
+    current = event_store.get(original_code)
+    if current is None:
+        return None
+    if version == 0:
+        return {"code_block": CODE_TAKEN}
+    if current["created_by"] != user_id:
+        return {"code_block": NOT_OWNER}
+    if version is not None and current.get("version", 1) != version:
+        return {"description_block": CHANGED_SINCE_OPENED}
+    return None
+
+
+def save_failure(e, code):
+    """The DM for a save that failed after the modal was closed."""
+    if isinstance(e, EventExists):
+        return f"❌ Event `{code}` already exists, your changes were not saved."
+    if isinstance(e, VersionConflict):
+        return f"❌ Someone else changed `{code}` while you were editing it, your changes were not saved."
+    if isinstance(e, NotOwner):
+        return f"❌ `{code}` belongs to someone else, your changes were not saved."
+    return f"❌ Event `{code}` was not saved: `{str(e)}`"
+
+
+def save_error(e):
+    """Turns an exception from saving a modal into the errors shown on it."""
+    if isinstance(e, EventExists):
+        return {"code_block": CODE_TAKEN}
+    if isinstance(e, NotOwner):
+        return {"code_block": NOT_OWNER}
+    if isinstance(e, VersionConflict):
+        return {"description_block": CHANGED_SINCE_OPENED}
+    if isinstance(e, (FileNotFoundError, json.JSONDecodeError)):
+        return {"description_block": store_error(e, "saving event")}
+    return {"description_block": f"❌ Unexpected error: `{str(e)}`"}
+
+
+@metrics.timed("render")
+def reset_time_view(view):
+    """Rebuilds the /set_event modal with the pickers set to the current time.
+
+    The code and description come from what the user has typed so far, and the private
+    metadata is passed through as it is.
+    """
+    metadata = view.get("private_metadata", "{}")
+    meta = json.loads(metadata)
+    values = view.get("state", {}).get("values", {})
+    code = values.get("code_block", {}).get("code_input", {}).get("value") or meta.get("original_code", "")
+    description = values.get("description_block", {}).get("description_input", {}).get("value") or ""
+    selected = values.get("recurrence_block", {}).get("recurrence_select", {}).get("selected_option")
+    return set_event_modal(code, description, int(time.time()),
+                           meta.get("user_timezone", DEFAULT_TIMEZONE), metadata, selected and selected["value"])
+
+
+# reminders
+def reminder_text(description):
+    return f"🔔 Reminder: {description}"
+
+
+def reminder_message(action, body):
+    """Reads a "Remind me" click into (post_at, text, reminder_time, key), or None if it's invalid.
+
+    key is the event's code, with the occurrence's timestamp for a recurring event, or None.
+    """
+    # Parse the action value
+    if isinstance(action["value"], str):
+        event_data = json.loads(action["value"])
+    else:
+        event_data = action["value"]
+
+    timestamp = event_data.get("timestamp")
+    if not timestamp:
+        return None
+
+    # Convert timestamp to datetime
+    reminder_time = datetime.fromtimestamp(timestamp, resolver.timezone(event_data.get("timezone", DEFAULT_TIMEZONE)))
+    channel_id = body["channel"]["id"]
+    text = reminder_text(event_data.get("description", f"You set a reminder in <#{channel_id}>"))
+    post_at = int(reminder_time.timestamp())
+    code = event_data.get("code")
+    return post_at, text, reminder_time, code and (code, post_at if event_data.get("repeats") else None)
+
+
+def schedule_reminder(scheduler, action, body, now=None, team_id=""):
+    """Queues the reminder for a "Remind me" click and returns the reply text."""
+    reminder = reminder_message(action, body)
+    if not reminder:
+        return "❌ Invalid reminder data."
+    post_at, text, reminder_time, event = reminder
+    if post_at <= (now or time.time()):
+        return "❌ That time has already passed."
+    # One reminder per user and event or occurrence (or per time for /get_time), however often they click
+    code, occurrence = event or (None, None)
+    key = event_key(code, team_id, occurrence) if code else f"time:{post_at}"
+    if not scheduler.add(body["user"]["id"], key, post_at, text, event_code=code, team_id=team_id):
+        return f"🔔 You already have a reminder for {reminder_time.strftime('%Y-%m-%d %H:%M:%S %Z')}."
+    return f"🔔 Reminder set for {reminder_time.strftime('%Y-%m-%d %H:%M:%S %Z')}."
+
+
+def reschedule_reminders(scheduler, code, event, original_code=None, team_id="", previous=None):
+    """Moves the reminders of an edited event along with it and returns the note for its owner, or None.
+
+    previous is the event as it was before the edit, which says where a recurring event's occurrences were.
+    """
+    recurrence = event.get("recurrence")
+    was_recurring = bool(previous and previous.get("recurrence"))
+    move = None
+    if recurrence and was_recurring:
+        if (previous["recurrence"], previous["timestamp"]) == (recurrence, event["timestamp"]):
+            # Same occurrences, so only the text (and maybe the code) changes
+            move = int
+        else:
+            def move(post_at):
+                return int(corresponding(previous, event, post_at))
+    elif recurrence:
+        # Reminders set before the event repeated go to its next occurrence
+        upcoming_at = int(next_time(code, event))
+
+        def move(post_at):
+            return upcoming_at
+    moved, cancelled = scheduler.reschedule(
+        original_code or code, int(event["timestamp"]), reminder_text(event["description"]), new_code=code,
+        team_id=team_id, move=move,
+    )
+    notes = []
+    if moved:
+        notes.append(f"🔔 Moved {moved} reminder{'s' if moved != 1 else ''} for `{code}` to its new time.")
+    if cancelled:
+        notes.append(f"🔕 Cancelled {cancelled} reminder{'s' if cancelled != 1 else ''} for `{code}`, "
+                     f"it is now in the past.")
+    return " ".join(notes) or None
+
+
+# list events
+def event_blocks(events, timezone_name):
+    """Lazily renders the section and "Remind me" blocks for each event."""
+    format_time = formatter(timezone_name, FULL_TIME)
+    for event_id, event in events:
+        repeats = f" 🔁 {event['recurrence']['freq']}" if event.get("recurrence") else ""
+        yield SECTION.fill(text=f"*Event ID:* `{event_id}`\n"
+                                f"*Description:* {event['description']}\n"
+                                f"*Time:* {format_time(event['timestamp'])}{repeats}\n"
+                                f"*Created by:* <@{event['created_by']}>")
+        yield remind_button(event["timestamp"], timezone_name, event_id, event["description"], bool(repeats))
+
+
+NEXT_PAGE_BUTTON = Template({
+    "type": "actions",
+    "elements": [
+        {
+            "type": "button",
+            "text": {
+                "type": "plain_text",
+                "text": "Next page",
+                "emoji": True
+            },
+            "value": Slot("value"),
+            "action_id": "list_events_page"
+        }
+    ]
+})
+
+
+@metrics.timed("render")
+def list_events_page(event_store, start, end, timezone_name, after=None, now=None):
+    """Renders one page of events in [start, end) that come after the cursor.
+
+    Recurring events are expanded into their occurrences inside the window, merged in order
+    with the one-off events. A window with no end has no last occurrence to stop at, so
+    there each recurring event is listed once, at its next occurrence after now (when the
+    first page was asked for, which later pages pass back).
+    """
+    # Ask for one extra event so we know whether there is a next page
+    one_off = event_store.between(start, end, after=after, limit=EVENTS_PER_PAGE + 1, recurring=False)
+    if end is None:
+        now = time.time() if now is None else now
+        repeats = upcoming(event_store.recurring(), now, after)
+    else:
+        repeats = expand(list(event_store.recurring()), start, end, after)
+    page = list(islice(heapq.merge(one_off, repeats, key=lambda item: (item[1]["timestamp"], item[0])),
+                       EVENTS_PER_PAGE + 1))
+    blocks = list(event_blocks(page[:EVENTS_PER_PAGE], timezone_name))
+    if len(page) > EVENTS_PER_PAGE:
+        last_code, last_event = page[EVENTS_PER_PAGE - 1]
+        # The cursor is the (timestamp, code) of the last event on this page
+        cursor = {"start": start, "end": end, "after": [last_event["timestamp"], last_code], "timezone": timezone_name}
+        if end is None:
+            cursor["now"] = now
+        blocks.append(NEXT_PAGE_BUTTON.fill(value=json.dumps(cursor)))
+    return blocks
+
+
+# find events
+# Slack cuts option labels off at 75 characters and rejects values over 150
+OPTION_LABEL_LENGTH = 75
+OPTION_VALUE_LENGTH = 150
+# Slack shows at most 100 options
+OPTIONS_LIMIT = 20
+
+EVENT_SEARCH = Template({
+    "type": "section",
+    "block_id": "event_search_block",
+    "text": {
+        "type": "mrkdwn",
+        "text": "Find an event by its code or words from its description"
+    },
+    "accessory": {
+        "type": "external_select",
+        "action_id": "event_search",
+        "min_query_length": 1,
+        "placeholder": {
+            "type": "plain_text",
+            "text": "Start typing…",
+            "emoji": True
+        }
+    }
+})
+
+SELECTED_EVENT_SEARCH = Template({
+    "type": "section",
+    "block_id": "event_search_block",
+    "text": {
+        "type": "mrkdwn",
+        "text": "Find an event by its code or words from its description"
+    },
+    "accessory": {
+        "type": "external_select",
+        "action_id": "event_search",
+        "min_query_length": 1,
+        "placeholder": {
+            "type": "plain_text",
+            "text": "Start typing…",
+            "emoji": True
+        },
+        "initial_option": Slot("option")
+    }
+})
+
+FIND_EVENT_MODAL = Template({
+    "type": "modal",
+    "callback_id": "find_event",
+    "title": {
+        "type": "plain_text",
+        "text": "Find Event",
+        "emoji": True
+    },
+    "close": {
+        "type": "plain_text",
+        "text": "Close",
+        "emoji": True
+    },
+    "blocks": Slot("blocks")
+})
+
+
+def event_option(code, event):
+    label = f"{code} · {event['description']}" if event.get("description") else code
+    if len(label) > OPTION_LABEL_LENGTH:
+        label = label[:OPTION_LABEL_LENGTH - 1] + "…"
+    return {"text": {"type": "plain_text", "text": label, "emoji": True}, "value": code}
+
+
+@metrics.timed("render")
+def event_options(results):
+    """The external select's options for (code, event) search results."""
+    return [event_option(code, event) for code, event in results if len(code) <= OPTION_VALUE_LENGTH]
+
+
+@metrics.timed("render")
+def find_event_view(code=None, event=None, timezone_name=DEFAULT_TIMEZONE):
+    """The /find_event modal: an autocompleting select, and the event picked in it if any."""
+    if code is None:
+        return FIND_EVENT_MODAL.fill(blocks=[EVENT_SEARCH.fill()])
+    search = SELECTED_EVENT_SEARCH.fill(option=event_option(code, event) if event else
+                                        {"text": {"type": "plain_text", "text": code}, "value": code})
+    # The "Remind me" button needs a channel to reply in, which a modal doesn't have
+    details = get_event_response(code, event, timezone_name)
+    return FIND_EVENT_MODAL.fill(blocks=[search, details["blocks"][0] if "blocks" in details
+                                         else SECTION.fill(text=details["text"])])
+
+
+@metrics.timed("render")
+def find_event_response(query, results, timezone_name):
+    """Renders up to EVENTS_PER_PAGE search results; pass one more to say there are others."""
+    if not results:
+        return {"text": f"❌ No events match `{query}`."}
+    more = len(results) > EVENTS_PER_PAGE
+    heading = (f"🔎 The first {EVENTS_PER_PAGE} events matching `{query}`, search for more words to narrow it down:"
+               if more else f"🔎 Events matching `{query}`:")
+    return {"blocks": [SECTION.fill(text=heading), *event_blocks(results[:EVENTS_PER_PAGE], timezone_name)]}
+
+
+# import / export events
+IMPORT_EVENTS_MODAL = Template({
+    "type": "modal",
+    "callback_id": "import_events",
+    "title": {
+        "type": "plain_text",
+        "text": "Import Events",
+        "emoji": True
+    },
+    "submit": {
+        "type": "plain_text",
+        "text": "Import",
+        "emoji": True
+    },
+    "close": {
+        "type": "plain_text",
+        "text": "Cancel",
+        "emoji": True
+    },
+    "blocks": [
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": "Upload events as NDJSON (`.ndjson`), CSV (`.csv`) or a calendar (`.ics`), like "
+                        "`/export_events` makes. They are imported as yours, events with the same code are "
+                        "updated, and other people's events are left alone."
+            }
+        },
+        {
+            "type": "input",
+            "block_id": "file_block",
+            "label": {
+                "type": "plain_text",
+                "text": "File",
+                "emoji": True
+            },
+            "element": {
+                "type": "file_input",
+                "action_id": "file_input",
+                "filetypes": ["ndjson", "jsonl", "csv", "ics"],
+                "max_files": 1
+            }
+        }
+    ]
+})
+
+UNKNOWN_IMPORT_FORMAT = "❌ Upload a `.ndjson`, `.jsonl`, `.csv` or `.ics` file."
+
+
+def export_format(text):
+    """The format asked for in /export_events [ndjson|csv|ics], CSV by default, or None."""
+    fmt = text.strip().lower().lstrip(".") or "csv"
+    return "ndjson" if fmt == "jsonl" else fmt if fmt in FORMATS else None
+
+
+def export_comment(fmt, stats):
+    return (f"📤 {stats['events']} event{'s' if stats['events'] != 1 else ''} as {fmt.upper()}, exported at "
+            f"{stats['events_per_second']} events/sec. `/import_events` takes the file back.")
+
+
+def import_events_view():
+    return IMPORT_EVENTS_MODAL.fill()
+
+
+def submitted_import(view):
+    """Reads a submitted /import_events modal into (file, format); format is None if it isn't one we read."""
+    file = view["state"]["values"]["file_block"]["file_input"]["files"][0]
+    return file, format_for(file.get("name"))
+
+
+def import_report(name, stats):
+    """The DM summing up an import, with the first few invalid lines."""
+    lines = [f"📥 `{name}`: {import_summary(stats)}."]
+    if stats["errors"]:
+        lines.append("Not imported:")
+        lines.extend(f"• {error}" for error in stats["errors"])
+        if stats["invalid"] > len(stats["errors"]):
+            lines.append(f"…and {stats['invalid'] - len(stats['errors'])} more.")
+    return "\n".join(lines)
@@ -0,0 +1,162 @@
+"""Search over event codes and descriptions, for /find_event and the event autocomplete.
+
+SearchIndex keeps every code in a sorted list, so the codes starting with what the user
+typed are one bisect away, and every word of a code or description in a sorted list of
+tokens, each with the set of codes it appears in. A query matches the codes that start
+with it first, then the events with a word starting with each of its terms. Saves update
+the index in place (see EventStore.search()), nothing is rebuilt for them.
+"""
+import bisect
+import heapq
+import re
+from itertools import chain, filterfalse, islice
+
+_WORD = re.compile(r"\w+")
+
+# A term whose tokens are in more codes than this all told (say "1", before thousands of
+# numbers, or a word in most descriptions) is checked against each candidate's words instead
+# of collecting every code under it
+_BROAD = 2000
+# When every term is broad, only this many codes under one of them are checked against the
+# rest, so a mix of common terms can't scan every event while the user is typing
+_SCAN = 4000
+
+
+def terms(text):
+    """The lowercased words of a code, description or query."""
+    return _WORD.findall(text.lower())
+
+
+def _discard(items, item):
+    i = bisect.bisect_left(items, item)
+    if i < len(items) and items[i] == item:
+        del items[i]
+
+
+def _order(code):
+    return code.lower(), code
+
+
+def _containing(codes, needle, documents):
+    return (code for code in codes if needle in documents[code])
+
+
+class SearchIndex:
+    """Prefix index over event codes plus a token index over their words."""
+
+    def __init__(self, events=()):
+        self._postings = {}  # token -> codes whose code or description has it
+        # code -> its tokens as " token token ...", where " " + term is a substring exactly
+        # when the term is a prefix of one of them
+        self._documents = {}
+        # Building in bulk sorts once rather than inserting 100k times
+        for code, event in events:
+            self._documents[code] = text = self._text(code, event)
+            for token in text.split():
+                self._postings.setdefault(token, set()).add(code)
+        self._codes = sorted(_order(code) for code in self._documents)  # (lowercased code, code)
+        self._tokens = sorted(self._postings)
+
+    def __len__(self):
+        return len(self._documents)
+
+    @staticmethod
+    def _text(code, event):
+        tokens = dict.fromkeys(terms(code))
+        tokens.update(dict.fromkeys(terms(event.get("description") or "")))
+        return " " + " ".join(tokens)
+
+    def add(self, code, event):
+        """Indexes a new or changed event."""
+        self.remove(code)
+        self._documents[code] = text = self._text(code, event)
+        bisect.insort(self._codes, _order(code))
+        for token in text.split():
+            codes = self._postings.get(token)
+            if codes is None:
+                codes = self._postings[token] = set()
+                bisect.insort(self._tokens, token)
+            codes.add(code)
+
+    def remove(self, code):
+        text = self._documents.pop(code, None)
+        if text is None:
+            return
+        _discard(self._codes, _order(code))
+        for token in text.split():
+            codes = self._postings[token]
+            codes.discard(code)
+            if not codes:
+                del self._postings[token]
+                _discard(self._tokens, token)
+
+    def search(self, query, limit=10):
+        """Returns up to limit codes matching query, best first.
+
+        Codes starting with the query come first, an exact match ahead of the rest, then
+        codes whose code or description has words starting with every term of the query.
+        Each group is in case-insensitive code order.
+        """
+        key = query.strip().lower()
+        if not key or limit <= 0:
+            return []
+        results = []
+        codes = self._codes
+        i = bisect.bisect_left(codes, (key,))
+        while i < len(codes) and len(results) < limit and codes[i][0].startswith(key):
+            results.append(codes[i][1])
+            i += 1
+        if len(results) < limit:
+            seen = set(results)
+            results.extend(self._matching(terms(key), limit - len(results), seen.__contains__))
+        return results
+
+    def _matching(self, words, limit, skip):
+        """The first limit codes, in order, with a token starting with each of words.
+
+        When every word is broad, the first among the _SCAN candidates checked.
+        """
+        words = set(words)
+        if not words:
+            return []
+        # Collect the codes under the narrow terms with set operations; the broad ones are
+        # checked one candidate at a time, which is cheap once the narrow ones have filtered
+        narrow = []
+        broad = []
+        for word in words:
+            lo = bisect.bisect_left(self._tokens, word)
+            hi = bisect.bisect_left(self._tokens, word + "\U0010ffff", lo)
+            if lo == hi:
+                return []
+            codes = self._codes_under(lo, hi)
+            if codes is None:
+                broad.append((hi - lo, lo, " " + word))
+            else:
+                narrow.append(codes)
+        if narrow:
+            narrow.sort(key=len)
+            found = narrow[0].intersection(*narrow[1:]) if len(narrow) > 1 else narrow[0]
+        else:
+            # Only broad terms: draw the candidates from the codes of the one with fewest tokens
+            broad.sort()
+            count, lo, _ = broad.pop(0)
+            postings = (self._postings[self._tokens[i]] for i in range(lo, lo + count))
+            found = dict.fromkeys(islice(chain.from_iterable(postings), _SCAN))
+        for _, _, needle in broad:
+            found = _containing(found, needle, self._documents)
+        return heapq.nsmallest(limit, filterfalse(skip, found), key=_order)
+
+    def _codes_under(self, lo, hi):
+        """The codes with one of tokens[lo:hi], or None if there are more than _BROAD of them."""
+        postings = []
+        size = 0
+        # Every token has a code, so this stops within _BROAD tokens however many there are
+        for token in self._tokens[lo:min(hi, lo + _BROAD + 1)]:
+            postings.append(self._postings[token])
+            size += len(postings[-1])
+            if size > _BROAD:
+                return None
+        return postings[0] if len(postings) == 1 else set().union(*postings)
+
+    def stats(self):
+        return {"events": len(self._documents), "tokens": len(self._tokens)}
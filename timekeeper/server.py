@@ -0,0 +1,78 @@
+"""HTTP server for the sync app: Slack requests on /slack/events, metrics next to them.
+
+Bolt's development server only answers Slack's POSTs, one at a time. This one handles
+requests on threads and also serves GET /metrics (Prometheus text format) and
+GET /profile (the cProfile summary when TIMEKEEPER_PROFILE is set). When the app is
+installed over OAuth, it serves Bolt's install and redirect pages too.
+"""
+import json
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from slack_bolt.request import BoltRequest
+
+logger = logging.getLogger(__name__)
+
+
+class Server(ThreadingHTTPServer):
+    # The default backlog of 5 drops Slack's connections during bursts
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def make_handler(app, metrics, path):
+    class SlackHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            logger.debug(format, *args)
+
+        def do_GET(self):
+            request_path, _, query = self.path.partition("?")
+            oauth_flow = app.oauth_flow
+            if request_path == "/metrics":
+                self._send(200, metrics.render(), "text/plain; version=0.0.4; charset=utf-8")
+            elif request_path == "/profile":
+                self._send(200, metrics.profile(), "text/plain; charset=utf-8")
+            elif oauth_flow and request_path == oauth_flow.install_path:
+                self._send_bolt(oauth_flow.handle_installation(BoltRequest(body="", query=query, headers=self.headers)))
+            elif oauth_flow and request_path == oauth_flow.redirect_uri_path:
+                self._send_bolt(oauth_flow.handle_callback(BoltRequest(body="", query=query, headers=self.headers)))
+            else:
+                self._send(404, "")
+
+        def do_POST(self):
+            request_path, _, query = self.path.partition("?")
+            if request_path != path:
+                self._send(404, "")
+                return
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode("utf-8")
+            # email.message.Message's mapping interface is dict compatible
+            self._send_bolt(app.dispatch(BoltRequest(body=body, query=query, headers=self.headers)))
+
+        def _send_bolt(self, response):
+            self._send(response.status, response.body, headers=response.headers)
+
+        def _send(self, status, body, content_type=None, headers=None):
+            body_bytes = (body if isinstance(body, str) else json.dumps(body)).encode("utf-8")
+            self.send_response(status)
+            if content_type:
+                self.send_header("Content-Type", content_type)
+            for name, values in (headers or {}).items():
+                for value in values:
+                    self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body_bytes)))
+            self.end_headers()
+            self.wfile.write(body_bytes)
+
+    return SlackHandler
+
+
+def serve(app, metrics, port=3000, path="/slack/events", host="0.0.0.0", ready=None):
+    """Serves the app until interrupted, calling ready() once the port is bound."""
+    server = Server((host, port), make_handler(app, metrics, path))
+    print(f"⚡️ TimeKeeper is running on port {port}, metrics on /metrics")
+    if ready:
+        ready()
+    try:
+        server.serve_forever(0.05)
+    finally:
+        server.server_close()
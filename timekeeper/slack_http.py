@@ -0,0 +1,137 @@
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from slack_sdk import WebClient
+
+from .metrics import metrics
+from .tzcache import RateLimited
+
+DEFAULT_BASE_URL = "https://slack.com/api/"
+
+
+class SlackError(Exception):
+    """Slack answered a Web API call with ok: false (or without what we asked for)."""
+
+    def __init__(self, method, error):
+        super().__init__(f"{method} failed: {error}")
+        self.method = method
+        self.error = error
+
+
+def checked(method, body):
+    """The body of a Web API response, or SlackError if Slack refused the call; it still answers 200 then."""
+    if not body.get("ok"):
+        raise SlackError(method, body.get("error", "unknown_error"))
+    return body
+
+
+def timezone_of(user_info):
+    """The tz of a users.info response. Raises rather than guess, so a guess is never cached as theirs."""
+    timezone = user_info.get("user", {}).get("tz")
+    if not timezone:
+        raise SlackError("users.info", "no_timezone")
+    return timezone
+
+
+class SlackHttp:
+    """Shared keep-alive session for the Slack Web API calls we make ourselves."""
+
+    def __init__(self, token, base_url=DEFAULT_BASE_URL, timeout=5, max_retries=3,
+                 backoff=0.5, max_backoff=30, pool_size=20):
+        self.token = token
+        self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._bulk = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="slack-http")
+
+    def call(self, method, token=None, **params):
+        """Calls a Web API method, retrying 429/5xx with backoff, and returns the parsed body."""
+        with metrics.timer("slack_http", method=method):
+            return checked(method, self._call(method, token, params))
+
+    def _call(self, method, token, params):
+        headers = {"Authorization": f"Bearer {token or self.token}"}
+        attempt = 0
+        while True:
+            try:
+                response = self.session.get(self.base_url + method, params=params,
+                                            headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._delay(attempt)
+            else:
+                if response.status_code == 429:
+                    retry_after = int(response.headers.get("Retry-After", 1))
+                    if attempt >= self.max_retries or retry_after > self.max_backoff:
+                        raise RateLimited(retry_after)
+                    delay = retry_after
+                elif response.status_code >= 500 and attempt < self.max_retries:
+                    delay = self._delay(attempt)
+                else:
+                    response.raise_for_status()
+                    return response.json()
+            attempt += 1
+            time.sleep(delay)
+
+    def _delay(self, attempt):
+        return min(self.backoff * (2 ** attempt), self.max_backoff)
+
+    def user_timezone(self, user_id, token=None):
+        return timezone_of(self.call("users.info", token=token, user=user_id))
+
+    def user_timezones(self, user_ids, token=None):
+        """Resolves many users in one pass, sharing the connection pool.
+
+        Returns a dict of user_id -> timezone, or user_id -> exception for the ones that failed.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        futures = {user_id: self._bulk.submit(self.user_timezone, user_id, token)
+                   for user_id in user_ids}
+        results = {}
+        for user_id, future in futures.items():
+            try:
+                results[user_id] = future.result()
+            except Exception as e:
+                results[user_id] = e
+        return results
+
+    def download_lines(self, url, token=None):
+        """Streams a file shared with the bot (its url_private_download) as lines of UTF-8 text.
+
+        Lines keep their endings, for the CSV reader. Nothing but the current chunk is held,
+        however big the file.
+        """
+        with metrics.timer("slack_http", method="files.download"):
+            with self.session.get(url, headers={"Authorization": f"Bearer {token or self.token}"},
+                                  stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                # Without files:read Slack sends its sign-in page instead of the file
+                if response.headers.get("Content-Type", "").startswith("text/html"):
+                    raise PermissionError("Slack didn't send the file, the app needs the files:read scope")
+                response.raw.decode_content = True
+                # urllib3 closes the stream once it is read to the end, which TextIOWrapper reads as an error
+                response.raw.auto_close = False
+                yield from io.TextIOWrapper(response.raw, encoding="utf-8-sig", newline="")
+
+    def close(self):
+        self._bulk.shutdown(wait=False)
+        self.session.close()
+
+
+class TimedWebClient(WebClient):
+    """Bolt's WebClient, with every API call timed as the slack_api phase."""
+
+    def api_call(self, api_method, **kwargs):
+        with metrics.timer("slack_api", method=api_method):
+            return super().api_call(api_method, **kwargs)
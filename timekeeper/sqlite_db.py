@@ -0,0 +1,51 @@
+"""SQLite plumbing shared by the event store and the reminder queue."""
+import sqlite3
+import threading
+
+
+class Connections:
+    """A connection to an SQLite database in WAL mode for each thread that asks for one.
+
+    sqlite3 connections can't be shared between threads, so each keeps its own. They run in
+    autocommit mode; writers that need a transaction begin one explicitly. close() closes
+    all of them, whichever thread opened them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._open = {}  # thread -> its connection
+        self._lock = threading.Lock()
+
+    def get(self):
+        thread = threading.current_thread()
+        conn = self._open.get(thread)
+        if conn is None:
+            # Still one thread per connection, but others may close it once the thread is gone
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._lock:
+                for finished in [other for other in self._open if not other.is_alive()]:
+                    self._open.pop(finished).close()
+                self._open[thread] = conn
+        return conn
+
+    def close(self):
+        """Closes every thread's connection. A thread that asks for one again gets a new one."""
+        with self._lock:
+            connections = list(self._open.values())
+            self._open.clear()
+        for conn in connections:
+            conn.close()
+
+
+def add_column(conn, table, name, definition):
+    """Adds a column to a table created before it existed, if it isn't there yet."""
+    if name not in {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}:
+        try:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+        except sqlite3.OperationalError as e:
+            # Another process starting up at the same time got there first
+            if "duplicate column" not in str(e):
+                raise
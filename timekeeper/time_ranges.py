@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+import pytz
+
+INTERVALS = ("year", "month", "week", "day", "hour", "minute")
+
+
+def localize_boundary(tz, naive):
+    """Localizes a wall-clock boundary, picking the earliest real instant on DST transitions.
+
+    An ambiguous time (clocks going back) resolves to its first occurrence, and a skipped
+    time (clocks going forward) to the moment the clocks jump to.
+    """
+    try:
+        return tz.localize(naive, is_dst=None)
+    except pytz.AmbiguousTimeError:
+        return tz.localize(naive, is_dst=True)
+    except pytz.NonExistentTimeError:
+        return tz.localize(naive, is_dst=False)
+
+
+def interval_range(interval, tz, now=None):
+    """Returns the UTC [start, end) timestamps of the interval containing now in tz.
+
+    Returns None for anything that isn't a known interval, meaning "all events".
+    """
+    if interval not in INTERVALS:
+        return None
+    now = now or datetime.now(tz)
+
+    if interval in ("hour", "minute"):
+        # These don't move with DST, so work on the aware time directly
+        if interval == "hour":
+            start = now.replace(minute=0, second=0, microsecond=0)
+            length = timedelta(hours=1)
+        else:
+            start = now.replace(second=0, microsecond=0)
+            length = timedelta(minutes=1)
+        return start.timestamp(), start.timestamp() + length.total_seconds()
+
+    local = now.replace(tzinfo=None)
+    if interval == "year":
+        start = datetime(local.year, 1, 1)
+        end = datetime(local.year + 1, 1, 1)
+    elif interval == "month":
+        start = datetime(local.year, local.month, 1)
+        end = datetime(local.year + local.month // 12, local.month % 12 + 1, 1)
+    elif interval == "week":
+        # Weeks start on Monday
+        start = datetime(local.year, local.month, local.day) - timedelta(days=local.weekday())
+        end = start + timedelta(days=7)
+    else:
+        start = datetime(local.year, local.month, local.day)
+        end = start + timedelta(days=1)
+    return localize_boundary(tz, start).timestamp(), localize_boundary(tz, end).timestamp()
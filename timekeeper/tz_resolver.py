@@ -0,0 +1,157 @@
+import re
+import threading
+from collections import Counter
+
+import pytz
+
+# Common abbreviations people type instead of tz database names. Exact database names
+# (EST, CET, ...) win over these, so only abbreviations pytz doesn't know are listed.
+ABBREVIATIONS = {
+    "PST": "America/Los_Angeles", "PDT": "America/Los_Angeles", "PT": "America/Los_Angeles",
+    "MDT": "America/Denver", "MT": "America/Denver",
+    "CST": "America/Chicago", "CDT": "America/Chicago", "CT": "America/Chicago",
+    "EDT": "America/New_York", "ET": "America/New_York",
+    "AKST": "America/Anchorage", "AKDT": "America/Anchorage",
+    "BRT": "America/Sao_Paulo", "ART": "America/Argentina/Buenos_Aires",
+    "BST": "Europe/London", "IST": "Asia/Kolkata",
+    "CEST": "Europe/Berlin", "EEST": "Europe/Helsinki", "WEST": "Europe/Lisbon",
+    "MSK": "Europe/Moscow",
+    "SAST": "Africa/Johannesburg", "CAT": "Africa/Maputo", "EAT": "Africa/Nairobi", "WAT": "Africa/Lagos",
+    "GST": "Asia/Dubai", "PKT": "Asia/Karachi", "ICT": "Asia/Bangkok", "WIB": "Asia/Jakarta",
+    "SGT": "Asia/Singapore", "MYT": "Asia/Kuala_Lumpur", "PHT": "Asia/Manila", "HKT": "Asia/Hong_Kong",
+    "JST": "Asia/Tokyo", "KST": "Asia/Seoul",
+    "AWST": "Australia/Perth", "ACST": "Australia/Adelaide", "ACDT": "Australia/Adelaide",
+    "AEST": "Australia/Sydney", "AEDT": "Australia/Sydney",
+    "NZST": "Pacific/Auckland", "NZDT": "Pacific/Auckland",
+}
+
+_OFFSET = re.compile(r"^(?:utc|gmt)([+-])(\d{1,2})$")
+
+
+class UnknownTimezone(pytz.UnknownTimeZoneError):
+    """An unrecognised timezone, with the closest names we know as suggestions."""
+
+    def __init__(self, name, suggestions=()):
+        self.name = name
+        self.suggestions = list(suggestions)
+        message = f"Unknown timezone `{name}`."
+        if self.suggestions:
+            message += " Did you mean " + ", ".join(f"`{s}`" for s in self.suggestions) + "?"
+        super().__init__(message)
+
+    def __str__(self):
+        return self.args[0]
+
+
+def _key(name):
+    return name.strip().lower().replace(" ", "_")
+
+
+def _trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TimezoneResolver:
+    """Case-insensitive lookup of tz names, abbreviations and city names, indexed once on first use.
+
+    timezone() hands out memoized tzinfo objects so the hot path never loads tzdata twice.
+    """
+
+    def __init__(self, abbreviations=ABBREVIATIONS):
+        self._abbreviations = abbreviations
+        self._names = None
+        self._trigram_index = None
+        self._trigram_counts = None
+        self._lock = threading.Lock()
+        self._tzinfos = {}
+
+    def _index(self):
+        """Builds the name and trigram indexes on first use, so importing this module stays cheap."""
+        with self._lock:
+            if self._names is not None:
+                return self._names
+            names = {}
+            # Common zones first, so a city maps to the zone people actually use rather than a legacy alias
+            for zone in list(pytz.common_timezones) + list(pytz.all_timezones):
+                names.setdefault(_key(zone), zone)
+            for abbreviation, zone in self._abbreviations.items():
+                names.setdefault(_key(abbreviation), zone)
+            for zone in list(pytz.common_timezones) + list(pytz.all_timezones):
+                # Etc/GMT+3 is UTC-3, so keep those out of the "GMT+3" style shortcuts
+                if "/" in zone and not zone.startswith("Etc/"):
+                    names.setdefault(_key(zone.rsplit("/", 1)[1]), zone)
+
+            trigram_index = {}
+            trigram_counts = {}
+            for key in names:
+                trigrams = _trigrams(key)
+                trigram_counts[key] = len(trigrams)
+                for trigram in trigrams:
+                    trigram_index.setdefault(trigram, []).append(key)
+            self._trigram_index = trigram_index
+            self._trigram_counts = trigram_counts
+            # Published last: other threads only skip the lock once everything is built
+            self._names = names
+            return names
+
+    def find(self, name):
+        """Returns the tz database name for a name, abbreviation, city or UTC±H offset, or None."""
+        key = _key(name)
+        zone = (self._names or self._index()).get(key)
+        if zone:
+            return zone
+        offset = _OFFSET.match(key)
+        if offset and int(offset.group(2)) <= 14:
+            # Etc/GMT zones have inverted signs: UTC+8 is Etc/GMT-8
+            sign = "-" if offset.group(1) == "+" else "+"
+            return f"Etc/GMT{sign}{int(offset.group(2))}" if int(offset.group(2)) else "UTC"
+        return None
+
+    def canonical(self, name):
+        """Like find(), but raises UnknownTimezone with suggestions instead of returning None."""
+        zone = self.find(name)
+        if zone is None:
+            raise UnknownTimezone(name.strip(), self.suggest(name))
+        return zone
+
+    def timezone(self, name):
+        """Like pytz.timezone(), but accepting anything canonical() does and memoized."""
+        tzinfo = self._tzinfos.get(name)
+        if tzinfo is None:
+            # Exact tz database names, the usual case, don't need the index
+            zone = name if name in pytz.all_timezones_set else self.canonical(name)
+            tzinfo = self._tzinfos.get(zone)
+            if tzinfo is None:
+                tzinfo = self._tzinfos[zone] = pytz.timezone(zone)
+        return tzinfo
+
+    def suggest(self, name, limit=3, cutoff=0.35):
+        """Returns up to limit tz names that look like name, best first."""
+        self._index()
+        key = _key(name)
+        query = _trigrams(key)
+        shared = Counter()
+        for trigram in query:
+            for candidate in self._trigram_index.get(trigram, ()):
+                shared[candidate] += 1
+
+        scored = []
+        for candidate, count in shared.items():
+            # Dice coefficient over trigram sets
+            score = 2 * count / (len(query) + self._trigram_counts[candidate])
+            if score >= cutoff:
+                scored.append((score, candidate))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+
+        suggestions = []
+        for _, candidate in scored:
+            zone = self._names[candidate]
+            if zone not in suggestions:
+                suggestions.append(zone)
+            if len(suggestions) == limit:
+                break
+        return suggestions
+
+
+resolver = TimezoneResolver()
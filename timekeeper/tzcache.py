@@ -0,0 +1,195 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class RateLimited(Exception):
+    """Raised by a fetch function when Slack answers with HTTP 429."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"rate limited, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class _Pending:
+    # One in-flight lookup that concurrent callers for the same user wait on
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+
+
+class TimezoneCache:
+    """Process-wide user -> timezone cache with TTL, LRU eviction and request coalescing."""
+
+    def __init__(self, fetch, ttl=6 * 60 * 60, maxsize=10000, default="America/New_York", fetch_many=None):
+        self.fetch = fetch
+        self.fetch_many = fetch_many
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.default = default
+        self._entries = OrderedDict()  # user_id -> (timezone, expires_at)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._blocked_until = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def get(self, user_id, token=None):
+        """Returns the cached timezone for a user, fetching it at most once per TTL.
+
+        token is passed on to fetch, for bots installed in several workspaces.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            if now < self._blocked_until:
+                # Slack told us to back off, don't even try
+                return self._fallback(entry)
+            pending = self._pending.get(user_id)
+            owner = pending is None
+            if owner:
+                pending = self._pending[user_id] = _Pending()
+                self.misses += 1
+
+        if not owner:
+            pending.done.wait()
+            return pending.value
+
+        try:
+            value = self._load(user_id, entry, token)
+        finally:
+            with self._lock:
+                del self._pending[user_id]
+        pending.value = value
+        pending.done.set()
+        return value
+
+    def get_many(self, user_ids, token=None):
+        """Like get() for several users at once, sending all misses to fetch_many in one batch."""
+        if self.fetch_many is None or len(user_ids) <= 1:
+            return {user_id: self.get(user_id, token) for user_id in user_ids}
+        results = {}
+        owned = {}
+        waiting = {}
+        entries = {}
+        now = time.monotonic()
+        with self._lock:
+            blocked = now < self._blocked_until
+            for user_id in dict.fromkeys(user_ids):
+                entry = self._entries.get(user_id)
+                if entry and entry[1] > now:
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    results[user_id] = entry[0]
+                elif blocked:
+                    results[user_id] = self._fallback(entry)
+                elif user_id in self._pending:
+                    waiting[user_id] = self._pending[user_id]
+                else:
+                    owned[user_id] = self._pending[user_id] = _Pending()
+                    entries[user_id] = entry
+                    self.misses += 1
+
+        if owned:
+            try:
+                fetched = self._fetch(self.fetch_many, list(owned), token)
+            except Exception as e:
+                fetched = {user_id: e for user_id in owned}
+            for user_id, pending in owned.items():
+                value = fetched.get(user_id)
+                with self._lock:
+                    del self._pending[user_id]
+                    if isinstance(value, RateLimited):
+                        self._blocked_until = max(self._blocked_until, time.monotonic() + value.retry_after)
+                    if value is None or isinstance(value, Exception):
+                        value = self._fallback(entries[user_id])
+                    else:
+                        self._store(user_id, value)
+                pending.value = results[user_id] = value
+                pending.done.set()
+
+        for user_id, pending in waiting.items():
+            pending.done.wait()
+            results[user_id] = pending.value
+        return results
+
+    def lookup(self, user_id):
+        """Returns the timezone if it can be answered without a fetch, otherwise None.
+
+        For callers that do their own fetching (the asyncio app); report back with put() or failed().
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            if now < self._blocked_until:
+                return self._fallback(entry)
+            self.misses += 1
+            return None
+
+    def failed(self, user_id, error):
+        """Records a failed fetch made outside the cache and returns what to use instead."""
+        with self._lock:
+            if isinstance(error, RateLimited):
+                self._blocked_until = max(self._blocked_until, time.monotonic() + error.retry_after)
+            return self._fallback(self._entries.get(user_id))
+
+    @staticmethod
+    def _fetch(fetch, users, token):
+        # Single-workspace fetch functions don't need to take a token
+        return fetch(users) if token is None else fetch(users, token=token)
+
+    def _load(self, user_id, entry, token=None):
+        try:
+            value = self._fetch(self.fetch, user_id, token)
+        except RateLimited as e:
+            with self._lock:
+                self._blocked_until = max(self._blocked_until, time.monotonic() + e.retry_after)
+                return self._fallback(entry)
+        except Exception:
+            with self._lock:
+                return self._fallback(entry)
+        self.put(user_id, value)
+        return value
+
+    def _fallback(self, entry):
+        # Serve an expired value over the default whenever we have one
+        if entry:
+            self.stale += 1
+            return entry[0]
+        return self.default
+
+    def put(self, user_id, timezone):
+        with self._lock:
+            self._store(user_id, timezone)
+
+    def _store(self, user_id, timezone):
+        self._entries[user_id] = (timezone, time.monotonic() + self.ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "size": len(self._entries),
+                "blocked_for": max(0.0, self._blocked_until - time.monotonic()),
+            }
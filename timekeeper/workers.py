@@ -0,0 +1,81 @@
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool:
+    """Fixed set of worker threads fed from a bounded queue.
+
+    Handlers ack() first and hand the slow part of the request to submit(); when the
+    queue is full submit() refuses the work instead of letting it pile up.
+    """
+
+    def __init__(self, workers=8, max_queue=200, name="timekeeper-worker"):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.busy = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        for i in range(workers):
+            threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True).start()
+
+    def submit(self, fn, *args, **kwargs):
+        """Queues fn(*args, **kwargs) and returns True, or returns False if the queue is full."""
+        try:
+            self._queue.put_nowait((time.monotonic(), fn, args, kwargs))
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    def _run(self):
+        while True:
+            queued_at, fn, args, kwargs = self._queue.get()
+            waited = time.monotonic() - queued_at
+            with self._lock:
+                self.busy += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+            try:
+                fn(*args, **kwargs)
+            except Exception:
+                logger.exception("Background task %r failed", fn)
+                with self._lock:
+                    self.failed += 1
+            finally:
+                with self._lock:
+                    self.busy -= 1
+                    self.completed += 1
+                self._queue.task_done()
+
+    def join(self):
+        """Blocks until everything queued so far has run."""
+        self._queue.join()
+
+    def stats(self):
+        with self._lock:
+            started = self.completed + self.busy
+            return {
+                "workers": self.workers,
+                "busy": self.busy,
+                "queue_depth": self._queue.qsize(),
+                "max_queue": self.max_queue,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "wait_avg": self.wait_total / started if started else 0.0,
+                "wait_max": self.wait_max,
+            }
@@ -0,0 +1,56 @@
+"""Installs into many workspaces: Bolt's OAuth flow and where installations are kept.
+
+Setting SLACK_CLIENT_ID and SLACK_CLIENT_SECRET switches the bot from a single
+SLACK_BOT_TOKEN to OAuth installs. Each workspace's bot token is kept by slack_sdk's
+FileInstallationStore, and its events in a store of its own (event_store.EventStoreShards).
+"""
+import os
+import re
+
+# What the commands need: slash commands, DMs for reminders and users.info for timezones, and
+# for /import_events and /export_events reading uploads and sending files to a DM
+DEFAULT_SCOPES = "commands,chat:write,users:read,files:read,files:write,im:write"
+
+_TEAM_ID = re.compile(r"^[A-Z0-9]+$")
+
+
+def installation_stores(directory):
+    """The (installation store, OAuth state store) pair, both kept as files under directory."""
+    from slack_sdk.oauth.installation_store import FileInstallationStore
+    from slack_sdk.oauth.state_store import FileOAuthStateStore
+
+    # Both classes implement the sync and the asyncio interfaces
+    return (FileInstallationStore(base_dir=os.path.join(directory, "installations")),
+            FileOAuthStateStore(expiration_seconds=600, base_dir=os.path.join(directory, "states")))
+
+
+def oauth_settings(client_id, client_secret, installation_store, state_store, scopes=DEFAULT_SCOPES,
+                   asynchronous=False):
+    """Bolt's OAuth settings: installs on /slack/install, Slack redirects back to /slack/oauth_redirect."""
+    if asynchronous:
+        from slack_bolt.oauth.async_oauth_settings import AsyncOAuthSettings as Settings
+    else:
+        from slack_bolt.oauth.oauth_settings import OAuthSettings as Settings
+    return Settings(
+        client_id=client_id,
+        client_secret=client_secret,
+        scopes=scopes.split(",") if isinstance(scopes, str) else scopes,
+        installation_store=installation_store,
+        installation_store_bot_only=True,
+        state_store=state_store,
+    )
+
+
+def bot_token(installation_store, team_id):
+    """The bot token installed in a workspace, for calls made outside of a request (reminders)."""
+    bot = installation_store.find_bot(enterprise_id=None, team_id=team_id)
+    if bot is None:
+        raise LookupError(f"TimeKeeper is not installed in workspace {team_id}")
+    return bot.bot_token
+
+
+def shard_path(directory, team_id, extension):
+    """Where a workspace's events live. team_id comes from Slack, but it still names a file."""
+    if not team_id or not _TEAM_ID.match(team_id):
+        raise ValueError(f"Invalid workspace id {team_id!r}")
+    return os.path.join(directory, f"{team_id}{extension}")